@@ -0,0 +1,59 @@
+"""
+Compare two benchmark results written by run.py and report regressions.
+
+Usage:
+    python benchmarks/compare.py baseline.json results.json --threshold 1.2
+
+Exits with status 1 if the median latency of any case grew by more than
+the threshold ratio.
+
+"""
+import argparse
+import json
+import sys
+
+
+def cases(report):
+    """Map (benchmark, case) to the statistics of each case in a report."""
+    found = {}
+    for name, results in report['results'].items():
+        for case, stats in results.items():
+            if isinstance(stats, dict) and 'median' in stats:
+                found[(name, case)] = stats
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline', help='results of the reference version')
+    parser.add_argument('results', help='results to check')
+    parser.add_argument('--threshold', '-t', type=float, default=1.2,
+                        help='largest acceptable ratio of median latencies, default 1.2')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = cases(json.load(f))
+    with open(args.results) as f:
+        results = cases(json.load(f))
+
+    regressions = 0
+    for key in sorted(set(baseline) & set(results)):
+        before = baseline[key]['median']
+        after = results[key]['median']
+        ratio = after / before if before else float('inf')
+
+        flag = ''
+        if ratio > args.threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+
+        print('{:<28} {:<40} {:>10.5f} {:>10.5f} {:>7.2f}x{}'.format(key[0], key[1], before, after, ratio, flag))
+
+    for key in sorted(set(baseline) ^ set(results)):
+        print('{:<28} {:<40} only in {}'.format(key[0], key[1], 'baseline' if key in baseline else 'results'))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+An in-process stand-in for a SAPI remote solver, for benchmarking
+:class:`dwave_sapi_dimod.SAPISampler` without hardware or a token.
+
+The fake is injected at the connection level: :func:`fake_remote` yields a
+:class:`dwave_sapi_dimod.ConnectionPool` whose connections are
+:class:`FakeRemoteConnection` objects, so only the samplers given that pool
+use it. Problems are solved by a local SAPI solver, after a configurable
+delay that models the network and the queue, or answered with a canned
+answer.
+
+Examples:
+    >>> with fake_remote(latency=.05) as connection_pool:
+    ...     sampler = sapi.SAPISampler('fake', 'http://fake', 'token', connection_pool=connection_pool)
+    ...     response = sampler.sample_ising({0: 1}, {(0, 4): -1})
+
+"""
+import contextlib
+import threading
+import time
+
+import dwave_sapi_dimod as sapi
+
+__all__ = ['FakeRemoteConnection', 'FakeRemoteSolver', 'fake_remote']
+
+
+class FakeRemoteSolver(object):
+    """A remote solver backed by a local one.
+
+    SAPI's solve_ising, solve_qubo, async_solve_ising and async_solve_qubo
+    functions call the solver's methods of the same names, which this
+    solver implements.
+
+    Args:
+        solver: The local SAPI solver that does the solving.
+        latency (float, optional): Seconds added to every call. Default 0.
+        properties (dict, optional): Overrides the local solver's
+            properties, for example {'num_reads_range': [1, 100]}.
+        answer (dict, optional): If given, returned for every problem
+            instead of solving it, to measure the cost of everything but
+            the solver. Default None.
+
+    """
+    def __init__(self, solver, latency=0., properties=None, answer=None):
+        self.solver = solver
+        self.latency = latency
+        self.answer = answer
+
+        self.properties = dict(solver.properties)
+        if properties:
+            self.properties.update(properties)
+
+    def solve_ising(self, h, J, **params):
+        return self._delayed(lambda core: core.async_solve_ising(self.solver, h, J, **params)).result()
+
+    def solve_qubo(self, Q, **params):
+        return self._delayed(lambda core: core.async_solve_qubo(self.solver, Q, **params)).result()
+
+    def async_solve_ising(self, h, J, **params):
+        return self._delayed(lambda core: core.async_solve_ising(self.solver, h, J, **params))
+
+    def async_solve_qubo(self, Q, **params):
+        return self._delayed(lambda core: core.async_solve_qubo(self.solver, Q, **params))
+
+    def _delayed(self, submit):
+        if self.answer is not None:
+            return _DelayedProblem(_CannedProblem(self.answer), self.latency)
+
+        from dwave_sapi2 import core
+        return _DelayedProblem(submit(core), self.latency)
+
+
+class FakeRemoteConnection(object):
+    """Stands in for SAPI's RemoteConnection.
+
+    Args:
+        local_solver_name (str, optional): The local solver that solves the
+            problems. Default 'c4-sw_optimize'.
+        latency (float, optional): Seconds added to every call. Default 0.
+        properties (dict, optional): Overrides the solver properties.
+        answer (dict, optional): A canned answer, see
+            :class:`FakeRemoteSolver`.
+
+    """
+    def __init__(self, local_solver_name='c4-sw_optimize', latency=0., properties=None, answer=None):
+        self.local_solver_name = local_solver_name
+        self.latency = latency
+        self.properties = properties
+        self.answer = answer
+        self.requested = set()  # the names of the solvers handed out
+
+    def solver_names(self):
+        return [self.local_solver_name]
+
+    def get_solver(self, solver_name):
+        from dwave_sapi2.local import local_connection
+        self.requested.add(solver_name)
+        solver = local_connection.get_solver(self.local_solver_name)
+        return FakeRemoteSolver(solver, self.latency, self.properties, self.answer)
+
+
+class _CannedProblem(object):
+    """A submitted problem that is already answered."""
+    def __init__(self, answer):
+        self.answer = answer
+
+    def done(self):
+        return True
+
+    def cancel(self):
+        pass
+
+    def status(self):
+        return {'state': 'DONE'}
+
+    def result(self):
+        return dict(self.answer)
+
+
+class _DelayedProblem(object):
+    """A submitted problem that is not done until `latency` has passed."""
+    def __init__(self, submitted_problem, latency):
+        self.submitted_problem = submitted_problem
+        self.ready_at = time.time() + latency
+
+    def done(self):
+        return time.time() >= self.ready_at and self.submitted_problem.done()
+
+    def cancel(self):
+        self.submitted_problem.cancel()
+
+    def status(self):
+        return self.submitted_problem.status()
+
+    def result(self):
+        remaining = self.ready_at - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+        return self.submitted_problem.result()
+
+
+@contextlib.contextmanager
+def fake_remote(latency=0., properties=None, local_solver_name='c4-sw_optimize', answer=None):
+    """A connection pool whose connections are fake remote connections.
+
+    Only the SAPISamplers given the pool use the fake, other samplers in the
+    process are not affected. Futures of fake problems cannot be passed to
+    :func:`dwave_sapi_dimod.wait`.
+
+    Args:
+        latency (float, optional): Seconds added to every call. Default 0.
+        properties (dict, optional): Overrides the solver properties.
+        local_solver_name (str, optional): The local solver that solves the
+            problems. Default 'c4-sw_optimize'.
+        answer (dict, optional): A canned answer, see
+            :class:`FakeRemoteSolver`.
+
+    Yields:
+        :class:`dwave_sapi_dimod.ConnectionPool`: A pool whose connections
+        are :class:`FakeRemoteConnection` objects, to pass to
+        :class:`dwave_sapi_dimod.SAPISampler`.
+
+    """
+    connections = []  # (url, connection)
+    lock = threading.Lock()
+
+    def connect(url, token, proxy_url=None):
+        connection = FakeRemoteConnection(local_solver_name, latency, properties, answer)
+        with lock:
+            connections.append((url, connection))
+        return connection
+
+    connection_pool = sapi.ConnectionPool(connection_factory=connect)
+    try:
+        yield connection_pool
+    finally:
+        connection_pool.clear()
+
+        # the structures of the fake solvers should not leak into later samplers for the
+        # same url and name. Only their (url, name) keys are dropped, so the other
+        # samplers in the process keep their cached structures
+        for url, connection in connections:
+            for solver_name in connection.requested:
+                sapi.structure_cache.invalidate((url, solver_name))
@@ -0,0 +1,218 @@
+"""
+Benchmarks for the samplers and composites, runnable without hardware.
+
+Measures the latency and throughput of SAPILocalSampler, EmbeddingComposite
+and SAPISampler (against an in-process fake remote solver) across problem
+sizes, graph densities, numbers of reads, embedding cache hits and misses
+and response parsing. The results are written as JSON so that runs of
+different versions can be compared with compare.py.
+
+Usage:
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --output results.json --filter embedding --repeats 20
+
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import dwave_sapi_dimod as sapi
+
+from fake_remote import fake_remote
+
+LOCAL_SOLVER = 'c4-sw_optimize'
+
+BENCHMARKS = []
+
+
+def benchmark(func):
+    """Register a benchmark. It is called with (repeats, rng) and returns a
+    dict of results keyed by case name."""
+    BENCHMARKS.append(func)
+    return func
+
+
+def measure(call, repeats, items=1):
+    """Time `repeats` calls of `call`, after one untimed warm-up call.
+
+    Returns:
+        dict: Latency statistics in seconds and the throughput in `items`
+        per second.
+
+    """
+    call()
+
+    latencies = []
+    for __ in range(repeats):
+        start = time.time()
+        call()
+        latencies.append(time.time() - start)
+
+    latencies = np.asarray(latencies)
+    return {'repeats': repeats,
+            'mean': float(latencies.mean()),
+            'median': float(np.median(latencies)),
+            'p95': float(np.percentile(latencies, 95)),
+            'min': float(latencies.min()),
+            'max': float(latencies.max()),
+            'throughput': float(repeats * items / latencies.sum()) if latencies.sum() else float('inf')}
+
+
+def structured_problem(sampler, num_qubits, rng):
+    """A random Ising problem on the first `num_qubits` qubits of the sampler,
+    using every coupler between them."""
+    nodes, edges = sampler.structure
+    qubits = set(sorted(nodes)[:num_qubits])
+    h = {v: rng.uniform(-1, 1) for v in qubits}
+    J = {(u, v): rng.uniform(-1, 1) for u, v in edges if u < v and u in qubits and v in qubits}
+    return h, J
+
+
+def logical_problem(num_variables, density, rng):
+    """A random Ising problem where each pair of variables interacts with
+    probability `density`, always including a path so it is connected."""
+    h = {v: rng.uniform(-1, 1) for v in range(num_variables)}
+    J = {(u, v): rng.uniform(-1, 1) for u, v in itertools.combinations(range(num_variables), 2)
+         if v == u + 1 or rng.random() < density}
+    return h, J
+
+
+@benchmark
+def local_size_sweep(repeats, rng):
+    sampler = sapi.SAPILocalSampler(LOCAL_SOLVER)
+    results = {}
+    for num_qubits in (8, 32, 128):
+        h, J = structured_problem(sampler, num_qubits, rng)
+        results['qubits={}'.format(num_qubits)] = measure(lambda: sampler.sample_ising(h, J), repeats)
+    return results
+
+
+@benchmark
+def local_num_reads_sweep(repeats, rng):
+    sampler = sapi.SAPILocalSampler(LOCAL_SOLVER)
+    h, J = structured_problem(sampler, 32, rng)
+    results = {}
+    for num_reads in (10, 100, 1000):
+        for compact in (False, True):
+            name = 'num_reads={},compact={}'.format(num_reads, compact)
+            results[name] = measure(lambda: sampler.sample_ising(h, J, num_reads=num_reads, compact=compact),
+                                    repeats, num_reads)
+    return results
+
+
+@benchmark
+def embedding_density(repeats, rng):
+    sampler = sapi.EmbeddingComposite(sapi.SAPILocalSampler(LOCAL_SOLVER))
+    results = {}
+    for num_variables, density in ((8, .1), (8, 1.), (16, .1), (16, .5)):
+        h, J = logical_problem(num_variables, density, rng)
+        name = 'variables={},density={}'.format(num_variables, density)
+        results[name] = measure(lambda: sampler.sample_ising(h, J), repeats)
+    return results
+
+
+@benchmark
+def embedding_cache(repeats, rng):
+    child = sapi.SAPILocalSampler(LOCAL_SOLVER)
+    h, J = logical_problem(10, .5, rng)
+
+    sampler = sapi.EmbeddingComposite(child)
+    hit = measure(lambda: sampler.sample_ising(h, J), repeats)
+
+    def miss():
+        sampler.cached_embeddings.clear()
+        sampler.sample_ising(h, J)
+    return {'hit': hit, 'miss': measure(miss, repeats)}
+
+
+@benchmark
+def response_parsing(repeats, rng):
+    nodes, __ = sapi.SAPILocalSampler(LOCAL_SOLVER).structure
+    num_qubits = max(nodes) + 1
+    h = {v: 0. for v in nodes}
+
+    results = {}
+    for num_reads in (100, 10000):
+        solutions = np.random.RandomState(rng.randint(0, 2**31 - 1)).randint(2, size=(num_reads, num_qubits))
+        answer = {'solutions': (2 * solutions - 1).tolist(),
+                  'energies': sorted(rng.uniform(-10, 0) for __ in range(num_reads)),
+                  'num_occurrences': [1] * num_reads}
+
+        # the fake solver returns the canned answer at once, so the time is spent
+        # formatting the problem and parsing the answer
+        with fake_remote(properties={'num_reads_range': [1, num_reads]}, answer=answer) as connection_pool:
+            sampler = sapi.SAPISampler(LOCAL_SOLVER, 'http://fake', 'token', connection_pool=connection_pool)
+            for compact, aggregate in ((False, False), (True, False), (True, True)):
+                name = 'num_reads={},compact={},aggregate={}'.format(num_reads, compact, aggregate)
+                results[name] = measure(lambda: sampler.sample_ising(h, {}, num_reads=num_reads, compact=compact,
+                                                                     aggregate=aggregate),
+                                        repeats, num_reads)
+    return results
+
+
+@benchmark
+def remote(repeats, rng, latency=.02):
+    results = {}
+    with fake_remote(latency=latency) as connection_pool:
+        sampler = sapi.SAPISampler('fake', 'http://fake', 'token', connection_pool=connection_pool)
+        h, J = structured_problem(sampler, 32, rng)
+
+        results['sample_ising'] = measure(lambda: sampler.sample_ising(h, J), repeats)
+        results['connect'] = measure(
+            lambda: sapi.SAPISampler('fake', 'http://fake', 'token', connection_pool=connection_pool), repeats)
+
+        problems = [structured_problem(sampler, 32, rng) for __ in range(10)]
+        results['sample_ising_many'] = measure(lambda: list(sampler.sample_ising_many(problems)),
+                                               max(repeats // 5, 1), len(problems))
+
+        embedded = sapi.EmbeddingComposite(sampler)
+        h, J = logical_problem(10, .5, rng)
+        results['embedded'] = measure(lambda: embedded.sample_ising(h, J), repeats)
+    results['latency'] = latency
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', '-o', help='file to write the results to, default stdout')
+    parser.add_argument('--repeats', '-r', type=int, default=10, help='timed calls per case, default 10')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random problems, default 0')
+    parser.add_argument('--filter', '-k', default='', help='only run benchmarks whose name contains this')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for func in BENCHMARKS:
+        if args.filter not in func.__name__:
+            continue
+        # every benchmark gets the same problems regardless of which others run
+        rng = random.Random('{}:{}'.format(args.seed, func.__name__))
+        results[func.__name__] = func(args.repeats, rng)
+
+    report = {'version': sapi.__version__,
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'repeats': args.repeats,
+              'seed': args.seed,
+              'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
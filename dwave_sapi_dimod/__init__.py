@@ -1,13 +1,76 @@
 from __future__ import absolute_import
 
+import importlib as _importlib
 import sys as _sys
+import types as _types
 
 __version__ = '0.3.2'
 
 _PY2 = _sys.version_info[0] == 2
 
-from dwave_sapi_dimod.samplers import *
-import dwave_sapi_dimod.samplers
+# the public names of each submodule. A submodule is only imported once one of its
+# names is used, and dwave_sapi2 only once a sampler needs a solver
+_EXPORTS = {
+    'cache': ['EmbeddingCache', 'SQLiteEmbeddingStore', 'structure_fingerprint', 'adjacency_fingerprint',
+              'HardwareGraph', 'StructureCache', 'structure_cache', 'ResponseCache', 'problem_fingerprint'],
+    'embedding': ['find_best_embedding', 'embedding_quality', 'unembed_samples', 'CompiledEmbedding',
+                  'CHAIN_BREAK_METHODS'],
+    'futures': ['SAPIFuture', 'wait', 'submit_many'],
+    'instrumentation': ['Metrics', 'add_metrics_sink', 'remove_metrics_sink', 'enable_metrics',
+                        'disable_metrics'],
+    'pool': ['ConnectionPool', 'connection_pool'],
+    'preprocessing': ['reduce_ising', 'restore_samples'],
+    'problems': ['CompiledProblem', 'compile_ising', 'compile_qubo', 'SPIN', 'BINARY'],
+    'responses': ['ArrayBinaryResponse', 'ArraySpinResponse'],
+    'samplers': ['SAPILocalSampler', 'SAPISampler'],
+    'tabu': ['tabu_search'],
+    'composites': ['EmbeddingComposite', 'DecompositionComposite', 'PackingComposite', 'SpinReversalComposite'],
+    'dispatch': ['HedgedSampler', 'LoadBalancingSampler', 'Backend', 'least_outstanding', 'lowest_latency',
+                 'fits_structure'],
+}
 
-from dwave_sapi_dimod.composites import *
-import dwave_sapi_dimod.composites
+_SUBMODULE_OF = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_SUBMODULE_OF)
+
+
+def _load(name):
+    """Import the submodule `name`, or the submodule that defines the public
+    name `name` and return its value."""
+    if name in _EXPORTS:
+        return _importlib.import_module(__name__ + '.' + name)
+
+    module = _SUBMODULE_OF.get(name)
+    if module is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+    value = getattr(_importlib.import_module(__name__ + '.' + module), name)
+    setattr(_sys.modules[__name__], name, value)  # later lookups don't come through here
+    return value
+
+
+if _sys.version_info[:2] >= (3, 7):
+    def __getattr__(name):
+        return _load(name)
+
+    def __dir__():
+        return sorted(set(globals()) | set(_SUBMODULE_OF) | set(_EXPORTS))
+
+else:
+    # modules cannot define __getattr__ (PEP 562), so the package is replaced in
+    # sys.modules by an instance of a module type that does
+    class _LazyModule(_types.ModuleType):
+        def __getattr__(self, name):
+            return _load(name)
+
+        def __dir__(self):
+            return sorted(set(self.__dict__) | set(_SUBMODULE_OF) | set(_EXPORTS))
+
+    _module = _LazyModule(__name__, __doc__)
+    _module.__dict__.update(globals())
+
+    # python 2 clears the globals of a module when it is collected, and _load uses
+    # them, so the original module is kept alive
+    _module._original_module = _sys.modules[__name__]
+
+    _sys.modules[__name__] = _module
@@ -0,0 +1,506 @@
+"""
+Caches used to avoid repeating expensive work, like searching for an
+embedding, between calls.
+"""
+import collections
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+__all__ = ['EmbeddingCache', 'SQLiteEmbeddingStore', 'structure_fingerprint', 'adjacency_fingerprint',
+           'HardwareGraph', 'StructureCache', 'structure_cache', 'ResponseCache', 'problem_fingerprint']
+
+
+class EmbeddingCache(object):
+    """A bounded least-recently-used cache of embeddings.
+
+    Behaves like a dict, but once `maxsize` embeddings are stored, adding
+    another evicts the one that was least recently used.
+
+    Args:
+        maxsize (int, optional): The maximum number of embeddings to keep.
+            If None, the cache is unbounded. Default 128.
+
+    Attributes:
+        hits (int): The number of lookups that found an embedding.
+        misses (int): The number of lookups that did not.
+
+    Examples:
+        >>> cache = sapi.EmbeddingCache(maxsize=2)
+        >>> cache['a'] = [[0]]
+        >>> cache.get('a')
+        [[0]]
+        >>> cache.get('b') is None
+        True
+        >>> cache.hits, cache.misses
+        (1, 1)
+
+    """
+    def __init__(self, maxsize=128):
+        if maxsize is not None and maxsize < 1:
+            raise ValueError("'maxsize' must be a positive integer or None")
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._embeddings = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        """Look up the embedding for `key`, counting the hit or miss."""
+        embeddings = self._embeddings
+        if key not in embeddings:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+
+        # move to the most-recently-used end
+        embedding = embeddings.pop(key)
+        embeddings[key] = embedding
+        return embedding
+
+    def __getitem__(self, key):
+        embedding = self.get(key, None)
+        if embedding is None:
+            raise KeyError(key)
+        return embedding
+
+    def __setitem__(self, key, embedding):
+        embeddings = self._embeddings
+
+        embeddings.pop(key, None)
+        embeddings[key] = embedding
+
+        if self.maxsize is not None:
+            while len(embeddings) > self.maxsize:
+                embeddings.popitem(last=False)
+
+    def __delitem__(self, key):
+        del self._embeddings[key]
+
+    def __contains__(self, key):
+        return key in self._embeddings
+
+    def __len__(self):
+        return len(self._embeddings)
+
+    def clear(self):
+        """Remove all embeddings and reset the counters."""
+        self._embeddings.clear()
+        self.hits = self.misses = 0
+
+
+class SQLiteEmbeddingStore(object):
+    """A persistent store of embeddings in an SQLite database.
+
+    Embeddings are keyed by the solver name, the fingerprint of the solver's
+    hardware adjacency and the fingerprint of the problem structure, so many
+    processes (and later runs) can share the embeddings found by any one of
+    them. Any object with the same `get` and `put` methods can be used as an
+    embedding store by :class:`EmbeddingComposite`.
+
+    Args:
+        path (str): The path to the database file. Created if it does not
+            exist.
+        timeout (float, optional): How long, in seconds, to wait for a
+            lock held by another process. Default 30.
+
+    Examples:
+        >>> store = sapi.SQLiteEmbeddingStore('embeddings.db')
+        >>> sampler = sapi.EmbeddingComposite(sapi.SAPILocalSampler('c4-sw_optimize'),
+        ...                                   embedding_store=store)
+
+    """
+    def __init__(self, path, timeout=30.):
+        self.path = path
+        self.timeout = timeout
+
+        with self._connect() as connection:
+            # write-ahead logging lets readers proceed while another process writes
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute("""CREATE TABLE IF NOT EXISTS embeddings(
+                                      solver_name TEXT NOT NULL,
+                                      adjacency TEXT NOT NULL,
+                                      structure TEXT NOT NULL,
+                                      embeddings TEXT NOT NULL,
+                                      PRIMARY KEY (solver_name, adjacency, structure))""")
+
+    def _connect(self):
+        # sqlite connections cannot be shared between threads or forked processes,
+        # so each operation gets its own
+        return _closing_connection(sqlite3.connect(self.path, timeout=self.timeout))
+
+    def get(self, solver_name, adjacency, structure):
+        """Look up an embedding.
+
+        Args:
+            solver_name (str): The name of the solver.
+            adjacency (str): The fingerprint of the solver's hardware
+                adjacency, see :func:`adjacency_fingerprint`.
+            structure (str): The fingerprint of the problem structure, see
+                :func:`structure_fingerprint`.
+
+        Returns:
+            list: The embeddings, or None if there are none stored.
+
+        """
+        with self._connect() as connection:
+            row = connection.execute("""SELECT embeddings FROM embeddings
+                                        WHERE solver_name = ? AND adjacency = ? AND structure = ?""",
+                                     (solver_name, adjacency, structure)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def put(self, solver_name, adjacency, structure, embeddings):
+        """Store an embedding. If another process already stored one for the
+        same key, that one is kept.
+
+        Args:
+            solver_name (str): The name of the solver.
+            adjacency (str): The fingerprint of the solver's hardware
+                adjacency, see :func:`adjacency_fingerprint`.
+            structure (str): The fingerprint of the problem structure, see
+                :func:`structure_fingerprint`.
+            embeddings (list): The embeddings as returned by SAPI's
+                find_embedding.
+
+        """
+        with self._connect() as connection:
+            connection.execute("""INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?)""",
+                               (solver_name, adjacency, structure, json.dumps(embeddings)))
+
+
+class _closing_connection(object):
+    """Commits (or rolls back) and closes an sqlite connection on exit."""
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.connection.commit()
+            else:
+                self.connection.rollback()
+        finally:
+            self.connection.close()
+
+
+class HardwareGraph(object):
+    """Compact array form of a solver's hardware adjacency.
+
+    The neighbours of each qubit are stored in compressed sparse row form,
+    and every coupler is also encoded as a single integer in a sorted array
+    so that membership can be checked for many couplers at once.
+
+    Args:
+        nodes (iterable): The qubits available to the solver.
+        edges (iterable): The (u, v) couplers available to the solver, in
+            either or both orientations.
+
+    Attributes:
+        num_qubits (int): One more than the largest qubit label.
+        indptr (:obj:`numpy.ndarray`): The neighbours of qubit q are
+            `indices[indptr[q]:indptr[q + 1]]`.
+        indices (:obj:`numpy.ndarray`): The sorted neighbours of each
+            qubit, concatenated.
+
+    Examples:
+        >>> graph = sapi.HardwareGraph({0, 4, 5}, {(0, 4), (0, 5)})
+        >>> graph.has_edge(4, 0)
+        True
+        >>> graph.has_edges([0, 4], [5, 5])
+        array([ True, False])
+
+    """
+    def __init__(self, nodes, edges):
+        nodes = np.asarray(sorted(nodes), dtype=np.int64)
+
+        edges = {(u, v) for u, v in edges if u != v}
+        edges.update([(v, u) for u, v in edges])
+        edges = np.asarray(sorted(edges), dtype=np.int64).reshape(-1, 2)
+
+        self.num_qubits = num_qubits = int(max(nodes.max() if len(nodes) else -1,
+                                               edges.max() if len(edges) else -1)) + 1
+
+        self._active = np.zeros(num_qubits, dtype=bool)
+        self._active[nodes] = True
+        self._active[edges.flatten()] = True
+
+        # edges are sorted by u, then v
+        self.indptr = np.searchsorted(edges[:, 0], np.arange(num_qubits + 1))
+        self.indices = edges[:, 1]
+
+        self._keys = edges[:, 0] * num_qubits + edges[:, 1]
+
+    def neighbours(self, q):
+        """The sorted neighbours of qubit `q`."""
+        return self.indices[self.indptr[q]:self.indptr[q + 1]]
+
+    def has_node(self, q):
+        """True if qubit `q` is available."""
+        return 0 <= q < self.num_qubits and bool(self._active[q])
+
+    def has_nodes(self, qubits):
+        """A boolean array, True for each of `qubits` that is available."""
+        qubits = np.asarray(qubits, dtype=np.int64)
+        in_range = (qubits >= 0) & (qubits < self.num_qubits)
+        found = np.zeros(qubits.shape, dtype=bool)
+        found[in_range] = self._active[qubits[in_range]]
+        return found
+
+    def has_edge(self, u, v):
+        """True if there is a coupler between qubits `u` and `v`."""
+        return bool(self.has_edges([u], [v])[0])
+
+    def has_edges(self, us, vs):
+        """A boolean array, True for each (u, v) in zip(us, vs) that is a
+        coupler."""
+        us = np.asarray(us, dtype=np.int64)
+        vs = np.asarray(vs, dtype=np.int64)
+
+        n = self.num_qubits
+        in_range = (us >= 0) & (us < n) & (vs >= 0) & (vs < n)
+        keys = np.where(in_range, us * n + vs, -1)
+
+        if not len(self._keys):
+            return np.zeros(keys.shape, dtype=bool)
+
+        positions = np.searchsorted(self._keys, keys)
+        positions[positions == len(self._keys)] = 0
+        return in_range & (self._keys[positions] == keys)
+
+
+class StructureCache(object):
+    """A process-wide cache of solver properties and hardware adjacency.
+
+    Creating a sampler for a solver that is already cached reuses its
+    structure rather than recomputing it. Entries are refreshed from the
+    solver once they are older than `ttl`.
+
+    Args:
+        ttl (float, optional): How long, in seconds, an entry is used
+            before being refreshed. If None, entries never expire. Default
+            3600.
+
+    """
+    def __init__(self, ttl=3600.):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, solver):
+        """Get the structure of a solver, computing it if it is not cached
+        or has expired.
+
+        Args:
+            key (tuple): Identifies the solver, e.g. (url, solver_name).
+            solver: The SAPI solver, or a function returning it, used only
+                if the structure must be computed. Passing a function avoids
+                connecting to SAPI when the structure is cached.
+
+        Returns:
+            tuple: (properties, structure, hardware_graph) where structure
+            is (nodes, edges) as for the samplers' `structure` attribute
+            and hardware_graph is a :class:`HardwareGraph`.
+
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and (self.ttl is None or time.time() - entry[0] < self.ttl):
+            return entry[1]
+
+        if callable(solver):
+            solver = solver()
+
+        # imported here so that importing the package does not load dwave_sapi2
+        from dwave_sapi2.util import get_hardware_adjacency
+        edges = get_hardware_adjacency(solver)
+        nodes = set().union(*edges)
+        value = (solver.properties, (nodes, edges), HardwareGraph(nodes, edges))
+
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop the entry for `key`, or every entry if `key` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+# shared by all of the samplers in the process
+structure_cache = StructureCache()
+
+
+def structure_fingerprint(num_variables, edges):
+    """Fingerprint the structure of an index-labelled problem.
+
+    Problems with the same number of variables and the same edges (in either
+    orientation) have the same fingerprint, regardless of their biases.
+
+    Args:
+        num_variables (int): The number of variables, labelled 0, n-1.
+        edges (iterable): The (u, v) interactions in the problem.
+
+    Returns:
+        str: A hex digest.
+
+    """
+    edges = sorted({(u, v) if u < v else (v, u) for u, v in edges if u != v})
+    return hashlib.sha1(repr((num_variables, edges)).encode('ascii')).hexdigest()
+
+
+def adjacency_fingerprint(nodes, edges):
+    """Fingerprint the hardware adjacency of a structured sampler.
+
+    Args:
+        nodes (iterable): The qubits available to the solver.
+        edges (iterable): The (u, v) couplers available to the solver.
+
+    Returns:
+        str: A hex digest.
+
+    """
+    edges = sorted({(u, v) if u < v else (v, u) for u, v in edges if u != v})
+    return hashlib.sha1(repr((sorted(nodes), edges)).encode('ascii')).hexdigest()
+
+
+def problem_fingerprint(linear, quadratic, params=None):
+    """Fingerprint an index-labelled problem together with the parameters it
+    is solved with.
+
+    Problems with the same biases, in any order and with the interactions
+    in either orientation, and the same parameters have the same
+    fingerprint.
+
+    Args:
+        linear (dict/list): The linear biases, as a dict or a list indexed
+            by variable.
+        quadratic (dict): The quadratic biases.
+        params (dict, optional): The parameters, such as num_reads.
+
+    Returns:
+        str: A hex digest.
+
+    """
+    if isinstance(linear, dict):
+        linear = sorted((v, float(bias)) for v, bias in linear.items())
+    else:
+        linear = [float(bias) for bias in linear]
+    quadratic = sorted(((u, v) if u < v else (v, u), float(bias)) for (u, v), bias in quadratic.items())
+    params = sorted((params or {}).items())
+    return hashlib.sha1(repr((linear, quadratic, params)).encode('utf-8')).hexdigest()
+
+
+class ResponseCache(object):
+    """A bounded cache of the answers to problems, for solvers that always
+    give the same answer to the same problem.
+
+    Entries are evicted least recently used first once there are more than
+    `maxsize` of them or they take more than `max_bytes`, and are dropped
+    once they are older than `ttl`. Samplers and composites only use a
+    cache that is passed to them, so solvers whose answers are random are
+    never cached by accident. The cache can be shared between samplers and
+    threads.
+
+    Args:
+        maxsize (int, optional): The maximum number of entries. If None,
+            there is no limit. Default 128.
+        max_bytes (int, optional): The maximum total size of the entries,
+            as given to `put`. If None, there is no limit. Default None.
+        ttl (float, optional): How long, in seconds, an entry is used. If
+            None, entries never expire. Default None.
+
+    Attributes:
+        hits (int): The number of lookups that found an entry.
+        misses (int): The number of lookups that did not.
+        nbytes (int): The total size of the entries.
+
+    Examples:
+        >>> cache = sapi.ResponseCache(maxsize=1000, max_bytes=2**28, ttl=3600)
+        >>> sampler = sapi.SAPILocalSampler('c4-sw_optimize', response_cache=cache)
+        >>> response = sampler.sample_ising({0: 1}, {(0, 4): -1})
+        >>> response = sampler.sample_ising({0: 1}, {(0, 4): -1})  # not solved again
+        >>> cache.hits
+        1
+
+    """
+    def __init__(self, maxsize=128, max_bytes=None, ttl=None):
+        if maxsize is not None and maxsize < 1:
+            raise ValueError("'maxsize' must be a positive integer or None")
+
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+
+        self._entries = collections.OrderedDict()  # key -> (time added, value, nbytes)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Look up the entry for `key`, counting the hit or miss."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and self.ttl is not None and time.time() - entry[0] >= self.ttl:
+                self.nbytes -= entry[2]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            # move to the most-recently-used end
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, nbytes=0):
+        """Add an entry of size `nbytes`, evicting others as needed. An entry
+        larger than `max_bytes` is not added."""
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            entries = self._entries
+
+            old = entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[2]
+
+            entries[key] = (time.time(), value, nbytes)
+            self.nbytes += nbytes
+
+            while ((self.maxsize is not None and len(entries) > self.maxsize) or
+                   (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+                __, (__, __, size) = entries.popitem(last=False)
+                self.nbytes -= size
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.nbytes = 0
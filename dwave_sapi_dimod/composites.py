@@ -1,12 +1,20 @@
-import dimod
+import time
 
-from dwave_sapi2.remote import RemoteConnection
-from dwave_sapi2.local import local_connection
-from dwave_sapi2.core import solve_ising, solve_qubo
-from dwave_sapi2.util import get_hardware_adjacency
-from dwave_sapi2.embedding import find_embedding, embed_problem, unembed_answer
+import dimod
+import numpy as np
 
 from dwave_sapi_dimod import _PY2
+from dwave_sapi_dimod.cache import EmbeddingCache, structure_fingerprint, adjacency_fingerprint, problem_fingerprint
+from dwave_sapi_dimod.embedding import find_best_embedding, unembed_samples, CompiledEmbedding
+from dwave_sapi_dimod.futures import submit_many, _resolved
+from dwave_sapi_dimod.instrumentation import _metrics, _NULL_METRICS
+from dwave_sapi_dimod.preprocessing import reduce_ising, restore_samples
+from dwave_sapi_dimod.problems import SPIN
+from dwave_sapi_dimod.responses import ArraySpinResponse
+from dwave_sapi_dimod.samplers import _DEFAULT_NUM_READS
+from dwave_sapi_dimod.tabu import _IsingArrays, _tabu_search
+
+__all__ = ['EmbeddingComposite', 'DecompositionComposite', 'PackingComposite', 'SpinReversalComposite']
 
 if _PY2:
     iteritems = lambda d: d.iteritems()
@@ -20,11 +28,38 @@ class EmbeddingComposite(dimod.TemplateComposite):
 
     Args:
         sampler: A dwave_sapi_dimod sampler object.
+        embedding_cache_size (int, optional): The maximum number of
+            embeddings to keep in `cached_embeddings`. If None, there is
+            no limit. Default 128.
+        embedding_store (optional): A persistent store, such as
+            :class:`SQLiteEmbeddingStore`, that is checked before searching
+            for an embedding for an untagged problem, and that is given
+            every embedding found. Default None.
+        embedding_tries (int, optional): The number of randomized
+            find_embedding attempts, run in parallel processes, when
+            searching for an embedding. The attempt with the shortest
+            chains is used. Default 1.
+        embedding_timeout (float, optional): The wall-clock budget in
+            seconds for each embedding search. Default None, no limit.
+        roof_duality (bool, optional): If True, variables whose values are
+            proven optimal by roof duality are fixed before the problem is
+            embedded. Zero biases are always dropped and variables without
+            couplers are always solved classically, see
+            :func:`reduce_ising`. Default False.
+        response_cache (:class:`ResponseCache`, optional): If given, the
+            unembedded responses are cached and reused when the same problem
+            is sampled again with the same parameters, skipping the
+            embedding and the child sampler. Only for child samplers that
+            always return the same answer. Default None.
 
     Attributes:
         children (list): [`sampler`] where `sampler` is the input sampler.
         structure: None, converts the structuted sampler to an unstructured
             one.
+        cached_embeddings (:class:`EmbeddingCache`): The embeddings found
+            so far, keyed by the fingerprint of the structure of the reduced
+            problem, together with the embedding tag if there is one. Its
+            `hits` and `misses` attributes count the lookups.
 
     Examples:
         Composing a sampler:
@@ -36,7 +71,8 @@ class EmbeddingComposite(dimod.TemplateComposite):
         >>> response = sampler.sample_ising({}, {})
 
     """
-    def __init__(self, sampler):
+    def __init__(self, sampler, embedding_cache_size=128, embedding_store=None,
+                 embedding_tries=1, embedding_timeout=None, roof_duality=False, response_cache=None):
         # puts sampler into self.children
         dimod.TemplateComposite.__init__(self, sampler)
 
@@ -45,12 +81,29 @@ class EmbeddingComposite(dimod.TemplateComposite):
         # structure becomes None
         self.structure = None
 
-        # we want to keep some embeddings accessable by the tag
-        self.cached_embeddings = {}
+        # we want to keep some embeddings accessable by the tag, or by the structure
+        # of the problem
+        self.cached_embeddings = EmbeddingCache(embedding_cache_size)
+
+        # the embeddings in cached_embeddings compiled for their problem structure
+        self._compiled_embeddings = EmbeddingCache(embedding_cache_size)
+
+        # embeddings shared with other processes, keyed on the child's hardware
+        self.embedding_store = embedding_store
+        self._adjacency_fingerprint = None
+
+        # how hard to search for new embeddings
+        self.embedding_tries = embedding_tries
+        self.embedding_timeout = embedding_timeout
+
+        self.roof_duality = roof_duality
+
+        self.response_cache = response_cache
 
     @dimod.decorators.ising(1, 2)
     @dimod.decorators.ising_index_labels(1, 2)
-    def sample_ising(self, h, J, embedding_tag=None, **sapi_kwargs):
+    def sample_ising(self, h, J, embedding_tag=None, compact=False, chain_break_method='minimize_energy',
+                     aggregate=False, **sapi_kwargs):
         """Embeds the given problem using sapi's find_embedding then invokes
         the given sampler to solve it.
 
@@ -67,17 +120,39 @@ class EmbeddingComposite(dimod.TemplateComposite):
                 quadratic bias associated with u, v.
             embedding_tag: Allows the user to specify a tag for the generated
                 embedding. Useful for when the user wishes to submit multiple
-                problems with the same logical structure.
+                problems with the same logical structure. Untagged problems
+                reuse the embedding of previous problems that had the same
+                structure.
+            compact (bool, optional): If True, return an
+                :class:`ArraySpinResponse` that stores the samples as an
+                int8 matrix. Default False.
+            chain_break_method (str, optional): How to resolve chains whose
+                qubits disagree, one of 'minimize_energy', 'majority_vote',
+                'weighted_random' or 'discard'. See :func:`unembed_samples`.
+                Default 'minimize_energy'.
+            aggregate (bool, optional): If True, merge repeated samples,
+                both before unembedding and after, when chains that were
+                resolved the same way create new duplicates. Their
+                'num_occurrences' are summed. Default False.
             Additional keyword parameters are the same as for
             SAPI's solve_ising function, see QUBIST documentation.
 
         Returns:
-            :class:`dimod.SpinResponse`: The unembedded samples.
+            :class:`dimod.SpinResponse`/:class:`ArraySpinResponse`: The
+            unembedded samples. The fraction of broken chains in each sample
+            is stored in its data as 'chain_break_fraction'. If every
+            variable was solved classically, the child sampler is not
+            called and the response has a single sample.
 
         Examples:
             >>> sampler = sapi.EmbeddingComposite(sapi.SAPILocalSampler('c4-sw_optimize'))
             >>> response = sampler.sample_ising({}, {(0, 1): 1, (0, 2): 1, (1, 2): 1})
 
+            Problems that differ only in their biases reuse the same embedding.
+            >>> response = sampler.sample_ising({0: -1}, {(0, 1): 1, (0, 2): 1, (1, 2): -1})
+            >>> sampler.cached_embeddings.hits
+            1
+
             Using the embedding_tag, the embedding is generated only once.
             >>> h = {0: .1, 1: 1.3, 2: -1.}
             >>> J = {(0, 1): 1, (1, 2): 1, (0, 2): 1}
@@ -86,19 +161,335 @@ class EmbeddingComposite(dimod.TemplateComposite):
             >>> response1 = sampler.sample_ising(h, J, embedding_tag='K3')
 
         """
+        return self._sample_ising(h, J, None, embedding_tag, compact, chain_break_method, aggregate, sapi_kwargs,
+                                  _metrics('EmbeddingComposite.sample_ising'))
+
+    def _sample_ising(self, h, J, problem, embedding_tag, compact, chain_break_method, aggregate, sapi_kwargs,
+                      metrics):
+        """Sample the index-labelled Ising problem, which is `problem` if it
+        was compiled."""
         # get the sampler that is used by the composite
         sampler = self._child
 
-        # the ising_index_labels decorator converted the keys of h to be indices 0, n-1
-        # sapi wants h to be a list, so let's make that conversion, using the keys as
-        # the indices.
+        cache = self.response_cache
+        if cache is not None:
+            key = self._response_cache_key(h, J, embedding_tag, chain_break_method, aggregate, sapi_kwargs)
+            cached = cache.get(key)
+            if cached is not None:
+                metrics.count('response_cache_hits')
+                response = _copy_response(cached)
+                if not compact:
+                    response = response.as_spin_response()
+                return metrics.emit(response)
+
+        with metrics.stage('reduce'):
+            reduced = self._reduce(h, J, problem)
+        h_reduced, J_reduced, variables, fixed = reduced
+        metrics.set('num_fixed_variables', len(fixed))
+
+        if not variables:
+            return metrics.emit(_fixed_response(h, J, fixed, compact, sapi_kwargs.get('num_reads', _DEFAULT_NUM_READS)))
+
+        h0, emb_j, new_emb, sapi_kwargs = self._embed_problem(h_reduced, J_reduced, embedding_tag, sapi_kwargs,
+                                                              metrics)
+
+        # invoke the child sampler
+        with metrics.stage('sample'):
+            emb_response = sampler.sample_ising(h0, emb_j, compact=True, aggregate=aggregate, **sapi_kwargs)
+        metrics.solver_timing = emb_response.data.get('timing')
+
+        with metrics.stage('unembed'):
+            response = _unembed_response(emb_response, new_emb, h, J, reduced, True, chain_break_method,
+                                         aggregate)
+
+        if cache is not None:
+            cache.put(key, _copy_response(response), _response_nbytes(response))
+
+        if not compact:
+            with metrics.stage('response'):
+                response = response.as_spin_response()
+
+        return metrics.emit(response)
+
+    @dimod.decorators.ising(1, 2)
+    def sample_ising_async(self, h, J, embedding_tag=None, compact=False,
+                           chain_break_method='minimize_energy', aggregate=False, **sapi_kwargs):
+        """Embeds the given problem and submits it to the given sampler
+        without waiting for it to be solved.
+
+        Args:
+            h (dict/list): The linear terms in the Ising problem. If a
+                dict, should be of the form {v: bias, ...} where v is
+                a variable in the Ising problem, and bias is the linear
+                bias associated with v. If a list, should be of the form
+                [bias, ...] where the indices of the biases are the
+                variables in the Ising problem.
+            J (dict): A dictionary of the quadratic terms in the Ising
+                problem. Should be of the form {(u, v): bias} where u,
+                v are variables in the Ising problem and bias is the
+                quadratic bias associated with u, v.
+            embedding_tag: Allows the user to specify a tag for the generated
+                embedding. Useful for when the user wishes to submit multiple
+                problems with the same logical structure.
+            compact (bool, optional): If True, the future resolves to an
+                :class:`ArraySpinResponse`. Default False.
+            chain_break_method (str, optional): How to resolve chains whose
+                qubits disagree, see `sample_ising`.
+            aggregate (bool, optional): If True, merge repeated samples,
+                see `sample_ising`.
+            Additional keyword parameters are the same as for
+            SAPI's solve_ising function, see QUBIST documentation.
+
+        Returns:
+            :class:`SAPIFuture`: A future that resolves to the unembedded
+            :class:`dimod.SpinResponse`.
+
+        """
+        # the ising_index_labels decorator would try to relabel the future, so we do
+        # the relabelling ourselves
+        h, J, inv_relabel = _index_label_ising(h, J)
+
+        return self._sample_ising_async(h, J, inv_relabel, None, embedding_tag, compact, chain_break_method,
+                                        aggregate, sapi_kwargs, _metrics('EmbeddingComposite.sample_ising_async'))
+
+    def _sample_ising_async(self, h, J, inv_relabel, problem, embedding_tag, compact, chain_break_method,
+                            aggregate, sapi_kwargs, metrics):
+        """Submit the index-labelled Ising problem, which is `problem` if it
+        was compiled, and relabel the response with `inv_relabel`."""
+        def relabel(response):
+            if inv_relabel is not None:
+                response = response.relabel_samples(inv_relabel)
+            return response
+
+        def respond(response):
+            if not compact:
+                with metrics.stage('response'):
+                    response = response.as_spin_response()
+            return relabel(metrics.emit(response))
+
+        cache = self.response_cache
+        if cache is not None:
+            key = self._response_cache_key(h, J, embedding_tag, chain_break_method, aggregate, sapi_kwargs)
+            cached = cache.get(key)
+            if cached is not None:
+                metrics.count('response_cache_hits')
+                return _resolved(respond(_copy_response(cached)))
+
+        with metrics.stage('reduce'):
+            reduced = self._reduce(h, J, problem)
+        h_reduced, J_reduced, variables, fixed = reduced
+        metrics.set('num_fixed_variables', len(fixed))
+
+        if not variables:
+            return _resolved(relabel(metrics.emit(_fixed_response(h, J, fixed, compact,
+                                                                  sapi_kwargs.get('num_reads', _DEFAULT_NUM_READS)))))
+
+        h0, emb_j, new_emb, sapi_kwargs = self._embed_problem(h_reduced, J_reduced, embedding_tag, sapi_kwargs,
+                                                              metrics)
+
+        with metrics.stage('submit'):
+            future = self._child.sample_ising_async(h0, emb_j, compact=True, aggregate=aggregate, **sapi_kwargs)
+
+        def unembed(emb_response):
+            metrics.solver_timing = emb_response.data.get('timing')
+            with metrics.stage('unembed'):
+                response = _unembed_response(emb_response, new_emb, h, J, reduced, True, chain_break_method,
+                                             aggregate)
+
+            if cache is not None:
+                cache.put(key, _copy_response(response), _response_nbytes(response))
+
+            return respond(response)
+
+        return future.then(unembed)
+
+    @dimod.decorators.qubo(1)
+    def sample_qubo_async(self, Q, **kwargs):
+        """Embeds the given QUBO and submits it to the given sampler without
+        waiting for it to be solved.
+
+        See `sample_ising_async` for the accepted keyword arguments.
+
+        Returns:
+            :class:`SAPIFuture`: A future that resolves to the unembedded
+            :class:`dimod.BinaryResponse`.
+
+        """
+        h, J, offset = dimod.qubo_to_ising(Q)
+        future = self.sample_ising_async(h, J, **kwargs)
+        return future.then(lambda response: response.as_binary(offset))
+
+    def sample(self, problem, embedding_tag=None, compact=False, chain_break_method='minimize_energy',
+               aggregate=False, **sapi_kwargs):
+        """Embed and solve a compiled problem.
+
+        The problem is relabelled when it is compiled, and converted to an
+        Ising problem and reduced (see :func:`reduce_ising`) the first time
+        it is sampled, so sampling it again skips straight to the embedding.
+
+        Args:
+            problem (:obj:`CompiledProblem`): The Ising problem or QUBO,
+                see :func:`compile_ising` and :func:`compile_qubo`.
+            Additional keyword parameters are the same as for
+            `sample_ising`.
+
+        Returns:
+            :class:`dimod.SpinResponse`/:class:`ArraySpinResponse` for Ising
+            problems, :class:`dimod.BinaryResponse`/:class:`ArrayBinaryResponse`
+            for QUBOs. See `sample_ising`.
+
+        Examples:
+            >>> sampler = sapi.EmbeddingComposite(sapi.SAPILocalSampler('c4-sw_optimize'))
+            >>> problem = sapi.compile_ising({'a': -1}, {('a', 'b'): 1, ('b', 'c'): 1, ('a', 'c'): 1})
+            >>> responses = [sampler.sample(problem, num_reads=10) for __ in range(10)]
+
+        """
+        h, J, offset = problem.index_ising()
+        spin = problem.vartype == SPIN
+
+        response = self._sample_ising(h, J, problem, embedding_tag, compact, chain_break_method,
+                                      aggregate, sapi_kwargs, _metrics('EmbeddingComposite.sample'))
+
+        if not problem.index_labelled:
+            response = response.relabel_samples(dict(enumerate(problem.variables)))
+        if not spin:
+            response = response.as_binary(offset)
+        return response
+
+    def sample_async(self, problem, embedding_tag=None, compact=False, chain_break_method='minimize_energy',
+                     aggregate=False, **sapi_kwargs):
+        """Embed a compiled problem and submit it without waiting for it to
+        be solved.
+
+        Args:
+            problem (:obj:`CompiledProblem`): The Ising problem or QUBO,
+                see `sample`.
+            Additional keyword parameters are the same as for
+            `sample_ising_async`.
+
+        Returns:
+            :class:`SAPIFuture`: A future that resolves to the unembedded
+            response, see `sample`.
+
+        """
+        h, J, offset = problem.index_ising()
+        spin = problem.vartype == SPIN
+        inv_relabel = None if problem.index_labelled else dict(enumerate(problem.variables))
+
+        future = self._sample_ising_async(h, J, inv_relabel, problem, embedding_tag, compact,
+                                          chain_break_method, aggregate, sapi_kwargs,
+                                          _metrics('EmbeddingComposite.sample_async'))
+        if spin:
+            return future
+        return future.then(lambda response: response.as_binary(offset))
+
+    def sample_ising_many(self, problems, max_in_flight=10, ordered=True, **kwargs):
+        """Solve many Ising problems, keeping several of them submitted at once.
+
+        Each problem is embedded while the previous ones are being solved.
+
+        Args:
+            problems (iterable[tuple]): The Ising problems to solve as
+                (h, J) pairs, each of the form accepted by `sample_ising`.
+            max_in_flight (int, optional): The maximum number of problems
+                that are submitted but not yet yielded. Default 10.
+            ordered (bool, optional): If True, responses are yielded in
+                the order of `problems`, otherwise as they are solved.
+                Default True.
+            Additional keyword parameters are passed to every call to
+            `sample_ising_async`.
+
+        Yields:
+            :class:`dimod.SpinResponse`: The response for each problem,
+            with its position in `problems` stored in the response data as
+            'problem_index'.
+
+        Examples:
+            >>> sampler = sapi.EmbeddingComposite(sapi.SAPILocalSampler('c4-sw_optimize'))
+            >>> J = {(0, 1): 1, (1, 2): 1, (0, 2): 1}
+            >>> problems = (({0: b}, J) for b in range(-5, 5))
+            >>> responses = list(sampler.sample_ising_many(problems, embedding_tag='K3'))
+
+        """
+        def submit(problem):
+            h, J = problem
+            return self.sample_ising_async(h, J, **kwargs)
+        return submit_many(submit, problems, max_in_flight, ordered)
+
+    def sample_qubo_many(self, Qs, max_in_flight=10, ordered=True, **kwargs):
+        """Solve many QUBOs, keeping several of them submitted at once.
+
+        Args:
+            Qs (iterable[dict]): The QUBOs to solve, each of the form
+                accepted by `sample_qubo`.
+            max_in_flight (int, optional): The maximum number of QUBOs
+                that are submitted but not yet yielded. Default 10.
+            ordered (bool, optional): If True, responses are yielded in
+                the order of `Qs`, otherwise as they are solved. Default
+                True.
+            Additional keyword parameters are passed to every call to
+            `sample_qubo_async`.
+
+        Yields:
+            :class:`dimod.BinaryResponse`: The response for each QUBO,
+            with its position in `Qs` stored in the response data as
+            'problem_index'.
+
+        """
+        def submit(Q):
+            return self.sample_qubo_async(Q, **kwargs)
+        return submit_many(submit, Qs, max_in_flight, ordered)
+
+    def _reduce(self, h, J, problem=None):
+        """Reduce the problem, or reuse the reduction of the compiled problem."""
+        if problem is None:
+            return reduce_ising(h, J, self.roof_duality)
+
+        # the reduction only depends on the biases and roof_duality
+        key = ('reduced', self.roof_duality)
+        reduced = problem._derived.get(key)
+        if reduced is None:
+            reduced = problem._derived[key] = reduce_ising(h, J, self.roof_duality)
+        return reduced
+
+    def _embed_problem(self, h, J, embedding_tag, sapi_kwargs, metrics=None):
+        """Find (or reuse) an embedding for the reduced problem and embed it."""
+        if metrics is None:
+            metrics = _NULL_METRICS
+
+        sampler = self._child
+
+        # the keys of h are the indices 0, n-1 (see reduce_ising) and every variable
+        # has at least one coupler. sapi wants h to be a list, so let's make that
+        # conversion, using the keys as the indices.
         h_list = [h[v] for v in range(len(h))]
 
         # get the structure of the child sampler. The first value are the nodes which
         # we don't need, the second is the set of edges available.
         (__, edgeset) = sampler.structure
 
-        if embedding_tag is None or embedding_tag not in self.cached_embeddings:
+        # problems with the same structure can share an embedding. Which variables are
+        # fixed can differ between problems with the same tag, so the tag alone does
+        # not determine the structure
+        fingerprint = structure_fingerprint(len(h_list), J)
+        if embedding_tag is None:
+            key = ('structure', fingerprint)
+        else:
+            key = (embedding_tag, fingerprint)
+
+        embeddings = self.cached_embeddings.get(key)
+        metrics.count('embedding_cache_misses' if embeddings is None else 'embedding_cache_hits')
+
+        store = self.embedding_store
+        if embeddings is None and store is not None and embedding_tag is None:
+            # maybe another process has already found one
+            with metrics.stage('embedding_store'):
+                embeddings = store.get(sampler.solver_name, self._get_adjacency_fingerprint(), fingerprint)
+            if embeddings is not None:
+                metrics.count('embedding_store_hits')
+                self.cached_embeddings[key] = embeddings
+
+        if embeddings is None:
             # we have not previously cached an embedding so we need to determine it
 
             # get the adjacency structure of our problem
@@ -106,54 +497,637 @@ class EmbeddingComposite(dimod.TemplateComposite):
             S.update({(v, v) for v in h})
 
             # embed our adjacency structure, S, into the edgeset of the sampler.
-            embeddings = find_embedding(S, edgeset)
+            from dwave_sapi2.embedding import find_embedding
+            with metrics.stage('find_embedding'):
+                if self.embedding_tries > 1:
+                    embeddings = find_best_embedding(S, edgeset, self.embedding_tries, self.embedding_timeout)
+                elif self.embedding_timeout is not None:
+                    embeddings = find_embedding(S, edgeset, timeout=self.embedding_timeout)
+                else:
+                    embeddings = find_embedding(S, edgeset)
 
             # sometimes it fails, often because the problem is too large
-            if J and not embeddings:
+            if len(embeddings) < len(h_list):
                 raise Exception('No embedding found')
 
-            # now it is possible that h_list might include nodes not in embedding, so let's
-            # handle that case here
-            if len(h_list) > len(embeddings):
-                emb_qubits = set().union(*embeddings)
-                while len(h_list) > len(embeddings):
-                    for v in sampler.solver.properties['qubits']:
-                        if v not in emb_qubits:
-                            embeddings.append([v])
-                            emb_qubits.add(v)
-                            break
-
-            if embedding_tag is not None:
-                # save the embedding for posterity
-                self.cached_embeddings[embedding_tag] = embeddings
-        else:
-            # the user has asserted that we can reuse a previously created embedding
-            embeddings = self.cached_embeddings[embedding_tag]
+            # save the embedding for posterity
+            self.cached_embeddings[key] = embeddings
+
+            if store is not None and embedding_tag is None:
+                store.put(sampler.solver_name, self._get_adjacency_fingerprint(), fingerprint, embeddings)
+
+        # problems with the same structure map onto the same couplers, so that mapping
+        # is worked out once per embedding
+        compiled = self._compiled_embeddings.get(key)
+        if compiled is None or compiled.embeddings is not embeddings:
+            with metrics.stage('compile_embedding'):
+                compiled = CompiledEmbedding(embeddings, edgeset, J)
+            self._compiled_embeddings[key] = compiled
 
         # embed the problem
-        h0, j0, jc, new_emb = embed_problem(h_list, J, embeddings, edgeset)
+        with metrics.stage('embed_problem'):
+            h0, emb_j = compiled.embed(h_list, J)
+        new_emb = embeddings
 
-        # combine jc and j0
-        emb_j = j0.copy()
-        emb_j.update(jc)
+        if metrics:
+            lengths = [len(chain) for chain in new_emb]
+            metrics.set('num_variables', len(lengths))
+            metrics.set('num_qubits', sum(lengths))
+            metrics.set('max_chain_length', max(lengths))
 
         # pass the chains we made into the sampler if it wants them
         if 'chains' in sampler.solver.properties['parameters'] and 'chains' not in sapi_kwargs:
             sapi_kwargs['chains'] = new_emb
 
-        # invoke the child sampler
-        emb_response = sampler.sample_ising(h0, emb_j, **sapi_kwargs)
+        return h0, emb_j, new_emb, sapi_kwargs
+
+    def _response_cache_key(self, h, J, embedding_tag, chain_break_method, aggregate, sapi_kwargs):
+        params = dict(sapi_kwargs, embedding_tag=embedding_tag, chain_break_method=chain_break_method,
+                      aggregate=aggregate, roof_duality=self.roof_duality)
+        # identify the child's solver and connection, or the child itself if it is not a
+        # SAPI sampler
+        structure_key = getattr(self._child, '_structure_key', None)
+        solver = structure_key() if structure_key is not None else self._child
+        return ('EmbeddingComposite', solver, problem_fingerprint(h, J, params))
+
+    def _get_adjacency_fingerprint(self):
+        # the child's structure does not change, so only fingerprint it once
+        if self._adjacency_fingerprint is None:
+            nodes, edges = self._child.structure
+            self._adjacency_fingerprint = adjacency_fingerprint(nodes, edges)
+        return self._adjacency_fingerprint
+
+
+class DecompositionComposite(dimod.TemplateComposite):
+    """Composite for solving problems larger than its child sampler can
+    take by breaking them into subproblems.
+
+    Starting from a random solution improved by tabu search, each iteration
+    selects the `subproblem_size` variables with the most impact on the
+    energy (those whose flip would lower it most, or raise it least),
+    clamps the rest to their values in the incumbent solution and solves the
+    resulting subproblem with the child sampler. The child's best sample is
+    merged into the incumbent, which is then improved with a tabu search.
+    Successive iterations work through the variables in order of impact, so
+    each pass covers all of them.
+
+    Args:
+        sampler: An unstructured dimod sampler, typically an
+            :class:`EmbeddingComposite`.
+        subproblem_size (int, optional): The number of variables in each
+            subproblem. Should be small enough for the child to embed.
+            Default 50.
+        max_iter (int, optional): The maximum number of subproblems to
+            solve. Default 20.
+        timeout (float, optional): The wall-clock budget in seconds. No
+            new subproblem is started once it is spent. Default None, no
+            limit.
+        tabu_steps (int, optional): The number of flips in each tabu
+            search, see :func:`tabu_search`.
+        random_seed (int, optional): Seed for the starting solution and
+            the tabu search.
+
+    Attributes:
+        children (list): [`sampler`] where `sampler` is the input sampler.
+        structure: None, the composite is unstructured.
 
-        # we need the samples back into lists for the unembed_answer function
-        answers = [[sample[i] for i in range(len(sample))] for sample in emb_response]
+    Examples:
+        >>> sampler = sapi.DecompositionComposite(
+        ...     sapi.EmbeddingComposite(sapi.SAPILocalSampler('c4-sw_optimize')), subproblem_size=20)
+        >>> h = {v: random.uniform(-1, 1) for v in range(200)}
+        >>> J = {(u, v): random.uniform(-1, 1) for u, v in itertools.combinations(h, 2) if random.random() < .05}
+        >>> response = sampler.sample_ising(h, J)
+
+    """
+    def __init__(self, sampler, subproblem_size=50, max_iter=20, timeout=None, tabu_steps=None,
+                 random_seed=None):
+        if subproblem_size < 1:
+            raise ValueError("'subproblem_size' must be a positive integer")
+
+        # puts sampler into self.children
+        dimod.TemplateComposite.__init__(self, sampler)
+
+        self._child = sampler  # faster access than self.children[0]
+
+        self.structure = None
 
-        # unemnbed
-        solutions = unembed_answer(answers, new_emb, 'minimize_energy', h_list, J)
+        self.subproblem_size = subproblem_size
+        self.max_iter = max_iter
+        self.timeout = timeout
+        self.tabu_steps = tabu_steps
+        self._random_state = np.random.RandomState(random_seed)
 
-        # and back once again into dicts for dimod...
-        samples = ({v: sample[v] for v in h} for sample in solutions)
-        sample_data = (data for __, data in emb_response.samples(data=True))
-        response = dimod.SpinResponse()
-        response.add_samples_from(samples, sample_data=sample_data, h=h, J=J)
+    @dimod.decorators.ising(1, 2)
+    @dimod.decorators.ising_index_labels(1, 2)
+    def sample_ising(self, h, J, compact=False, **kwargs):
+        """Solve an Ising problem by decomposing it into subproblems.
+
+        Args:
+            h (dict/list): The linear terms in the Ising problem.
+            J (dict): The quadratic terms in the Ising problem.
+            compact (bool, optional): If True, return an
+                :class:`ArraySpinResponse`. Default False.
+            Additional keyword parameters are passed to the child's
+            sample_ising for every subproblem.
+
+        Returns:
+            :class:`dimod.SpinResponse`/:class:`ArraySpinResponse`: A
+            response with the best solution found. The number of
+            subproblems solved is stored in the response data as
+            'num_subproblems'.
+
+        """
+        deadline = None if self.timeout is None else time.time() + self.timeout
+        random_state = self._random_state
 
+        num_variables = len(set(h).union(*J))
+        problem = _IsingArrays(h, J, num_variables)
+
+        incumbent, best_energy = _tabu_search(problem, None, self.tabu_steps, None, random_state)
+
+        size = min(self.subproblem_size, num_variables)
+        order = []  # the variables still to visit in this pass, by impact
+        iteration = 0
+        while num_variables and iteration < self.max_iter:
+            if deadline is not None and time.time() >= deadline:
+                break
+
+            if len(order) < size:
+                deltas = -2. * incumbent * problem.fields(incumbent)
+                order = np.argsort(deltas, kind='mergesort').tolist()
+
+            variables, order = order[:size], order[size:]
+
+            spins = self._solve_subproblem(problem, incumbent, variables, kwargs)
+            iteration += 1
+
+            candidate = incumbent.copy()
+            candidate[variables] = spins
+
+            candidate, energy = _tabu_search(problem, candidate, self.tabu_steps, None, random_state)
+            if energy <= best_energy:
+                incumbent, best_energy = candidate, energy
+
+        response = ArraySpinResponse(range(num_variables), data={'num_subproblems': iteration})
+        response.add_samples_from_array(incumbent.reshape(1, -1), [best_energy],
+                                        data_vectors={'num_occurrences': [1]}, sorted_by_energy=True)
+
+        if compact:
+            return response
+        return response.as_spin_response()
+
+    def _solve_subproblem(self, problem, incumbent, variables, kwargs):
+        """Solve the problem restricted to `variables` with the others clamped to
+        their values in the incumbent, returning the child's best spins."""
+        variables = np.asarray(variables, dtype=np.int64)
+
+        position = np.full(problem.num_variables, -1, dtype=np.int64)
+        position[variables] = np.arange(len(variables))
+        inside = position >= 0
+
+        # couplers to clamped variables become linear biases
+        h_sub = problem.h[variables].copy()
+        rows, cols, data = problem.rows, problem.cols, problem.data
+        clamped = inside[rows] & ~inside[cols]
+        np.add.at(h_sub, position[rows[clamped]], data[clamped] * incumbent[cols[clamped]])
+
+        us, vs = problem.us, problem.vs
+        internal = inside[us] & inside[vs]
+        J_sub = dict(zip(zip(position[us[internal]].tolist(), position[vs[internal]].tolist()),
+                         problem.biases[internal].tolist()))
+
+        response = self._child.sample_ising(dict(enumerate(h_sub.tolist())), J_sub, **kwargs)
+
+        sample = next(iter(response))
+        return np.asarray([sample[idx] for idx in range(len(variables))], dtype=np.int8)
+
+
+class PackingComposite(dimod.TemplateComposite):
+    """Composite for solving many small problems in a single submission by
+    embedding them into disjoint regions of its child's structure.
+
+    Problems are placed one after another, each embedded into the qubits
+    that the problems before it have not used. When a problem does not fit,
+    the problems placed so far are submitted together and a new submission
+    is started. The placements are cached, so a workload that repeats the
+    same structures reuses them without searching for embeddings again.
+
+    Args:
+        sampler: A structured dwave_sapi_dimod sampler object.
+        layout_cache_size (int, optional): The maximum number of placements
+            to keep. Default 128.
+
+    Attributes:
+        children (list): [`sampler`] where `sampler` is the input sampler.
+        structure: None, the composite is unstructured.
+
+    Examples:
+        >>> sampler = sapi.PackingComposite(sapi.SAPILocalSampler('c4-sw_optimize'))
+        >>> J = {(0, 1): 1, (1, 2): 1, (0, 2): 1}
+        >>> responses = sampler.sample_ising_packed([({0: b}, J) for b in range(-5, 5)])
+        >>> responses[0].data['num_packed']
+        10
+
+    """
+    def __init__(self, sampler, layout_cache_size=128):
+        # puts sampler into self.children
+        dimod.TemplateComposite.__init__(self, sampler)
+
+        self._child = sampler  # faster access than self.children[0]
+
+        self.structure = None
+
+        # (structures placed so far..., structure) -> embeddings, or [] if it
+        # does not fit
+        self._layouts = EmbeddingCache(layout_cache_size)
+
+    def sample_ising(self, h, J, **kwargs):
+        """Embed and solve a single Ising problem, see `sample_ising_packed`."""
+        response, = self.sample_ising_packed([(h, J)], **kwargs)
         return response
+
+    def sample_ising_packed(self, problems, compact=False, chain_break_method='minimize_energy',
+                            aggregate=False, **sapi_kwargs):
+        """Solve many Ising problems, packing as many as fit into each
+        submission.
+
+        Args:
+            problems (iterable[tuple]): The Ising problems to solve as
+                (h, J) pairs, each of the form accepted by `sample_ising`.
+            compact (bool, optional): If True, return
+                :class:`ArraySpinResponse` objects. Default False.
+            chain_break_method (str, optional): How to resolve broken
+                chains, see :func:`unembed_samples`.
+            aggregate (bool, optional): If True, merge the repeated samples
+                of each problem. Default False.
+            Additional keyword parameters are the same as for
+            SAPI's solve_ising function and apply to every submission.
+
+        Returns:
+            list: The :class:`dimod.SpinResponse` for each problem, in the
+            order of `problems`. The number of problems that shared its
+            submission is stored in each response's data as 'num_packed'.
+
+        """
+        sampler = self._child
+        (__, edgeset) = sampler.structure
+
+        # index-label and reduce every problem
+        prepared = []
+        for h, J in problems:
+            if isinstance(h, list):
+                h = dict(enumerate(h))
+            h, J, inv_relabel = _index_label_ising(h, J)
+            reduced = reduce_ising(h, J)
+            prepared.append((h, J, inv_relabel, reduced,
+                             structure_fingerprint(len(reduced[0]), reduced[1])))
+
+        # place the problems that need the solver, submitting each batch as soon as
+        # it is full so that it is solved while the next one is placed
+        batches = []  # (indices, embeddings, future)
+        indices, embeddings, placed = [], [], ()
+        for idx, (__, __, __, reduced, fingerprint) in enumerate(prepared):
+            if not reduced[2]:
+                continue
+
+            layout = self._place(placed, fingerprint, reduced, embeddings, edgeset)
+            if layout is None and indices:
+                batches.append((indices, embeddings, self._submit(prepared, indices, embeddings, sapi_kwargs)))
+                indices, embeddings, placed = [], [], ()
+                layout = self._place(placed, fingerprint, reduced, embeddings, edgeset)
+            if layout is None:
+                raise Exception('No embedding found')
+
+            indices.append(idx)
+            embeddings.append(layout)
+            placed += (fingerprint,)
+        if indices:
+            batches.append((indices, embeddings, self._submit(prepared, indices, embeddings, sapi_kwargs)))
+
+        responses = [None] * len(prepared)
+
+        for idx, (h, J, __, reduced, __) in enumerate(prepared):
+            if not reduced[2]:
+                responses[idx] = _fixed_response(h, J, reduced[3], compact,
+                                                 sapi_kwargs.get('num_reads', _DEFAULT_NUM_READS))
+                responses[idx].data['num_packed'] = 1
+
+        for indices, __, (future, new_embs) in batches:
+            emb_response = future.result()
+            for idx, new_emb in zip(indices, new_embs):
+                h, J, __, reduced, __ = prepared[idx]
+                response = _unembed_response(emb_response, new_emb, h, J, reduced, compact, chain_break_method,
+                                             aggregate)
+                response.data['num_packed'] = len(indices)
+                responses[idx] = response
+
+        for idx, (__, __, inv_relabel, __, __) in enumerate(prepared):
+            if inv_relabel is not None:
+                responses[idx] = responses[idx].relabel_samples(inv_relabel)
+
+        return responses
+
+    def sample_qubo_packed(self, Qs, **kwargs):
+        """Solve many QUBOs, packing as many as fit into each submission.
+
+        See `sample_ising_packed` for the accepted keyword arguments.
+
+        Returns:
+            list: The :class:`dimod.BinaryResponse` for each QUBO, in the
+            order of `Qs`.
+
+        """
+        problems = []
+        offsets = []
+        for Q in Qs:
+            h, J, offset = dimod.qubo_to_ising(Q)
+            problems.append((h, J))
+            offsets.append(offset)
+
+        responses = self.sample_ising_packed(problems, **kwargs)
+        return [response.as_binary(offset) for response, offset in zip(responses, offsets)]
+
+    def _place(self, placed, fingerprint, reduced, embeddings, edgeset):
+        """Embed the reduced problem into the qubits not used by `embeddings`,
+        returning None if it does not fit."""
+        used = set()
+        for chains in embeddings:
+            for chain in chains:
+                used.update(chain)
+
+        # the earlier problems might have been placed differently if their layouts
+        # were evicted, so a cached layout is only used if it is still free
+        key = placed + (fingerprint,)
+        layout = self._layouts.get(key)
+        if layout is not None and not any(q in used for chain in layout for q in chain):
+            return layout or None
+
+        h_reduced, J_reduced, __, __ = reduced
+
+        free = [(u, v) for u, v in edgeset if u not in used and v not in used]
+
+        S = set(J_reduced)
+        S.update({(v, v) for v in h_reduced})
+
+        from dwave_sapi2.embedding import find_embedding
+        layout = find_embedding(S, free) if free else []
+        if len(layout) < len(h_reduced):
+            layout = []
+
+        self._layouts[key] = layout
+        return layout or None
+
+    def _submit(self, prepared, indices, embeddings, sapi_kwargs):
+        """Combine the problems placed in one batch and submit them together."""
+        sampler = self._child
+        (__, edgeset) = sampler.structure
+
+        # the combined problem has the reduced problems side by side
+        h_list = []
+        J = {}
+        combined_emb = []
+        for idx, chains in zip(indices, embeddings):
+            h_reduced, J_reduced, __, __ = prepared[idx][3]
+            offset = len(h_list)
+            h_list.extend(h_reduced[v] for v in range(len(h_reduced)))
+            J.update({(u + offset, v + offset): bias for (u, v), bias in iteritems(J_reduced)})
+            combined_emb.extend(chains)
+
+        from dwave_sapi2.embedding import embed_problem
+        h0, j0, jc, new_emb = embed_problem(h_list, J, combined_emb, edgeset)
+
+        emb_j = j0.copy()
+        emb_j.update(jc)
+
+        kwargs = dict(sapi_kwargs)
+        if 'chains' in sampler.solver.properties['parameters'] and 'chains' not in kwargs:
+            kwargs['chains'] = new_emb
+
+        future = sampler.sample_ising_async(h0, emb_j, compact=True, **kwargs)
+
+        # split the chains back up by problem
+        new_embs = []
+        start = 0
+        for chains in embeddings:
+            new_embs.append(new_emb[start:start + len(chains)])
+            start += len(chains)
+
+        return future, new_embs
+
+
+class SpinReversalComposite(dimod.TemplateComposite):
+    """Composite for applying spin-reversal transforms (gauges) to a
+    problem.
+
+    Each gauge flips the sign of a random subset of the variables, which
+    changes the biases sent to the solver but not the problem being solved,
+    averaging out the solver's systematic errors. All of the gauged
+    problems are submitted at once, sharing `num_reads` between them, so
+    using several gauges does not take several times longer.
+
+    Args:
+        sampler: A dwave_sapi_dimod sampler or composite with a
+            `sample_ising_async` method that accepts `compact`, such as
+            :class:`SAPISampler` or :class:`EmbeddingComposite`.
+        num_gauges (int, optional): The number of gauges. Default 4.
+        random_seed (int, optional): Seed for generating the gauges.
+
+    Attributes:
+        children (list): [`sampler`] where `sampler` is the input sampler.
+        structure: The structure of the child sampler, gauges do not change
+            it.
+
+    Examples:
+        >>> sampler = sapi.SpinReversalComposite(
+        ...     sapi.EmbeddingComposite(sapi.SAPILocalSampler('c4-sw_optimize')), num_gauges=5)
+        >>> response = sampler.sample_ising({0: .5}, {(0, 1): 1, (1, 2): 1, (0, 2): 1}, num_reads=100)
+
+    """
+    def __init__(self, sampler, num_gauges=4, random_seed=None):
+        if num_gauges < 1:
+            raise ValueError("'num_gauges' must be a positive integer")
+
+        # puts sampler into self.children
+        dimod.TemplateComposite.__init__(self, sampler)
+
+        self._child = sampler  # faster access than self.children[0]
+
+        self.num_gauges = num_gauges
+        self._random_state = np.random.RandomState(random_seed)
+
+    @property
+    def structure(self):
+        # the child's structure is only looked up when needed, see SAPILocalSampler
+        return self._child.structure
+
+    @structure.setter
+    def structure(self, structure):
+        # dimod.TemplateComposite sets None, but the structure is always the child's
+        pass
+
+    @dimod.decorators.ising(1, 2)
+    def sample_ising(self, h, J, num_reads=_DEFAULT_NUM_READS, compact=False, aggregate=False, **kwargs):
+        """Solve the Ising problem under several random gauges.
+
+        Args:
+            h (dict/list): The linear terms in the Ising problem.
+            J (dict): The quadratic terms in the Ising problem.
+            num_reads (int, optional): The total number of reads, split as
+                evenly as possible between the gauges. Default 50.
+            compact (bool, optional): If True, return an
+                :class:`ArraySpinResponse`. Default False.
+            aggregate (bool, optional): If True, merge repeated samples,
+                including the same sample found under different gauges.
+                Default False.
+            Additional keyword parameters are passed to the child's
+            sample_ising_async for every gauge.
+
+        Returns:
+            :class:`dimod.SpinResponse`/:class:`ArraySpinResponse`: The
+            samples from all of the gauges, transformed back to the
+            original problem.
+
+        """
+        variables = list(set(h).union(*J))
+
+        # never more gauges than reads
+        num_gauges = max(min(self.num_gauges, num_reads), 1)
+        reads = [num_reads // num_gauges + (idx < num_reads % num_gauges) for idx in range(num_gauges)]
+
+        flips = self._random_state.randint(2, size=(num_gauges, len(variables))).astype(np.int8) * 2 - 1
+
+        futures = []
+        for gauge, gauge_reads in zip(flips, reads):
+            flip = dict(zip(variables, gauge.tolist()))
+            h_gauged = {v: bias * flip[v] for v, bias in iteritems(h)}
+            J_gauged = {(u, v): bias * flip[u] * flip[v] for (u, v), bias in iteritems(J)}
+            futures.append(self._child.sample_ising_async(h_gauged, J_gauged, num_reads=gauge_reads,
+                                                          compact=True, aggregate=aggregate, **kwargs))
+
+        response = _merge_gauged_responses([future.result() for future in futures], flips, variables)
+        if aggregate:
+            response = response.aggregate()
+
+        if compact:
+            return response
+        return response.as_spin_response()
+
+
+def _merge_gauged_responses(responses, flips, variables):
+    """Undo each gauge and combine the responses into one ArraySpinResponse."""
+    index = {v: idx for idx, v in enumerate(variables)}
+
+    # the responses might not share a column order, or might not include variables
+    # without biases
+    columns = responses[0].variables
+    names = set.intersection(*(set(response.data_vectors) for response in responses))
+
+    samples = []
+    energies = []
+    data_vectors = {name: [] for name in names}
+    for response, gauge in zip(responses, flips):
+        order = [response.index[v] for v in columns]
+        samples.append(response.samples_array()[:, order] * gauge[[index[v] for v in columns]])
+        energies.append(response.energies_array())
+        for name in names:
+            data_vectors[name].append(response.data_vectors[name])
+
+    merged = ArraySpinResponse(columns)
+    merged.add_samples_from_array(np.concatenate(samples), np.concatenate(energies),
+                                  {name: np.concatenate(vectors) for name, vectors in iteritems(data_vectors)})
+    return merged
+
+
+def _unembed_response(emb_response, embeddings, h, J, reduced, compact=False,
+                      chain_break_method='minimize_energy', aggregate=False):
+    """Unembed the samples in the child sampler's (array-backed) response and
+    restore the variables removed by reduce_ising."""
+    h_reduced, J_reduced, variables, fixed = reduced
+    h_list = [h_reduced[v] for v in range(len(h_reduced))]
+
+    # h0 covers every qubit, so the columns of the child's samples are the qubits
+    # in order
+    samples, chain_break_fraction, rows = unembed_samples(emb_response.samples_array(), embeddings,
+                                                          chain_break_method, h_list, J_reduced)
+
+    data_vectors = {name: vector[rows] for name, vector in iteritems(emb_response.data_vectors)}
+    data_vectors['chain_break_fraction'] = chain_break_fraction
+
+    if aggregate and 'num_occurrences' in data_vectors and not all(fixed.values()):
+        # the child has already merged its reads, give every read of a free variable its
+        # own random value rather than one per merged sample
+        repeats = data_vectors['num_occurrences']
+        samples = np.repeat(samples, repeats, axis=0)
+        data_vectors = {name: np.repeat(vector, repeats, axis=0) for name, vector in iteritems(data_vectors)}
+        data_vectors['num_occurrences'] = np.ones(len(samples), dtype=repeats.dtype)
+
+    # h and J are index-labelled so the columns of the samples are the variables
+    response = ArraySpinResponse(range(len(variables) + len(fixed)))
+    if 'timing' in emb_response.data:
+        response.data['timing'] = emb_response.data['timing']
+    samples = restore_samples(samples, variables, fixed, response.index)
+    response.add_samples_from_array(samples, data_vectors=data_vectors, h=h, J=J)
+
+    if aggregate:
+        # samples whose chains broke differently, or that differ only in their free
+        # variables, can end up the same
+        response = response.aggregate()
+
+    if compact:
+        return response
+    return response.as_spin_response()
+
+
+def _copy_response(response):
+    """A copy of an array-backed response that can be changed without
+    changing the original. The arrays are shared, they are never modified."""
+    copy = response._copy_with()
+    copy.data = dict(response.data)
+    copy.data_vectors = dict(response.data_vectors)
+    return copy
+
+
+def _response_nbytes(response):
+    return (response.samples_array().nbytes + response.energies_array().nbytes +
+            sum(np.asarray(vector).nbytes for vector in response.data_vectors.values()))
+
+
+def _fixed_response(h, J, fixed, compact=False, num_reads=_DEFAULT_NUM_READS):
+    """The response for an index-labelled problem whose variables were all fixed,
+    as if it had been read num_reads times."""
+    response = ArraySpinResponse(range(len(fixed)))
+    samples = restore_samples(np.empty((num_reads, 0)), [], fixed, response.index)
+    data_vectors = {'num_occurrences': np.ones(num_reads, dtype=int),
+                    'chain_break_fraction': np.zeros(num_reads)}
+    response.add_samples_from_array(samples, data_vectors=data_vectors, h=h, J=J)
+
+    # like the solvers, report each distinct sample once
+    response = response.aggregate()
+
+    if compact:
+        return response
+    return response.as_spin_response()
+
+
+def _index_label_ising(h, J):
+    """Relabel the variables of h and J to be the indices 0, n-1.
+
+    Does the same relabelling as dimod's ising_index_labels decorator. Returns
+    the relabelled h and J and the inverse mapping, or None if the variables
+    were already index-labelled.
+    """
+    nodes = set().union(*J) | set(h)
+
+    if all(idx in nodes for idx in range(len(nodes))):
+        return h, J, None
+
+    try:
+        inv_relabel = dict(enumerate(sorted(nodes)))
+    except TypeError:
+        inv_relabel = dict(enumerate(nodes))
+    relabel = {v: idx for idx, v in iteritems(inv_relabel)}
+
+    h = {relabel[v]: bias for v, bias in iteritems(h)}
+    J = {(relabel[u], relabel[v]): bias for (u, v), bias in iteritems(J)}
+
+    return h, J, inv_relabel
@@ -0,0 +1,509 @@
+"""
+Samplers that spread problems over several backend samplers, such as
+SAPISamplers for different solvers and SAPILocalSamplers.
+"""
+import collections
+import numbers
+import threading
+import time
+
+import dimod
+import numpy as np
+
+from dwave_sapi_dimod.futures import submit_many
+from dwave_sapi_dimod.instrumentation import _metrics
+from dwave_sapi_dimod.samplers import _check_structure
+
+__all__ = ['HedgedSampler', 'LoadBalancingSampler', 'Backend',
+           'least_outstanding', 'lowest_latency', 'fits_structure']
+
+# bounds of the interval between checks when waiting on backends of different kinds
+_MIN_POLL_INTERVAL = .001
+_MAX_POLL_INTERVAL = .05
+
+# latencies observed before the hedge delay is taken from them
+_MIN_HISTORY = 10
+
+
+class HedgedSampler(dimod.TemplateComposite):
+    """Sampler that sends each problem to a primary backend and, if the
+    primary is slow to answer, also to the backups.
+
+    The problem goes to the first backend. If it has not answered after the
+    hedge delay, the problem is also sent to the second backend, after
+    twice the delay to the third, and so on. The first answer is returned
+    and the problems still outstanding on the other backends are cancelled.
+    This bounds the tail latency at the cost of occasionally solving a
+    problem twice.
+
+    Args:
+        samplers (list): The backends, primary first. Each needs
+            `sample_ising_async` and `sample_qubo_async` methods, as
+            :class:`SAPISampler`, :class:`SAPILocalSampler` and
+            :class:`EmbeddingComposite` have. Wrap the backends in their own
+            :class:`EmbeddingComposite` to solve problems that do not fit
+            their structure, each then reuses its own cached embeddings.
+        hedge_delay (float, optional): Seconds to wait on a backend before
+            sending the problem to the next one. Used until enough
+            latencies have been observed if `hedge_percentile` is given.
+        hedge_percentile (float, optional): If given, the hedge delay is
+            this percentile, between 0 and 100, of the primary's observed
+            latencies. For example 95 hedges the slowest 5% of problems.
+        history_size (int, optional): The number of latencies kept for
+            each backend. Default 100.
+
+    Attributes:
+        children (list): The backends.
+        structure: None, backends may have different structures.
+        latencies (list[:class:`collections.deque`]): The most recent
+            latencies in seconds of each backend's answers that were used.
+            The primary's are recorded for every problem, those it did not
+            answer first as the time it had been waited on.
+
+    Examples:
+        >>> sampler = sapi.HedgedSampler([sapi.EmbeddingComposite(sapi.SAPISampler(name, url, token)),
+        ...                               sapi.EmbeddingComposite(sapi.SAPILocalSampler('c4-sw_optimize'))],
+        ...                              hedge_delay=2., hedge_percentile=99)
+        >>> response = sampler.sample_ising({'a': 1}, {('a', 'b'): -1})
+        >>> response.data['backend']  # the index of the backend that answered
+        0
+
+    """
+    def __init__(self, samplers, hedge_delay=None, hedge_percentile=None, history_size=100):
+        samplers = list(samplers)
+        if not samplers:
+            raise ValueError("at least one sampler is required")
+        if hedge_delay is None and hedge_percentile is None:
+            raise ValueError("one of 'hedge_delay' and 'hedge_percentile' is required")
+        if hedge_delay is not None and hedge_delay < 0:
+            raise ValueError("'hedge_delay' must be non-negative")
+        if hedge_percentile is not None and not 0 <= hedge_percentile <= 100:
+            raise ValueError("'hedge_percentile' must be between 0 and 100")
+
+        # puts samplers into self.children
+        dimod.TemplateComposite.__init__(self, *samplers)
+
+        self.structure = None
+
+        self.hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.latencies = [collections.deque(maxlen=history_size) for __ in samplers]
+
+    @dimod.decorators.ising(1, 2)
+    def sample_ising(self, h, J, **kwargs):
+        """Solve the Ising problem on whichever backend answers first.
+
+        Args:
+            h (dict/list): The linear terms in the Ising problem.
+            J (dict): The quadratic terms in the Ising problem.
+            Additional keyword parameters are passed to the backends'
+            sample_ising_async.
+
+        Returns:
+            The response of the backend that answered first. Its index in
+            `children` is stored in the response's data as 'backend'.
+
+        """
+        return self._hedge(lambda sampler: sampler.sample_ising_async(h, J, **kwargs),
+                           _metrics('HedgedSampler.sample_ising'))
+
+    @dimod.decorators.qubo(1)
+    def sample_qubo(self, Q, **kwargs):
+        """Solve the QUBO on whichever backend answers first.
+
+        Args:
+            Q (dict): A dictionary defining the QUBO. Should be of the form
+                {(u, v): bias} where u, v are variables and bias is numeric.
+            Additional keyword parameters are passed to the backends'
+            sample_qubo_async.
+
+        Returns:
+            The response of the backend that answered first. Its index in
+            `children` is stored in the response's data as 'backend'.
+
+        """
+        return self._hedge(lambda sampler: sampler.sample_qubo_async(Q, **kwargs),
+                           _metrics('HedgedSampler.sample_qubo'))
+
+    def current_hedge_delay(self):
+        """float: The seconds to wait on a backend before sending the
+        problem to the next one, or None to never hedge."""
+        primary = self.latencies[0]
+        if self.hedge_percentile is not None and len(primary) >= _MIN_HISTORY:
+            return float(np.percentile(primary, self.hedge_percentile))
+        return self.hedge_delay
+
+    def _hedge(self, submit, metrics):
+        samplers = self.children
+        delay = self.current_hedge_delay()
+
+        start = time.time()
+        futures = [submit(samplers[0])]
+        submitted = [start]
+
+        try:
+            with metrics.stage('wait'):
+                while True:
+                    if delay is not None and len(futures) < len(samplers):
+                        timeout = start + len(futures) * delay - time.time()
+                    else:
+                        timeout = None
+
+                    winner = _first_done(futures, timeout)
+                    if winner is not None:
+                        break
+
+                    futures.append(submit(samplers[len(futures)]))
+                    submitted.append(time.time())
+        finally:
+            for future in futures:
+                if not future.done():
+                    future.cancel()
+
+        # the primary's time is recorded on every call, as a lower bound when it did not
+        # answer first, otherwise the hedge delay would only be taken over its fast answers
+        now = time.time()
+        self.latencies[0].append(now - submitted[0])
+        if winner:
+            self.latencies[winner].append(now - submitted[winner])
+
+        response = futures[winner].result()
+        response.data['backend'] = winner
+
+        metrics.set('backend', winner)
+        metrics.set('hedges', len(futures) - 1)
+        return metrics.emit(response)
+
+
+class Backend(object):
+    """A backend of a :class:`LoadBalancingSampler`, with statistics of
+    the problems sent to it.
+
+    Args:
+        sampler: The backend sampler.
+        history_size (int, optional): The number of latencies kept.
+            Default 100.
+
+    Attributes:
+        sampler: The backend sampler.
+        submitted (int): The number of problems sent to the backend.
+        completed (int): The number of those that have been solved.
+        latencies (:class:`collections.deque`): The most recent latencies,
+            in seconds from submission until the answer was seen.
+
+    """
+    def __init__(self, sampler, history_size=100):
+        self.sampler = sampler
+        self.submitted = 0
+        self.completed = 0
+        self.latencies = collections.deque(maxlen=history_size)
+
+        self._pending = {}  # id(future) -> (future, submission time)
+        self._lock = threading.Lock()
+
+    @property
+    def outstanding(self):
+        """int: The number of problems sent to the backend that are not yet
+        solved, its queue depth."""
+        for key, (future, __) in list(self._pending.items()):
+            if future.done():
+                self._finish(key)
+        return len(self._pending)
+
+    @property
+    def mean_latency(self):
+        """float: The mean of the recent latencies, or None if there are
+        none."""
+        latencies = list(self.latencies)
+        if not latencies:
+            return None
+        return sum(latencies) / len(latencies)
+
+    def percentile_latency(self, q):
+        """The `q`-th percentile of the recent latencies, or None if there
+        are none."""
+        latencies = list(self.latencies)
+        if not latencies:
+            return None
+        return float(np.percentile(latencies, q))
+
+    def fits(self, variables, edges):
+        """True if the problem with the given variables and interactions can
+        be sent to the backend as it is, without embedding.
+
+        The check is the one the samplers make before submitting a problem:
+        the variables must be index-labelled, and the variables and
+        interactions that are sent must be qubits and couplers. Backends
+        without a `hardware_graph`, such as :class:`EmbeddingComposite`,
+        accept any problem.
+
+        Args:
+            variables (iterable/dict): The variables of the problem. If a
+                dict of their linear biases, the variables without a bias
+                or an interaction, which are not sent, need not be qubits,
+                only within the range of the qubit labels.
+            edges (iterable): The interactions that are sent, those with
+                a non-zero bias.
+
+        Returns:
+            bool
+
+        """
+        graph = getattr(self.sampler, 'hardware_graph', None)
+        if graph is None:
+            return True
+
+        if not all(isinstance(v, numbers.Integral) for v in variables):
+            return False
+
+        # the samples are read from the answer's columns, so even the variables that
+        # are not sent need to be in range
+        if any(not 0 <= v < graph.num_qubits for v in variables):
+            return False
+
+        if isinstance(variables, dict):
+            active = {v for v, bias in variables.items() if bias}
+        else:
+            active = set(variables)
+        edges = list(edges)
+        active.update(*edges)
+
+        # the same check as the samplers make
+        try:
+            _check_structure(graph, active, edges)
+        except ValueError:
+            return False
+        return True
+
+    def _submit(self, submit):
+        """Submit a problem with `submit(sampler)` and track its future."""
+        future = submit(self.sampler)
+        key = id(future)
+        with self._lock:
+            self._pending[key] = (future, time.time())
+            self.submitted += 1
+
+        def finish(response):
+            self._finish(key)
+            return response
+        return future.then(finish)
+
+    def _finish(self, key):
+        with self._lock:
+            entry = self._pending.pop(key, None)
+            if entry is None:
+                return
+            self.completed += 1
+        self.latencies.append(time.time() - entry[1])
+
+
+def least_outstanding(backends, variables, edges):
+    """Policy choosing the backend with the fewest unsolved problems."""
+    return min(backends, key=lambda backend: backend.outstanding)
+
+
+def lowest_latency(backends, variables, edges):
+    """Policy choosing the backend expected to answer soonest, given its
+    queue depth and mean latency. Backends without observed latencies are
+    tried first."""
+    def expected(backend):
+        latency = backend.mean_latency
+        if latency is None:
+            return (0, backend.outstanding)
+        return (1, (backend.outstanding + 1) * latency)
+    return min(backends, key=expected)
+
+
+def fits_structure(backends, variables, edges):
+    """Policy choosing among the backends whose structure fits the problem
+    as it is, then among those that embed problems, the one with the fewest
+    unsolved problems."""
+    if not isinstance(variables, dict):
+        variables = list(variables)
+    edges = list(edges)
+
+    graphs = [backend for backend in backends if getattr(backend.sampler, 'hardware_graph', None) is not None]
+    candidates = [backend for backend in graphs if backend.fits(variables, edges)]
+    if not candidates:
+        candidates = [backend for backend in backends if backend not in graphs]
+    if not candidates:
+        raise ValueError('the problem does not fit the structure of any backend')
+    return least_outstanding(candidates, variables, edges)
+
+
+class LoadBalancingSampler(dimod.TemplateComposite):
+    """Sampler that spreads problems over several backends.
+
+    Each problem is sent to the backend chosen by the policy, which can use
+    the queue depth and latencies of every backend. Submitting many
+    problems at once with `sample_ising_many` keeps all of the backends
+    busy, so the throughput grows with their number.
+
+    Args:
+        samplers (list): The backends. Each needs `sample_ising_async` and
+            `sample_qubo_async` methods, as :class:`SAPISampler`,
+            :class:`SAPILocalSampler` and :class:`EmbeddingComposite` have.
+        policy (function, optional): Chooses the backend for each problem.
+            Accepts the list of :class:`Backend`, the linear biases of the
+            problem as a dict keyed by its variables and its interactions
+            with a non-zero bias, and returns one of the backends.
+            Default :func:`least_outstanding`, see also
+            :func:`lowest_latency` and :func:`fits_structure`.
+        history_size (int, optional): The number of latencies kept for
+            each backend. Default 100.
+
+    Attributes:
+        children (list): The backend samplers.
+        structure: None, backends may have different structures.
+        backends (list[:class:`Backend`]): The backends with their queue
+            depth and latency statistics.
+
+    Examples:
+        Small problems that fit are solved locally, the others are embedded
+        for the remote solver.
+
+        >>> sampler = sapi.LoadBalancingSampler([sapi.SAPILocalSampler('c4-sw_optimize'),
+        ...                                      sapi.EmbeddingComposite(sapi.SAPISampler(name, url, token))],
+        ...                                     policy=sapi.fits_structure)
+        >>> response = sampler.sample_ising({0: 1}, {(0, 4): -1})
+        >>> response.data['backend']
+        0
+
+    """
+    def __init__(self, samplers, policy=least_outstanding, history_size=100):
+        samplers = list(samplers)
+        if not samplers:
+            raise ValueError("at least one sampler is required")
+
+        # puts samplers into self.children
+        dimod.TemplateComposite.__init__(self, *samplers)
+
+        self.structure = None
+
+        self.policy = policy
+        self.backends = [Backend(sampler, history_size) for sampler in samplers]
+
+    @dimod.decorators.ising(1, 2)
+    def sample_ising(self, h, J, **kwargs):
+        """Solve the Ising problem on the backend chosen by the policy.
+
+        Args:
+            h (dict/list): The linear terms in the Ising problem.
+            J (dict): The quadratic terms in the Ising problem.
+            Additional keyword parameters are passed to the backend's
+            sample_ising_async.
+
+        Returns:
+            The backend's response. The index of the backend is stored in
+            the response's data as 'backend'.
+
+        """
+        return self.sample_ising_async(h, J, **kwargs).result()
+
+    @dimod.decorators.qubo(1)
+    def sample_qubo(self, Q, **kwargs):
+        """Solve the QUBO on the backend chosen by the policy.
+
+        Args:
+            Q (dict): A dictionary defining the QUBO.
+            Additional keyword parameters are passed to the backend's
+            sample_qubo_async.
+
+        Returns:
+            The backend's response. The index of the backend is stored in
+            the response's data as 'backend'.
+
+        """
+        return self.sample_qubo_async(Q, **kwargs).result()
+
+    @dimod.decorators.ising(1, 2)
+    def sample_ising_async(self, h, J, **kwargs):
+        """Submit the Ising problem to the backend chosen by the policy
+        without waiting for it to be solved.
+
+        Returns:
+            :class:`SAPIFuture`: A future that resolves to the backend's
+            response.
+
+        """
+        # the ising decorator has already added the variables of J to h
+        return self._dispatch(lambda sampler: sampler.sample_ising_async(h, J, **kwargs),
+                              h, [edge for edge, bias in J.items() if bias])
+
+    @dimod.decorators.qubo(1)
+    def sample_qubo_async(self, Q, **kwargs):
+        """Submit the QUBO to the backend chosen by the policy without
+        waiting for it to be solved.
+
+        Returns:
+            :class:`SAPIFuture`: A future that resolves to the backend's
+            response.
+
+        """
+        linear = {v: Q.get((v, v), 0.) for v in set().union(*Q)}
+        return self._dispatch(lambda sampler: sampler.sample_qubo_async(Q, **kwargs),
+                              linear, [(u, v) for (u, v), bias in Q.items() if u != v and bias])
+
+    def sample_ising_many(self, problems, max_in_flight=10, ordered=True, **kwargs):
+        """Solve many Ising problems, spread over the backends.
+
+        Args:
+            problems (iterable): (h, J) pairs.
+            max_in_flight (int, optional): The maximum number of problems
+                submitted at once across all of the backends. Default 10.
+            ordered (bool, optional): If True, responses are yielded in the
+                order of `problems`. Default True.
+            Additional keyword parameters are passed to the backends.
+
+        Yields:
+            The response for each problem, see :func:`submit_many`.
+
+        """
+        def submit(problem):
+            h, J = problem
+            return self.sample_ising_async(h, J, **kwargs)
+        return submit_many(submit, problems, max_in_flight, ordered)
+
+    def sample_qubo_many(self, Qs, max_in_flight=10, ordered=True, **kwargs):
+        """Solve many QUBOs, spread over the backends.
+
+        See `sample_ising_many`.
+
+        """
+        def submit(Q):
+            return self.sample_qubo_async(Q, **kwargs)
+        return submit_many(submit, Qs, max_in_flight, ordered)
+
+    def _dispatch(self, submit, variables, edges):
+        backend = self.policy(self.backends, variables, edges)
+        index = self.backends.index(backend)
+
+        def label(response):
+            response.data['backend'] = index
+            return response
+        return backend._submit(submit).then(label)
+
+
+def _first_done(futures, timeout=None):
+    """The index of the first of `futures` to be done, or None if none is
+    done within `timeout` seconds.
+
+    The futures can come from backends of different kinds, whose submitted
+    problems cannot be awaited together, so they are polled.
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    interval = _MIN_POLL_INTERVAL
+    while True:
+        for idx, future in enumerate(futures):
+            if future.done():
+                return idx
+
+        if deadline is None:
+            time.sleep(interval)
+        else:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            time.sleep(min(interval, remaining))
+
+        interval = min(2 * interval, _MAX_POLL_INTERVAL)
@@ -0,0 +1,346 @@
+"""
+Tools for finding and working with embeddings on top of SAPI's embedding
+functions.
+"""
+import multiprocessing
+import random
+import time
+
+import numpy as np
+
+
+from dwave_sapi_dimod import _PY2
+
+__all__ = ['find_best_embedding', 'embedding_quality', 'unembed_samples', 'CompiledEmbedding',
+           'CHAIN_BREAK_METHODS']
+
+if _PY2:
+    range = xrange
+    iteritems = lambda d: d.iteritems()
+else:
+    iteritems = lambda d: d.items()
+
+CHAIN_BREAK_METHODS = ('minimize_energy', 'majority_vote', 'weighted_random', 'discard')
+"""The ways :func:`unembed_samples` can resolve broken chains."""
+
+
+def find_best_embedding(S, A, num_tries=4, timeout=None, processes=None, random_seed=None):
+    """Run several randomized find_embedding attempts in parallel and return
+    the best embedding found.
+
+    Args:
+        S (iterable): The (u, v) edges of the problem graph, as accepted by
+            SAPI's find_embedding.
+        A (iterable): The (u, v) edges of the hardware graph.
+        num_tries (int, optional): The number of attempts, each with a
+            different random seed. Default 4.
+        timeout (float, optional): The wall-clock budget in seconds for the
+            whole search. Attempts still running when it expires are
+            abandoned. If None, wait for all of the attempts.
+        processes (int, optional): The number of worker processes. Defaults
+            to the smaller of `num_tries` and the number of CPUs. If 1, the
+            attempts are run one after the other in this process.
+        random_seed (int, optional): Seed used to generate the seed of each
+            attempt.
+
+    Returns:
+        list: The embeddings with the best :func:`embedding_quality`, in the
+        format returned by find_embedding, or an empty list if no attempt
+        found one.
+
+    Examples:
+        >>> nodes, edgeset = sapi.SAPILocalSampler('c4-sw_optimize').structure
+        >>> S = {(0, 1), (1, 2), (0, 2)}
+        >>> embeddings = sapi.find_best_embedding(S, edgeset, num_tries=8, timeout=10)
+
+    """
+    if num_tries < 1:
+        raise ValueError("'num_tries' must be a positive integer")
+
+    rng = random.Random(random_seed)
+    seeds = [rng.randint(0, 2**31 - 1) for __ in range(num_tries)]
+
+    # each attempt is also told about the budget so it stops searching by itself
+    params = {} if timeout is None else {'timeout': timeout}
+
+    if processes is None:
+        processes = min(num_tries, multiprocessing.cpu_count())
+
+    S = list(S)
+    A = list(A)
+
+    if processes == 1:
+        deadline = None if timeout is None else time.time() + timeout
+        candidates = []
+        for seed in seeds:
+            if deadline is not None and time.time() >= deadline:
+                break
+            candidates.append(_find_embedding((S, A, seed, params)))
+    else:
+        candidates = _find_embeddings_in_pool(S, A, seeds, params, processes, timeout)
+
+    candidates = [embeddings for embeddings in candidates if embeddings]
+
+    if not candidates:
+        return []
+
+    return min(candidates, key=embedding_quality)
+
+
+def _find_embeddings_in_pool(S, A, seeds, params, processes, timeout):
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = [pool.apply_async(_find_embedding, ((S, A, seed, params),)) for seed in seeds]
+
+        if timeout is None:
+            return [result.get() for result in results]
+
+        # wait for each in turn until the budget is spent, then take whatever is done
+        deadline = time.time() + timeout
+        for result in results:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            result.wait(remaining)
+
+        return [result.get() for result in results if result.ready() and result.successful()]
+    finally:
+        # abandon any attempts that are still running
+        pool.terminate()
+
+
+def _find_embedding(args):
+    # module-level so that it can be sent to the worker processes
+    S, A, seed, params = args
+    from dwave_sapi2.embedding import find_embedding
+    return find_embedding(S, A, random_seed=seed, **params)
+
+
+def embedding_quality(embeddings):
+    """The quality of an embedding, lower is better.
+
+    Args:
+        embeddings (list): The chains of qubits, one per variable, as
+            returned by find_embedding.
+
+    Returns:
+        tuple: (maximum chain length, total number of qubits). Longer chains
+        are more likely to break and so are penalized first.
+
+    """
+    lengths = [len(chain) for chain in embeddings]
+    return (max(lengths) if lengths else 0, sum(lengths))
+
+
+class CompiledEmbedding(object):
+    """An embedding together with the mapping of a problem structure onto
+    the hardware, so that problems that differ only in their biases can be
+    embedded without searching the hardware couplers again.
+
+    Embedding a problem is equivalent to SAPI's embed_problem, but the
+    chain couplers, the physical couplers of each interaction and the
+    factors that spread the biases over them are found once. Embedding
+    new biases then only gathers them into arrays.
+
+    Args:
+        embeddings (list): The chains of qubits, one per variable, as
+            returned by find_embedding.
+        edgeset (set): The (u, v) couplers of the hardware, as in the
+            samplers' `structure`, in either orientation.
+        edges (iterable): The (u, v) interactions of the problem, in
+            either orientation.
+
+    Attributes:
+        embeddings (list): The chains of qubits.
+        num_qubits (int): The length of the embedded linear biases.
+
+    Examples:
+        >>> compiled = sapi.CompiledEmbedding([[0, 4], [1]], {(0, 4), (4, 1)}, [(0, 1)])
+        >>> compiled.embed([1., -1.], {(0, 1): .5})
+        ([0.5, -1.0, 0.0, 0.0, 0.5], {(1, 4): 0.5, (0, 4): -1.0})
+
+    """
+    def __init__(self, embeddings, edgeset, edges):
+        self.embeddings = embeddings
+
+        # each coupler once, as (p, q) with p < q, whichever orientation the hardware lists
+        edgeset = {(p, q) if p < q else (q, p) for p, q in edgeset}
+
+        self.num_qubits = max([max(chain) for chain in embeddings if chain] +
+                              [max(edge) for edge in edgeset] + [-1]) + 1
+
+        # the linear bias of each variable is spread evenly over its chain
+        self._qubits = np.asarray([q for chain in embeddings for q in chain], dtype=np.int64)
+        self._owners = np.asarray([v for v, chain in enumerate(embeddings) for __ in chain], dtype=np.int64)
+        self._h_scale = np.asarray([1. / len(chain) for chain in embeddings for __ in chain])
+
+        # the quadratic bias of each interaction is spread evenly over the couplers
+        # between the two chains
+        self._edge_index = {}
+        couplers = []
+        coupler_edges = []
+        coupler_scale = []
+        for u, v in edges:
+            if u == v:
+                continue
+            edge = (u, v) if u < v else (v, u)
+            if edge in self._edge_index:
+                continue
+            self._edge_index[edge] = idx = len(self._edge_index)
+
+            u, v = edge
+            between = [(min(p, q), max(p, q)) for p in embeddings[u] for q in embeddings[v]]
+            between = [coupler for coupler in between if coupler in edgeset]
+            if not between:
+                raise ValueError('no coupler between the chains of variables {} and {}'.format(u, v))
+            couplers.extend(between)
+            coupler_edges.extend([idx] * len(between))
+            coupler_scale.extend([1. / len(between)] * len(between))
+
+        self._couplers = couplers
+        self._coupler_edges = np.asarray(coupler_edges, dtype=np.int64)
+        self._coupler_scale = np.asarray(coupler_scale)
+
+        self._chain_couplers = {(p, q): -1. for chain in embeddings
+                                for p in chain for q in chain if p < q and (p, q) in edgeset}
+
+    def embed(self, h, J):
+        """Embed a problem with the structure the embedding was compiled for.
+
+        Args:
+            h (list): The linear biases, indexed by variable.
+            J (dict): The quadratic biases. Every interaction must be one of
+                the `edges` the embedding was compiled for.
+
+        Returns:
+            tuple: (h0, J0) where h0 is the list of linear biases of the
+            qubits and J0 the dict of the biases of the couplers, with the
+            chain couplers set to -1.
+
+        """
+        h0 = np.zeros(self.num_qubits)
+        if len(self._qubits):
+            h0[self._qubits] = np.asarray(h, dtype=float)[self._owners] * self._h_scale
+
+        edge_index = self._edge_index
+        values = np.zeros(len(edge_index))
+        try:
+            for (u, v), bias in iteritems(J):
+                if u != v:
+                    values[edge_index[(u, v) if u < v else (v, u)]] += bias
+        except KeyError as err:
+            raise ValueError('interaction {} is not in the compiled structure'.format(err.args[0]))
+
+        J0 = dict(zip(self._couplers, (values[self._coupler_edges] * self._coupler_scale).tolist()))
+        J0.update(self._chain_couplers)
+
+        return h0.tolist(), J0
+
+
+def unembed_samples(samples, embeddings, chain_break_method='minimize_energy', h=None, J=None):
+    """Map spin-valued samples of an embedded problem back onto the variables
+    of the original problem.
+
+    Works on the whole samples matrix at once, rather than sample by sample
+    like SAPI's unembed_answer.
+
+    Args:
+        samples (array-like): A two dimensional array with a row per sample
+            and a column per qubit, with values -1 or 1.
+        embeddings (list): The chain of qubits for each variable, as
+            returned by find_embedding or embed_problem.
+        chain_break_method (str, optional): How to resolve chains whose
+            qubits disagree, one of:
+
+            * 'minimize_energy': start from the majority vote, then set each
+              variable with a broken chain to the value that minimizes its
+              energy given the other variables. Requires `h` and `J`.
+            * 'majority_vote': the value of most of the chain's qubits,
+              ties broken at random.
+            * 'weighted_random': +1 with probability equal to the fraction
+              of the chain's qubits that are +1.
+            * 'discard': drop the samples with any broken chain.
+
+            Default 'minimize_energy'.
+        h (list, optional): The linear biases of the original problem,
+            indexed by variable.
+        J (dict, optional): The quadratic biases of the original problem.
+
+    Returns:
+        tuple: (unembedded, chain_break_fraction, rows) where `unembedded`
+        is an int8 array with a row per kept sample and a column per
+        variable, `chain_break_fraction` is the fraction of broken chains in
+        each kept sample and `rows` are the indices of the kept samples in
+        `samples`.
+
+    Examples:
+        >>> samples = [[1, 1, -1], [1, -1, -1]]
+        >>> unembedded, broken, rows = sapi.unembed_samples(samples, [[0, 1], [2]], 'discard')
+        >>> unembedded.tolist(), broken.tolist(), rows.tolist()
+        ([[1, -1]], [0.0], [0])
+
+    """
+    if chain_break_method not in CHAIN_BREAK_METHODS:
+        raise ValueError("unknown chain_break_method {!r}, expected one of {}".format(
+            chain_break_method, CHAIN_BREAK_METHODS))
+    if chain_break_method == 'minimize_energy' and (h is None or J is None):
+        raise ValueError("'minimize_energy' needs the original problem's 'h' and 'J'")
+
+    samples = np.asarray(samples, dtype=np.int8)
+    num_samples = samples.shape[0]
+    num_variables = len(embeddings)
+
+    if not num_variables:
+        return (np.empty((num_samples, 0), dtype=np.int8), np.zeros(num_samples),
+                np.arange(num_samples))
+
+    # lay the chains out end to end so each can be summed with one reduceat
+    sizes = np.asarray([len(chain) for chain in embeddings])
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    qubits = np.asarray([q for chain in embeddings for q in chain])
+
+    sums = np.add.reduceat(samples[:, qubits].astype(np.int64), starts, axis=1)
+
+    # a chain is intact if all of its qubits agree
+    broken = np.abs(sums) != sizes
+    chain_break_fraction = broken.mean(axis=1)
+
+    if chain_break_method == 'weighted_random':
+        plus = (sums + sizes) / (2. * sizes)
+        unembedded = np.where(np.random.rand(*sums.shape) < plus, 1, -1).astype(np.int8)
+        return unembedded, chain_break_fraction, np.arange(num_samples)
+
+    # majority vote, with ties broken at random
+    ties = np.random.randint(2, size=sums.shape) * 2 - 1
+    unembedded = np.where(sums == 0, ties, np.sign(sums)).astype(np.int8)
+
+    if chain_break_method == 'discard':
+        rows = np.flatnonzero(~broken.any(axis=1))
+        return unembedded[rows], chain_break_fraction[rows], rows
+
+    if chain_break_method == 'minimize_energy':
+        _minimize_broken_chains(unembedded, broken, h, J)
+
+    return unembedded, chain_break_fraction, np.arange(num_samples)
+
+
+def _minimize_broken_chains(unembedded, broken, h, J):
+    """Greedily set each variable with a broken chain to the value that minimizes
+    its energy given the current values of its neighbours. Modifies `unembedded`
+    in place."""
+    neighbours = {}
+    for (u, v), bias in iteritems(J):
+        neighbours.setdefault(u, []).append((v, bias))
+        neighbours.setdefault(v, []).append((u, bias))
+
+    for v in np.flatnonzero(broken.any(axis=0)):
+        rows = broken[:, v]
+
+        field = np.full(np.count_nonzero(rows), h[v] if v < len(h) else 0., dtype=float)
+        if v in neighbours:
+            nbrs, biases = zip(*neighbours[v])
+            field += unembedded[np.ix_(rows, nbrs)].dot(np.asarray(biases, dtype=float))
+
+        # keep the vote where both values have the same energy
+        values = unembedded[rows, v]
+        unembedded[rows, v] = np.where(field > 0, -1, np.where(field < 0, 1, values))
@@ -0,0 +1,195 @@
+"""
+Futures are returned by the asynchronous sample methods. They wrap the
+problems submitted through SAPI's asynchronous interface and resolve to
+dimod responses once SAPI returns an answer.
+"""
+
+__all__ = ['SAPIFuture', 'wait', 'submit_many']
+
+# seconds between checks when waiting without a timeout
+_POLL_INTERVAL = 1.
+
+
+class SAPIFuture(object):
+    """A dimod response that is still being computed by SAPI.
+
+    Args:
+        submitted_problem: A submitted problem as returned by SAPI's
+            async_solve_ising or async_solve_qubo functions.
+        parse (function): Converts the answer returned by SAPI into a
+            dimod response.
+
+    Examples:
+        >>> sampler = sapi.SAPILocalSampler('c4-sw_optimize')
+        >>> future = sampler.sample_ising_async({0: 1}, {(0, 4): -1})
+        >>> response = future.result()  # blocks until the answer is ready
+
+    """
+    def __init__(self, submitted_problem, parse):
+        self._submitted_problem = submitted_problem
+        self._parse = parse
+
+        # the response is created once, the first time it is requested
+        self._response = None
+
+    def done(self):
+        """bool: True if SAPI has finished solving the problem."""
+        return self._submitted_problem.done()
+
+    def cancel(self):
+        """Cancel the submitted problem."""
+        self._submitted_problem.cancel()
+
+    def result(self):
+        """Block until the problem is solved and return the response.
+
+        Returns:
+            :class:`dimod.BinaryResponse`/:class:`dimod.SpinResponse`: The
+            response, as would be returned by the corresponding blocking
+            sample method.
+
+        """
+        if self._response is None:
+            self._response = self._parse(self._submitted_problem.result())
+        return self._response
+
+    def then(self, func):
+        """Create a new future that applies `func` to the response.
+
+        Args:
+            func (function): Accepts the response of this future and
+                returns a new response.
+
+        Returns:
+            :class:`SAPIFuture`: A future sharing the same submitted
+            problem.
+
+        Examples:
+            >>> Q, offset = dimod.ising_to_qubo(h, J)
+            >>> future = sampler.sample_qubo_async(Q)
+            >>> spin_future = future.then(lambda response: response.as_spin(offset))
+
+        """
+        parse = self._parse
+        return SAPIFuture(self._submitted_problem, lambda answer: func(parse(answer)))
+
+
+class _SolvedProblem(object):
+    """Stands in for a submitted problem whose answer is already known."""
+    def __init__(self, answer):
+        self._answer = answer
+
+    def done(self):
+        return True
+
+    def cancel(self):
+        pass
+
+    def status(self):
+        return {'state': 'DONE'}
+
+    def result(self):
+        return self._answer
+
+
+def _resolved(response):
+    """A future that is already done and resolves to `response`."""
+    return SAPIFuture(_SolvedProblem(response), lambda response: response)
+
+
+def wait(futures, min_done=None, timeout=None):
+    """Block until some or all of the given futures are done.
+
+    Args:
+        futures (list[:class:`SAPIFuture`]): The futures to wait on.
+        min_done (int, optional): The number of futures that must be
+            done before returning. Defaults to all of them.
+        timeout (float, optional): Maximum time to wait in seconds. If
+            None, wait indefinitely.
+
+    Returns:
+        bool: True if at least `min_done` futures are done.
+
+    """
+    futures = list(futures)
+
+    if min_done is None:
+        min_done = len(futures)
+
+    # futures that never went to SAPI, like those of problems solved classically,
+    # are already done
+    submitted_problems = [f._submitted_problem for f in futures if not f.done()]
+    min_done -= len(futures) - len(submitted_problems)
+    if min_done <= 0:
+        return True
+
+    # imported here so that importing the package does not load dwave_sapi2
+    from dwave_sapi2.core import await_completion
+
+    if timeout is not None:
+        return await_completion(submitted_problems, min_done, timeout)
+
+    # sapi wants a finite timeout, so keep waiting until enough are done
+    while not await_completion(submitted_problems, min_done, _POLL_INTERVAL):
+        pass
+    return True
+
+
+def submit_many(submit, problems, max_in_flight=10, ordered=True):
+    """Submit problems while keeping a bounded number of them outstanding.
+
+    Args:
+        submit (function): Accepts a problem and returns a
+            :class:`SAPIFuture`.
+        problems (iterable): The problems to submit. Consumed lazily, so
+            it can be a generator.
+        max_in_flight (int, optional): The maximum number of submitted
+            problems that have not yet been yielded. Default 10.
+        ordered (bool, optional): If True, responses are yielded in the
+            order of `problems`, otherwise in the order they are solved.
+            Default True.
+
+    Yields:
+        The response for each problem. The position of the problem in
+        `problems` is stored in the response's data as 'problem_index'.
+        Problems still outstanding are cancelled if the iteration is
+        stopped early or fails.
+
+    """
+    if max_in_flight < 1:
+        raise ValueError("'max_in_flight' must be a positive integer")
+
+    pending = []  # (index, future) pairs
+
+    def pop():
+        # removes and returns the next pair to yield
+        if ordered:
+            return pending.pop(0)
+
+        wait([future for __, future in pending], min_done=1)
+        for position, (__, future) in enumerate(pending):
+            if future.done():
+                return pending.pop(position)
+
+    def resolve(pair):
+        idx, future = pair
+        response = future.result()
+        response.data['problem_index'] = idx
+        return response
+
+    try:
+        for idx, problem in enumerate(problems):
+            # submitting the next problem (and any client-side work it involves) happens
+            # while the earlier ones are still being solved
+            pending.append((idx, submit(problem)))
+
+            if len(pending) >= max_in_flight:
+                yield resolve(pop())
+
+        while pending:
+            yield resolve(pop())
+    finally:
+        # the caller stopped early or something failed, the problems still
+        # outstanding would otherwise keep running
+        for __, future in pending:
+            future.cancel()
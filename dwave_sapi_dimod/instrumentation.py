@@ -0,0 +1,184 @@
+"""
+Lightweight instrumentation of the samplers and composites. Each sample
+call can record the wall time of its stages (finding an embedding,
+submitting to SAPI, unembedding, ...) along with counts such as embedding
+cache hits and chain lengths. The metrics are attached to the response as
+`response.data['metrics']` and passed to every registered sink.
+
+Nothing is recorded unless a sink is registered or instrumentation is
+enabled, so the overhead is a single check per call otherwise.
+
+Examples:
+    >>> def log(name, metrics):
+    ...     print(name, metrics['stages'])
+    >>> sapi.add_metrics_sink(log)
+    >>> sampler = sapi.EmbeddingComposite(sapi.SAPILocalSampler('c4-sw_optimize'))
+    >>> response = sampler.sample_ising({}, {(0, 1): 1, (1, 2): 1, (0, 2): 1})  # doctest: +SKIP
+    EmbeddingComposite.sample_ising {'reduce': ..., 'find_embedding': ..., ...}
+
+"""
+import threading
+import time
+
+__all__ = ['Metrics', 'add_metrics_sink', 'remove_metrics_sink', 'enable_metrics', 'disable_metrics']
+
+_sinks = []
+_lock = threading.Lock()
+
+# metrics are recorded when this is True or any sink is registered
+_enabled = False
+
+
+def add_metrics_sink(sink):
+    """Register a function that is called with (name, metrics) after every
+    instrumented sample call.
+
+    Args:
+        sink (function): Accepts the name of the call, for example
+            'EmbeddingComposite.sample_ising', and the metrics as a dict
+            with keys 'stages' (stage name to wall time in seconds),
+            'counts' (name to value) and, when SAPI reports it,
+            'solver_timing'.
+
+    """
+    with _lock:
+        _sinks.append(sink)
+
+
+def remove_metrics_sink(sink):
+    """Unregister a sink added with :func:`add_metrics_sink`."""
+    with _lock:
+        _sinks.remove(sink)
+
+
+def enable_metrics():
+    """Record metrics and attach them to responses even if no sink is
+    registered."""
+    global _enabled
+    _enabled = True
+
+
+def disable_metrics():
+    """Stop recording metrics unless a sink is registered."""
+    global _enabled
+    _enabled = False
+
+
+class Metrics(object):
+    """The metrics of one sample call.
+
+    Args:
+        name (str): The name of the call, passed to the sinks.
+
+    Attributes:
+        stages (dict): The wall time in seconds of each stage.
+        counts (dict): Other values, such as the number of qubits used.
+        solver_timing (dict): The timing reported by SAPI, if any.
+
+    """
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+        self.counts = {}
+        self.solver_timing = None
+
+    def __bool__(self):
+        return True
+
+    __nonzero__ = __bool__
+
+    def stage(self, name):
+        """Context manager that adds the wall time of its block to the
+        stage `name`."""
+        return _Stage(self.stages, name)
+
+    def count(self, name, value=1):
+        """Add `value` to the count `name`."""
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def set(self, name, value):
+        """Set the count `name` to `value`."""
+        self.counts[name] = value
+
+    def as_dict(self):
+        """The metrics as a dict, as passed to the sinks."""
+        metrics = {'stages': dict(self.stages), 'counts': dict(self.counts)}
+        if self.solver_timing is not None:
+            metrics['solver_timing'] = self.solver_timing
+        return metrics
+
+    def emit(self, response=None):
+        """Attach the metrics to the response's data and pass them to the
+        sinks.
+
+        Returns:
+            The response.
+
+        """
+        metrics = self.as_dict()
+        if response is not None:
+            response.data['metrics'] = metrics
+        for sink in list(_sinks):
+            sink(self.name, metrics)
+        return response
+
+
+class _NullMetrics(object):
+    """Stands in for Metrics when instrumentation is off, doing nothing."""
+    def __bool__(self):
+        return False
+
+    __nonzero__ = __bool__
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def count(self, name, value=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+    def emit(self, response=None):
+        return response
+
+    @property
+    def solver_timing(self):
+        return None
+
+    @solver_timing.setter
+    def solver_timing(self, timing):
+        pass
+
+
+class _Stage(object):
+    def __init__(self, stages, name):
+        self.stages = stages
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stages[self.name] = self.stages.get(self.name, 0.) + time.time() - self.start
+
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+_NULL_METRICS = _NullMetrics()
+
+
+def _metrics(name):
+    """A Metrics for the call `name`, or a no-op stand-in if instrumentation is
+    off."""
+    if _enabled or _sinks:
+        return Metrics(name)
+    return _NULL_METRICS
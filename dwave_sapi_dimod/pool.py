@@ -0,0 +1,148 @@
+"""
+A pool of SAPI remote connections and solver handles, shared by the
+:class:`SAPISampler` objects in a process so that creating a sampler does
+not have to connect to SAPI again.
+"""
+import collections
+import threading
+import time
+
+__all__ = ['ConnectionPool', 'connection_pool']
+
+
+class ConnectionPool(object):
+    """A bounded pool of SAPI remote connections.
+
+    Connections are keyed by (url, token, proxy_url), and each keeps the
+    solver handles that have been requested through it. Once the pool holds
+    `max_size` connections, adding another evicts the one that was least
+    recently used. Connections that have been idle for longer than
+    `idle_timeout` are also evicted.
+
+    Args:
+        max_size (int, optional): The maximum number of connections.
+            Default 16.
+        idle_timeout (float, optional): Seconds after which an unused
+            connection is evicted. If None, connections are only evicted
+            when the pool is full. Default 300.
+        connection_factory (function, optional): Creates a connection
+            from (url, token, proxy_url). Defaults to creating a SAPI
+            RemoteConnection.
+
+    Examples:
+        >>> pool = sapi.ConnectionPool(max_size=4)
+        >>> sampler0 = sapi.SAPISampler(solver_name, url, token, connection_pool=pool)
+        >>> sampler1 = sapi.SAPISampler(solver_name, url, token, connection_pool=pool)
+        >>> sampler0.solver is sampler1.solver
+        True
+
+    """
+    def __init__(self, max_size=16, idle_timeout=300., connection_factory=None):
+        if max_size < 1:
+            raise ValueError("'max_size' must be a positive integer")
+
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+
+        if connection_factory is None:
+            connection_factory = _remote_connection
+        self.connection_factory = connection_factory
+
+        # key -> [connection, {solver_name: solver}, last_used], least recently used first
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_connection(self, url, token, proxy_url=None):
+        """Get a connection, creating it if it is not in the pool.
+
+        Args:
+            url (str): SAPI url.
+            token (str): API token.
+            proxy_url (str, optional): Proxy url.
+
+        Returns:
+            The SAPI RemoteConnection.
+
+        """
+        return self._get_entry((url, token, proxy_url))[0]
+
+    def get_solver(self, solver_name, url, token, proxy_url=None):
+        """Get a connection and one of its solvers, creating them if they
+        are not in the pool.
+
+        Args:
+            solver_name (str): The name of the solver.
+            url (str): SAPI url.
+            token (str): API token.
+            proxy_url (str, optional): Proxy url.
+
+        Returns:
+            tuple: (connection, solver)
+
+        """
+        connection, solvers, __ = self._get_entry((url, token, proxy_url))
+
+        solver = solvers.get(solver_name)
+        if solver is None:
+            solver = connection.get_solver(solver_name)
+            with self._lock:
+                solver = solvers.setdefault(solver_name, solver)
+
+        return connection, solver
+
+    def _get_entry(self, key):
+        with self._lock:
+            self._evict_idle()
+
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                entry[2] = time.time()
+                self._entries[key] = entry
+                return entry
+
+        # connect outside of the lock so that other keys are not held up
+        url, token, proxy_url = key
+        entry = [self.connection_factory(url, token, proxy_url), {}, time.time()]
+
+        with self._lock:
+            # another thread might have connected in the meantime, keep theirs
+            entry = self._entries.pop(key, entry)
+            self._entries[key] = entry
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return entry
+
+    def _evict_idle(self):
+        # expects the lock to be held
+        if self.idle_timeout is None:
+            return
+
+        cutoff = time.time() - self.idle_timeout
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[2] >= cutoff:
+                break
+            del self._entries[key]
+
+    def clear(self):
+        """Remove every connection from the pool."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _remote_connection(url, token, proxy_url=None):
+    # imported here so that only the processes that connect pay for it
+    from dwave_sapi2.remote import RemoteConnection
+
+    if proxy_url is None:
+        return RemoteConnection(url, token)
+    return RemoteConnection(url, token, proxy_url)
+
+
+# shared by all of the SAPISamplers in the process
+connection_pool = ConnectionPool()
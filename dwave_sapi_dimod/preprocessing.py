@@ -0,0 +1,128 @@
+"""
+Reduce a problem before it is embedded and sent to the solver. Variables
+whose optimal value can be determined classically are fixed and removed,
+so the residual problem is smaller, needs fewer qubits and is more likely
+to embed.
+"""
+import dimod
+import numpy as np
+
+
+from dwave_sapi_dimod import _PY2
+
+__all__ = ['reduce_ising', 'restore_samples']
+
+if _PY2:
+    iteritems = lambda d: d.iteritems()
+else:
+    iteritems = lambda d: d.items()
+
+
+def reduce_ising(h, J, roof_duality=False):
+    """Remove the variables of an Ising problem that can be solved classically.
+
+    Couplers with zero bias are dropped. Variables that have no remaining
+    couplers are set to the sign of -h, except those with zero bias, which
+    are left free and given a random value in each sample by
+    :func:`restore_samples`, as the solver does for unused qubits. If
+    `roof_duality` is True, SAPI's fix_variables is first used to fix the
+    variables whose values are proven optimal by roof duality, and their
+    values are substituted into the rest of the problem.
+
+    Args:
+        h (dict): The linear biases, {v: bias, ...}.
+        J (dict): The quadratic biases, {(u, v): bias, ...}.
+        roof_duality (bool, optional): Whether to also fix variables using
+            roof duality. Default False.
+
+    Returns:
+        tuple: (h_reduced, J_reduced, variables, fixed) where `h_reduced`
+        and `J_reduced` are the residual problem with its variables
+        relabelled to 0, m-1, `variables` is the original label of each of
+        those and `fixed` maps each removed variable to its spin value, or
+        to 0 if it is free.
+
+    Examples:
+        >>> h_reduced, J_reduced, variables, fixed = sapi.reduce_ising({'a': 1, 'b': 0, 'c': -2},
+        ...                                                            {('a', 'b'): -1, ('b', 'c'): 0})
+        >>> h_reduced, J_reduced, variables, fixed
+        ({0: 1, 1: 0}, {(0, 1): -1}, ['a', 'b'], {'c': 1})
+
+    """
+    h = dict(h)
+    for u, v in J:
+        h.setdefault(u, 0.)
+        h.setdefault(v, 0.)
+
+    J = {(u, v): bias for (u, v), bias in iteritems(J) if bias}
+
+    fixed = {}
+
+    if roof_duality and J:
+        Q, __ = dimod.ising_to_qubo(h, J)
+        # imported here so that importing the package does not load dwave_sapi2
+        from dwave_sapi2.fix_variables import fix_variables
+        result = fix_variables(Q, 'optimized')
+        fixed.update({v: 2 * x - 1 for v, x in iteritems(result['fixed_variables'])})
+
+    if fixed:
+        # move the couplers onto a fixed variable into the linear biases of the other
+        residual = {}
+        for (u, v), bias in iteritems(J):
+            if u in fixed:
+                if v not in fixed:
+                    h[v] += bias * fixed[u]
+            elif v in fixed:
+                h[u] += bias * fixed[v]
+            else:
+                residual[(u, v)] = bias
+        J = residual
+
+    coupled = set().union(*J) if J else set()
+    for v, bias in iteritems(h):
+        if v not in fixed and v not in coupled:
+            # with no bias either value is optimal
+            fixed[v] = -1 if bias > 0 else 1 if bias < 0 else 0
+
+    variables = [v for v in h if v not in fixed]
+    relabel = {v: idx for idx, v in enumerate(variables)}
+
+    h_reduced = {relabel[v]: h[v] for v in variables}
+    J_reduced = {(relabel[u], relabel[v]): bias for (u, v), bias in iteritems(J)}
+
+    return h_reduced, J_reduced, variables, fixed
+
+
+def restore_samples(samples, variables, fixed, index):
+    """Add the fixed variables back into the samples of a reduced problem.
+
+    Args:
+        samples (array-like): A two dimensional array with a row per sample
+            and a column per variable of the reduced problem.
+        variables (list): The original label of each column of `samples`,
+            as returned by :func:`reduce_ising`.
+        fixed (dict): The values of the removed variables, as returned by
+            :func:`reduce_ising`. Free variables, with value 0, are set to
+            a random spin in each sample.
+        index (dict): Maps each variable of the original problem to its
+            column in the restored samples.
+
+    Returns:
+        :obj:`numpy.ndarray`: An int8 array with a row per sample and a
+        column per variable of the original problem.
+
+    """
+    samples = np.asarray(samples, dtype=np.int8)
+
+    restored = np.empty((samples.shape[0], len(index)), dtype=np.int8)
+    restored[:, [index[v] for v in variables]] = samples
+    if fixed:
+        columns = [index[v] for v in fixed]
+        values = np.asarray([fixed[v] for v in fixed], dtype=np.int8)
+        restored[:, columns] = values
+
+        free = np.asarray(columns)[values == 0]
+        if len(free):
+            restored[:, free] = 2 * np.random.randint(2, size=(len(restored), len(free))) - 1
+
+    return restored
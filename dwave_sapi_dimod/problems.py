@@ -0,0 +1,250 @@
+"""
+Compiled problems hold an Ising problem or QUBO as arrays, with the
+variables already relabelled to indices and the zero biases already
+removed. Samplers and composites accept them through their `sample`
+methods and skip the relabelling and checking they do on every call for
+problems given as dicts, which pays off when the same problem, or the same
+compiled problem, is solved many times.
+
+Examples:
+    >>> problem = sapi.compile_ising({'a': 1}, {('a', 'b'): -1, ('b', 'c'): .5})
+    >>> sampler = sapi.EmbeddingComposite(sapi.SAPILocalSampler('c4-sw_optimize'))
+    >>> for __ in range(100):
+    ...     response = sampler.sample(problem)
+
+"""
+import dimod
+import numpy as np
+
+from dwave_sapi_dimod import _PY2
+
+__all__ = ['CompiledProblem', 'compile_ising', 'compile_qubo', 'SPIN', 'BINARY']
+
+if _PY2:
+    range = xrange
+    iteritems = lambda d: d.iteritems()
+else:
+    iteritems = lambda d: d.items()
+
+SPIN = 'SPIN'
+"""The vartype of a compiled Ising problem, variables are -1 or +1."""
+
+BINARY = 'BINARY'
+"""The vartype of a compiled QUBO, variables are 0 or 1."""
+
+
+class CompiledProblem(object):
+    """An immutable, array-backed Ising problem or QUBO.
+
+    Usually created with :func:`compile_ising` or :func:`compile_qubo`.
+
+    Args:
+        variables (iterable): The variable labels, in index order.
+        linear (array-like): The linear bias of each variable. For a QUBO,
+            the diagonal of Q.
+        row (array-like): The index of the first variable of each
+            interaction.
+        col (array-like): The index of the second variable of each
+            interaction.
+        quadratic (array-like): The bias of each interaction.
+        vartype (str): :data:`SPIN` or :data:`BINARY`.
+
+    Attributes:
+        variables (tuple): The variable labels, in index order.
+        label_index (dict): Maps each label to its index.
+        linear (:obj:`numpy.ndarray`): The linear biases.
+        row (:obj:`numpy.ndarray`): The first variable of each interaction.
+        col (:obj:`numpy.ndarray`): The second variable of each interaction,
+            always larger than the first.
+        quadratic (:obj:`numpy.ndarray`): The interaction biases, all
+            non-zero.
+        vartype (str): :data:`SPIN` or :data:`BINARY`.
+
+    """
+    def __init__(self, variables, linear, row, col, quadratic, vartype):
+        if vartype not in (SPIN, BINARY):
+            raise ValueError("'vartype' must be SPIN or BINARY")
+
+        variables = tuple(variables)
+        linear = np.array(linear, dtype=float)
+
+        if len(linear) != len(variables):
+            raise ValueError("'linear' must have a bias for every variable")
+        if not len(row) == len(col) == len(quadratic):
+            raise ValueError("'row', 'col' and 'quadratic' must have the same length")
+
+        # each interaction once, as (u, v) with u < v, and without zero biases
+        edges = {}
+        for u, v, bias in zip(row, col, quadratic):
+            if u == v:
+                raise ValueError("interactions must be between two different variables")
+            edge = (int(u), int(v)) if u < v else (int(v), int(u))
+            edges[edge] = edges.get(edge, 0.) + bias
+        edges = sorted(edge for edge in iteritems(edges) if edge[1])
+
+        row = np.array([u for (u, __), __ in edges], dtype=np.int64)
+        col = np.array([v for (__, v), __ in edges], dtype=np.int64)
+        quadratic = np.array([bias for __, bias in edges], dtype=float)
+
+        for array in (linear, row, col, quadratic):
+            array.flags.writeable = False
+
+        set_ = object.__setattr__
+        set_(self, 'variables', variables)
+        set_(self, 'label_index', {v: idx for idx, v in enumerate(variables)})
+        set_(self, 'linear', linear)
+        set_(self, 'row', row)
+        set_(self, 'col', col)
+        set_(self, 'quadratic', quadratic)
+        set_(self, 'vartype', vartype)
+
+        set_(self, '_index_labelled', all(idx == v for idx, v in enumerate(variables)))
+
+        # the forms of the problem derived by the samplers and composites that use it,
+        # built the first time they are needed
+        set_(self, '_derived', {})
+
+    def __setattr__(self, name, value):
+        raise AttributeError('compiled problems cannot be changed')
+
+    def __len__(self):
+        return len(self.variables)
+
+    @property
+    def index_labelled(self):
+        """bool: True if the labels are the indices 0, n-1."""
+        return self._index_labelled
+
+    def index_ising(self):
+        """The problem as an index-labelled Ising problem.
+
+        Returns:
+            tuple: (h, J, offset) where h and J are dicts keyed by the
+            indices of the variables, and offset is the energy to add to
+            the Ising energies to get those of the QUBO (0 for Ising
+            problems). They are shared between calls and should not be
+            changed.
+
+        """
+        derived = self._derived.get('index_ising')
+        if derived is None:
+            h = dict(enumerate(self.linear.tolist()))
+            J = dict(zip(zip(self.row.tolist(), self.col.tolist()), self.quadratic.tolist()))
+            if self.vartype == BINARY:
+                Q = {(v, v): bias for v, bias in iteritems(h)}
+                Q.update(J)
+                h, J, offset = dimod.qubo_to_ising(Q)
+                h = {v: h.get(v, 0.) for v in range(len(self))}
+            else:
+                offset = 0.
+            derived = self._derived['index_ising'] = (h, J, offset)
+        return derived
+
+    def as_ising(self):
+        """The problem as an Ising problem labelled with `variables`.
+
+        Returns:
+            tuple: (h, J, offset), see `index_ising`.
+
+        """
+        h, J, offset = self.index_ising()
+        variables = self.variables
+        return ({variables[v]: bias for v, bias in iteritems(h)},
+                {(variables[u], variables[v]): bias for (u, v), bias in iteritems(J)},
+                offset)
+
+    def as_qubo(self):
+        """The problem as a QUBO labelled with `variables`.
+
+        Returns:
+            tuple: (Q, offset) where offset is the energy to add to the QUBO
+            energies to get those of the Ising problem (0 for QUBOs).
+
+        """
+        variables = self.variables
+        if self.vartype == SPIN:
+            h, J, __ = self.as_ising()
+            return dimod.ising_to_qubo(h, J)
+
+        Q = {(variables[v], variables[v]): bias for v, bias in enumerate(self.linear.tolist()) if bias}
+        Q.update({(variables[u], variables[v]): bias
+                  for u, v, bias in zip(self.row.tolist(), self.col.tolist(), self.quadratic.tolist())})
+        return Q, 0.
+
+
+def compile_ising(h, J):
+    """Compile an Ising problem.
+
+    Args:
+        h (dict/list): The linear terms in the Ising problem, as for the
+            samplers' `sample_ising`.
+        J (dict): The quadratic terms in the Ising problem.
+
+    Returns:
+        :class:`CompiledProblem`: The problem, with vartype :data:`SPIN`.
+
+    Examples:
+        >>> problem = sapi.compile_ising({0: 1}, {(0, 4): -1})
+        >>> response = sapi.SAPILocalSampler('c4-sw_optimize').sample(problem)
+
+    """
+    if isinstance(h, (list, tuple)):
+        h = dict(enumerate(h))
+    if not isinstance(h, dict):
+        raise TypeError("expected 'h' to be a dict or list")
+    if not isinstance(J, dict):
+        raise TypeError("expected 'J' to be a dict")
+
+    variables = _ordered_labels(set(h).union(*J))
+    index = {v: idx for idx, v in enumerate(variables)}
+
+    linear = np.zeros(len(variables))
+    for v, bias in iteritems(h):
+        linear[index[v]] = bias
+
+    return _compile(variables, index, linear, J, SPIN)
+
+
+def compile_qubo(Q):
+    """Compile a QUBO.
+
+    Args:
+        Q (dict): The QUBO, as for the samplers' `sample_qubo`.
+
+    Returns:
+        :class:`CompiledProblem`: The problem, with vartype :data:`BINARY`.
+
+    """
+    if not isinstance(Q, dict):
+        raise TypeError("expected 'Q' to be a dict")
+
+    variables = _ordered_labels(set().union(*Q))
+    index = {v: idx for idx, v in enumerate(variables)}
+
+    linear = np.zeros(len(variables))
+    quadratic = {}
+    for (u, v), bias in iteritems(Q):
+        if u == v:
+            linear[index[u]] += bias
+        else:
+            quadratic[(u, v)] = bias
+
+    return _compile(variables, index, linear, quadratic, BINARY)
+
+
+def _compile(variables, index, linear, quadratic, vartype):
+    if quadratic:
+        edges, biases = zip(*iteritems(quadratic))
+        row = [index[u] for u, __ in edges]
+        col = [index[v] for __, v in edges]
+    else:
+        row = col = biases = []
+    return CompiledProblem(variables, linear, row, col, biases, vartype)
+
+
+def _ordered_labels(labels):
+    # the same order as the relabelling done by dimod's ising_index_labels
+    try:
+        return sorted(labels)
+    except TypeError:
+        return list(labels)
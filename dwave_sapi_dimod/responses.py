@@ -0,0 +1,428 @@
+"""
+Array-backed responses keep the samples as a dense int8 matrix, with one
+column per variable, rather than as a list of dicts. They still offer the
+dimod response interface, creating the sample dicts only when iterated,
+and also give direct access to the underlying arrays.
+
+Examples:
+    >>> sampler = sapi.SAPILocalSampler('c4-sw_optimize')
+    >>> response = sampler.sample_ising({0: 1}, {(0, 4): -1}, num_reads=10000, compact=True)
+    >>> response.variables
+    [0, 4]
+    >>> response.samples_array()  # doctest: +SKIP
+    array([[-1, -1], ...], dtype=int8)
+
+"""
+import itertools
+
+import dimod
+import numpy as np
+
+from dwave_sapi_dimod import _PY2
+
+__all__ = ['ArrayBinaryResponse', 'ArraySpinResponse']
+
+if _PY2:
+    range = xrange
+    zip = itertools.izip
+    iteritems = lambda d: d.iteritems()
+else:
+    iteritems = lambda d: d.items()
+
+
+class ArrayResponse(dimod.TemplateResponse):
+    """Serves as a superclass for the array-backed responses. Not intended to
+    be used directly.
+
+    Args:
+        variables (iterable, optional): The variables labelling the columns
+            of the samples, in order.
+        data (dict, optional): Data about the response as a whole as a
+            dictionary. Default {}.
+
+    Attributes:
+        variables (list): The variables labelling the columns of the samples.
+        index (dict): Maps each variable to its column.
+        data_vectors (dict): Per-sample data, as a dict mapping each name to
+            an array with one value per sample. For example
+            {'num_occurrences': array([...])}.
+
+    """
+    def __init__(self, variables=(), data=None):
+        dimod.TemplateResponse.__init__(self, data)
+
+        self.variables = list(variables)
+        self.index = {v: idx for idx, v in enumerate(self.variables)}
+
+        self._samples = np.empty((0, len(self.variables)), dtype=np.int8)
+        self._energies = np.empty((0,), dtype=float)
+        self.data_vectors = {}
+
+    def samples(self, data=False):
+        """Iterator over the samples, creating a dict for each.
+
+        See :meth:`dimod.TemplateResponse.samples`.
+
+        """
+        variables = self.variables
+        samples = (dict(zip(variables, row.tolist())) for row in self._samples)
+        if data:
+            return zip(samples, self._iter_sample_data())
+        return samples
+
+    def energies(self, data=False):
+        """Iterator over the energies.
+
+        See :meth:`dimod.TemplateResponse.energies`.
+
+        """
+        energies = iter(self._energies.tolist())
+        if data:
+            return zip(energies, self._iter_sample_data())
+        return energies
+
+    def items(self, data=False):
+        """Iterator over the samples and energies.
+
+        See :meth:`dimod.TemplateResponse.items`.
+
+        """
+        if data:
+            return zip(self.samples(), self.energies(), self._iter_sample_data())
+        return zip(self.samples(), self.energies())
+
+    def _iter_sample_data(self):
+        # per-sample data dicts are created from the data vectors on demand
+        names = list(self.data_vectors)
+        columns = [self.data_vectors[name].tolist() for name in names]
+        for values in zip(*columns) if columns else ((),) * len(self):
+            yield dict(zip(names, values))
+
+    def __len__(self):
+        """The number of samples in response."""
+        return self._samples.shape[0]
+
+    def add_sample(self, sample, energy, data=None):
+        """Loads a sample and associated energy into the response.
+
+        For array-backed responses, it is more efficient to use
+        `add_samples_from_array`.
+
+        """
+        self.add_samples_from([sample], [energy], None if data is None else [data])
+
+    def add_samples_from(self, samples, energies, sample_data=None):
+        """Loads samples and associated energies from iterators.
+
+        For array-backed responses, it is more efficient to use
+        `add_samples_from_array`. Every sample must have the same variables.
+
+        """
+        samples = list(samples)
+
+        if not all(isinstance(sample, dict) for sample in samples):
+            raise TypeError("expected each sample in 'samples' to be a dict")
+
+        if not self.variables and samples:
+            self.variables = list(samples[0])
+            self.index = {v: idx for idx, v in enumerate(self.variables)}
+            self._samples = np.empty((0, len(self.variables)), dtype=np.int8)
+
+        variables = self.variables
+        array = np.asarray([[sample[v] for v in variables] for sample in samples], dtype=np.int8)
+        array = array.reshape(len(samples), len(variables))
+
+        if sample_data is None:
+            data_vectors = None
+        else:
+            sample_data = list(sample_data)
+            names = set().union(*sample_data)
+            data_vectors = {name: np.asarray([data.get(name) for data in sample_data])
+                            for name in names}
+
+        ArrayResponse.add_samples_from_array(self, array, np.asarray(list(energies), dtype=float),
+                                             data_vectors)
+
+    def add_samples_from_array(self, samples, energies, data_vectors=None, sorted_by_energy=False):
+        """Loads samples and associated energies from arrays.
+
+        Args:
+            samples (:obj:`numpy.ndarray`): A two dimensional array in
+                which each row is a sample and each column is the variable
+                at the same position in `variables`.
+            energies (:obj:`numpy.ndarray`): A one dimensional array of
+                the energy of each sample.
+            data_vectors (dict, optional): Per-sample data as a dict
+                mapping each name to an array with one value per sample.
+            sorted_by_energy (bool): If True, then the user asserts that
+                `samples` and `energies` are sorted by energy from low to
+                high. This is not checked.
+
+        Notes:
+            Solutions are stored in order of energy, lowest first.
+
+        """
+        samples = np.asarray(samples, dtype=np.int8)
+        energies = np.asarray(energies, dtype=float)
+
+        if samples.ndim != 2:
+            raise ValueError("expected 'samples' to be a two dimensional array")
+        if samples.shape[1] != len(self.variables):
+            raise ValueError("expected 'samples' to have one column per variable")
+        if energies.shape != (samples.shape[0],):
+            raise ValueError('length of energies does not match number of samples')
+
+        if data_vectors is None:
+            data_vectors = {}
+        else:
+            data_vectors = {name: np.asarray(vector) for name, vector in iteritems(data_vectors)}
+
+        if len(self):
+            if set(data_vectors) != set(self.data_vectors):
+                raise ValueError("'data_vectors' must have the same names as the existing data")
+
+            samples = np.concatenate((self._samples, samples))
+            energies = np.concatenate((self._energies, energies))
+            data_vectors = {name: np.concatenate((self.data_vectors[name], vector))
+                            for name, vector in iteritems(data_vectors)}
+        elif sorted_by_energy:
+            self._samples, self._energies, self.data_vectors = samples, energies, data_vectors
+            return
+
+        order = np.argsort(energies, kind='mergesort')
+
+        self._samples = samples[order]
+        self._energies = energies[order]
+        self.data_vectors = {name: vector[order] for name, vector in iteritems(data_vectors)}
+
+    def samples_array(self):
+        """Returns the :obj:`numpy.ndarray` containing the samples, one
+        column per variable in `variables`."""
+        return self._samples
+
+    def energies_array(self):
+        """Returns the :obj:`numpy.ndarray` containing the energies."""
+        return self._energies
+
+    def relabel_samples(self, mapping):
+        """Relabels the variables in the samples.
+
+        Only the column labels change, the arrays are shared with the new
+        response.
+
+        Args:
+            mapping (dict): A dictionary with the old labels as keys
+                and the new labels as values. A partial mapping is
+                allowed.
+
+        Returns:
+            The relabelled response.
+
+        """
+        variables = [mapping.get(v, v) for v in self.variables]
+
+        if len(set(variables)) != len(variables):
+            raise ValueError('given mapping does not have unique values.')
+
+        return self._copy_with(variables=variables)
+
+    def aggregate(self):
+        """Merge the samples that appear more than once.
+
+        Samples are compared by their bit-packed rows, so the cost depends on
+        the number of variables divided by eight. The 'num_occurrences' of
+        duplicates are summed (a sample without it counts once) and the other
+        data vectors keep the values of the first occurrence.
+
+        Returns:
+            A new response of the same type with one row per distinct
+            sample, ordered by energy.
+
+        Examples:
+            >>> response = sapi.ArraySpinResponse(['a', 'b'])
+            >>> response.add_samples_from_array([[1, 1], [-1, 1], [1, 1]], [0., 1., 0.])
+            >>> aggregated = response.aggregate()
+            >>> aggregated.samples_array().tolist(), aggregated.data_vectors['num_occurrences'].tolist()
+            ([[1, 1], [-1, 1]], [2, 1])
+
+        """
+        samples = self._samples
+        num_samples, num_variables = samples.shape
+
+        counts = self.data_vectors.get('num_occurrences')
+        if counts is None:
+            counts = np.ones(num_samples, dtype=np.int64)
+
+        if num_samples and num_variables:
+            # both spin and binary samples are 1 exactly where the bit is set
+            bits = np.packbits(samples > 0, axis=1)
+            keys = np.ascontiguousarray(bits).view(np.dtype((np.void, bits.shape[1]))).ravel()
+            __, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        else:
+            # every sample is the same (empty) sample
+            first = np.zeros(min(num_samples, 1), dtype=np.int64)
+            inverse = np.zeros(num_samples, dtype=np.int64)
+
+        num_occurrences = np.bincount(inverse.ravel(), weights=counts, minlength=len(first))
+        num_occurrences = num_occurrences.astype(np.asarray(counts).dtype)
+
+        # the samples are already ordered by energy, so ordering the distinct samples
+        # by their first occurrence keeps them that way
+        positions = np.argsort(first)
+        order = first[positions]
+        num_occurrences = num_occurrences[positions]
+
+        response = self._copy_with(samples=samples[order], energies=self._energies[order])
+        response.data_vectors = {name: vector[order] for name, vector in iteritems(self.data_vectors)}
+        response.data_vectors['num_occurrences'] = num_occurrences
+        return response
+
+    def _as_dict_response(self, response):
+        response.data = self.data
+
+        # the samples are already valid and ordered by energy, so we can skip the
+        # per-value checks and sorting done by add_samples_from
+        response._samples = list(self.samples())
+        response._energies = self._energies.tolist()
+        response._sample_data = list(self._iter_sample_data())
+        return response
+
+    def _copy_with(self, variables=None, samples=None, energies=None, cls=None):
+        # a new response sharing everything that is not given
+        cls = self.__class__ if cls is None else cls
+        response = cls(self.variables if variables is None else variables, self.data)
+        response._samples = self._samples if samples is None else samples
+        response._energies = self._energies if energies is None else energies
+        response.data_vectors = self.data_vectors
+        return response
+
+
+class ArrayBinaryResponse(ArrayResponse):
+    """Array-backed response object that encodes binary samples.
+
+    Args:
+        variables (iterable, optional): The variables labelling the columns
+            of the samples, in order.
+        data (dict, optional): Data about the response as a whole as a
+            dictionary. Default {}.
+
+    """
+    def add_samples_from_array(self, samples, energies=None, data_vectors=None, sorted_by_energy=False,
+                               Q=None):
+        """Loads samples and associated energies from arrays.
+
+        See :meth:`ArrayResponse.add_samples_from_array`. If `energies` is
+        None, they are calculated from the QUBO `Q`.
+
+        """
+        samples = np.asarray(samples, dtype=np.int8)
+
+        if energies is None:
+            if Q is None:
+                raise TypeError("must provide 'energies' or 'Q'")
+            energies = _quadratic_energies(samples, self.index, {}, Q)
+
+        ArrayResponse.add_samples_from_array(self, samples, energies, data_vectors, sorted_by_energy)
+
+    def as_spin(self, offset=0.0, data_copy=False):
+        """Converts to an :class:`ArraySpinResponse`.
+
+        Args:
+            offset (float/int, optional): The energy offset as would
+                be returned by `qubo_to_ising`. The energy offset is
+                applied to each energy in the response.
+            data_copy (bool, optional): Whether to create a copy of the
+                data. Default False.
+
+        Returns:
+            :class:`ArraySpinResponse`
+
+        """
+        response = self._copy_with(samples=2 * self._samples - 1, energies=self._energies + offset,
+                                   cls=ArraySpinResponse)
+        if data_copy:
+            response.data = self.data.copy()
+            response.data_vectors = {name: vector.copy() for name, vector in iteritems(self.data_vectors)}
+        return response
+
+    def as_binary_response(self):
+        """Converts to a :class:`dimod.BinaryResponse`, creating a dict for
+        every sample."""
+        return self._as_dict_response(dimod.BinaryResponse())
+
+
+class ArraySpinResponse(ArrayResponse):
+    """Array-backed response object that encodes spin-valued samples.
+
+    Args:
+        variables (iterable, optional): The variables labelling the columns
+            of the samples, in order.
+        data (dict, optional): Data about the response as a whole as a
+            dictionary. Default {}.
+
+    """
+    def add_samples_from_array(self, samples, energies=None, data_vectors=None, sorted_by_energy=False,
+                               h=None, J=None):
+        """Loads samples and associated energies from arrays.
+
+        See :meth:`ArrayResponse.add_samples_from_array`. If `energies` is
+        None, they are calculated from the Ising problem `h`, `J`.
+
+        """
+        samples = np.asarray(samples, dtype=np.int8)
+
+        if energies is None:
+            if h is None or J is None:
+                raise TypeError("must provide 'energies' or 'h' and 'J'")
+            energies = _quadratic_energies(samples, self.index, h, J)
+
+        ArrayResponse.add_samples_from_array(self, samples, energies, data_vectors, sorted_by_energy)
+
+    def as_binary(self, offset=0.0, data_copy=False):
+        """Converts to an :class:`ArrayBinaryResponse`.
+
+        Args:
+            offset (float/int, optional): The energy offset as would
+                be returned by `ising_to_qubo`. The energy offset is
+                applied to each energy in the response.
+            data_copy (bool, optional): Whether to create a copy of the
+                data. Default False.
+
+        Returns:
+            :class:`ArrayBinaryResponse`
+
+        """
+        response = self._copy_with(samples=(self._samples + 1) // 2, energies=self._energies + offset,
+                                   cls=ArrayBinaryResponse)
+        if data_copy:
+            response.data = self.data.copy()
+            response.data_vectors = {name: vector.copy() for name, vector in iteritems(self.data_vectors)}
+        return response
+
+    def as_spin_response(self):
+        """Converts to a :class:`dimod.SpinResponse`, creating a dict for
+        every sample."""
+        return self._as_dict_response(dimod.SpinResponse())
+
+
+def _quadratic_energies(samples, index, linear, quadratic):
+    """Energy of each row of `samples` for the given linear and quadratic biases.
+
+    Works for both Ising problems and QUBOs (where the linear biases are on the
+    diagonal of `quadratic`).
+    """
+    energies = np.zeros(samples.shape[0], dtype=float)
+
+    if linear:
+        columns = [index[v] for v in linear]
+        biases = np.asarray([linear[v] for v in linear], dtype=float)
+        energies += samples[:, columns].dot(biases)
+
+    if quadratic:
+        edges = list(quadratic)
+        u_columns = [index[u] for u, __ in edges]
+        v_columns = [index[v] for __, v in edges]
+        biases = np.asarray([quadratic[edge] for edge in edges], dtype=float)
+        energies += (samples[:, u_columns] * samples[:, v_columns]).dot(biases)
+
+    return energies
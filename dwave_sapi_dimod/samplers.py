@@ -2,17 +2,19 @@
 
 
 """
-import random
+import functools
+import numbers
 
 import dimod
-
-from dwave_sapi2.remote import RemoteConnection
-from dwave_sapi2.local import local_connection
-from dwave_sapi2.core import solve_ising, solve_qubo
-from dwave_sapi2.util import get_hardware_adjacency
-from dwave_sapi2.embedding import find_embedding, embed_problem, unembed_answer
+import numpy as np
 
 from dwave_sapi_dimod import _PY2
+from dwave_sapi_dimod.cache import structure_cache, problem_fingerprint
+from dwave_sapi_dimod.futures import SAPIFuture, submit_many, wait, _SolvedProblem
+from dwave_sapi_dimod.instrumentation import _metrics
+from dwave_sapi_dimod.problems import SPIN
+from dwave_sapi_dimod import pool
+from dwave_sapi_dimod.responses import ArrayBinaryResponse, ArraySpinResponse
 
 __all__ = ['SAPILocalSampler', 'SAPISampler']
 
@@ -22,6 +24,9 @@ if _PY2:
 else:
     iteritems = lambda d: d.items()
 
+# the number of reads when the caller does not give one
+_DEFAULT_NUM_READS = 50
+
 
 class SAPILocalSampler(dimod.TemplateSampler):
     """dimod wrapper for a SAPI local solver.
@@ -29,24 +34,79 @@ class SAPILocalSampler(dimod.TemplateSampler):
     Args:
         solver_name (str): The string name of the desired solver, as
             returned by `solver_names`.
+        response_cache (:obj:`ResponseCache`, optional): If given, the
+            answers to problems are cached and reused when the same problem
+            is sampled again with the same parameters. Only for solvers that
+            always return the same answer, such as 'c4-sw_optimize'.
+            Default None.
 
     Attributes:
+        solver_name (str): The name of the solver.
+        solver: The SAPI solver.
         structure (tuple): (nodes, edges), the set of nodes and edges
             available to the solver.
+        hardware_graph (:obj:`HardwareGraph`): The same structure in
+            array form, used to check problems before submitting them.
+        response_cache (:obj:`ResponseCache`): The cache of answers, or
+            None.
 
     Notes:
+        The solver is only fetched, and its structure only computed, when
+        first needed, so creating a sampler is cheap. An unknown
+        `solver_name` is reported then rather than when the sampler is
+        created.
+
         See QUBIST documentation at https://dw2x.dwavesys.com/ for
         further details.
 
     """
-    def __init__(self, solver_name):
+    def __init__(self, solver_name, response_cache=None):
         dimod.TemplateSampler.__init__(self)
-        self.solver = solver = local_connection.get_solver(solver_name)
-        edges = get_hardware_adjacency(solver)
-        self.structure = (set().union(*edges), edges)
+        self.solver_name = solver_name
+        self.response_cache = response_cache
+
+        self._solver = None
+        self._hardware_graph = None
+
+    @property
+    def solver(self):
+        if self._solver is None:
+            self._solver = self._get_solver()
+        return self._solver
+
+    @property
+    def structure(self):
+        if self._structure is None:
+            self._load_structure()
+        return self._structure
+
+    @structure.setter
+    def structure(self, structure):
+        # dimod.TemplateSampler sets None, meaning not yet loaded
+        self._structure = structure
+
+    @property
+    def hardware_graph(self):
+        if self._hardware_graph is None:
+            self._load_structure()
+        return self._hardware_graph
+
+    def _get_solver(self):
+        # imported here so that only the processes that use local solvers pay for it
+        from dwave_sapi2.local import local_connection
+        return local_connection.get_solver(self.solver_name)
+
+    def _structure_key(self):
+        return ('local', self.solver_name)
+
+    def _load_structure(self):
+        # the structure is shared with any other sampler for the same solver, and the
+        # solver is only needed if it is not already known
+        __, self._structure, self._hardware_graph = structure_cache.get(self._structure_key(),
+                                                                        lambda: self.solver)
 
     @dimod.decorators.qubo(1)
-    def sample_qubo(self, Q, num_reads=50, **sapi_kwargs):
+    def sample_qubo(self, Q, num_reads=_DEFAULT_NUM_READS, compact=False, aggregate=False, **sapi_kwargs):
         """Solve the QUBO.
 
         Args:
@@ -54,49 +114,676 @@ class SAPILocalSampler(dimod.TemplateSampler):
                 form {(u, v): bias} where u, v are variables and bias
                 is numeric. The edges in Q must be a subset of those
                 given in the `structure` parameter.
+            compact (bool, optional): If True, return an
+                :obj:`ArrayBinaryResponse` that stores the samples as an
+                int8 matrix. Default False.
+            aggregate (bool, optional): If True, merge repeated samples,
+                summing their 'num_occurrences'. Default False.
             Additional keyword parameters are the same as for
             SAPI's solve_qubo function, see QUBIST documentation.
 
         Returns:
-            :obj:`BinaryResponse`
+            :obj:`BinaryResponse`/:obj:`ArrayBinaryResponse`
 
         Notes:
+            If `num_reads` is more than the solver accepts, the reads are
+            split into chunks that are submitted together, see
+            `sample_qubo_stream`.
+
             See QUBIST documentation at https://dw2x.dwavesys.com/ for
             further details.
 
         """
-        variables = set().union(*Q)
+        if num_reads > self._max_num_reads():
+            # too many for one submission, so wait for every chunk of reads
+            for response in self.sample_qubo_stream(Q, num_reads, compact=compact, aggregate=aggregate,
+                                                    **sapi_kwargs):
+                pass
+            return response
+
+        metrics = _metrics(type(self).__name__ + '.sample_qubo')
+
+        with metrics.stage('format'):
+            variables, Q = _format_qubo(Q, self.hardware_graph)
+
+        with metrics.stage('solve'):
+            answer = self._solve(_sapi_core().solve_qubo, (Q,), dict(sapi_kwargs, num_reads=num_reads))
+
+        with metrics.stage('parse'):
+            response = _parse_answer(answer, variables, False, compact, aggregate)
+
+        metrics.set('num_qubits', len(variables))
+        metrics.solver_timing = answer.get('timing')
+        return metrics.emit(response)
+
+    @dimod.decorators.ising(1, 2)
+    def sample_ising(self, h, J, num_reads=_DEFAULT_NUM_READS, compact=False, aggregate=False, **sapi_kwargs):
+        """Solve the Ising problem.
+
+        Args:
+            h (dict/list): The linear terms in the Ising problem. If a
+                dict, should be of the form {v: bias, ...} where v is
+                a variable in the Ising problem, and bias is the linear
+                bias associated with v. If a list, should be of the form
+                [bias, ...] where the indices of the biases are the
+                variables in the Ising problem.
+            J (dict): A dictionary of the quadratic terms in the Ising
+                problem. Should be of the form {(u, v): bias} where u,
+                v are variables in the Ising problem and bias is the
+                quadratic bias associated with u, v. The edges in J must
+                be a subset of those given in the `structure` parameter.
+            compact (bool, optional): If True, return an
+                :obj:`ArraySpinResponse` that stores the samples as an
+                int8 matrix. Default False.
+            aggregate (bool, optional): If True, merge repeated samples,
+                summing their 'num_occurrences'. Default False.
+            Additional keyword parameters are the same as for
+            SAPI's solve_ising function, see QUBIST documentation.
+
+        Returns:
+            :obj:`SpinResponse`/:obj:`ArraySpinResponse`
+
+        Notes:
+            If `num_reads` is more than the solver accepts, the reads are
+            split into chunks that are submitted together, see
+            `sample_ising_stream`.
+
+            See QUBIST documentation at https://dw2x.dwavesys.com/ for
+            further details.
+
+        """
+        if num_reads > self._max_num_reads():
+            # too many for one submission, so wait for every chunk of reads
+            for response in self.sample_ising_stream(h, J, num_reads, compact=compact, aggregate=aggregate,
+                                                     **sapi_kwargs):
+                pass
+            return response
+
+        metrics = _metrics(type(self).__name__ + '.sample_ising')
+
+        with metrics.stage('format'):
+            variables, h, J = _format_ising(h, J, self.hardware_graph)
+
+        with metrics.stage('solve'):
+            answer = self._solve(_sapi_core().solve_ising, (h, J), dict(sapi_kwargs, num_reads=num_reads))
+
+        with metrics.stage('parse'):
+            response = _parse_answer(answer, variables, True, compact, aggregate)
+
+        metrics.set('num_qubits', len(variables))
+        metrics.solver_timing = answer.get('timing')
+        return metrics.emit(response)
+
+    @dimod.decorators.qubo(1)
+    def sample_qubo_async(self, Q, num_reads=_DEFAULT_NUM_READS, compact=False, aggregate=False, **sapi_kwargs):
+        """Submit the QUBO without waiting for it to be solved.
+
+        Args:
+            Q (dict): A dictionary defining the QUBO. Should be of the
+                form {(u, v): bias} where u, v are variables and bias
+                is numeric. The edges in Q must be a subset of those
+                given in the `structure` parameter.
+            compact (bool, optional): If True, the future resolves to an
+                :obj:`ArrayBinaryResponse`. Default False.
+            aggregate (bool, optional): If True, merge repeated samples.
+                Default False.
+            Additional keyword parameters are the same as for
+            SAPI's async_solve_qubo function, see QUBIST documentation.
+
+        Returns:
+            :obj:`SAPIFuture`: A future that resolves to a
+            :obj:`BinaryResponse`.
+
+        Examples:
+            >>> sampler = sapi.SAPILocalSampler('c4-sw_optimize')
+            >>> futures = [sampler.sample_qubo_async({(0, 4): b}) for b in (-1, 1)]
+            >>> responses = [future.result() for future in futures]
+
+        """
+        variables, Q = _format_qubo(Q, self.hardware_graph)
+
+        return self._submit(_sapi_core().async_solve_qubo, (Q,), dict(sapi_kwargs, num_reads=num_reads),
+                            functools.partial(_parse_answer, variables=variables, spin=False, compact=compact,
+                                              aggregate=aggregate))
+
+    @dimod.decorators.ising(1, 2)
+    def sample_ising_async(self, h, J, num_reads=_DEFAULT_NUM_READS, compact=False, aggregate=False, **sapi_kwargs):
+        """Submit the Ising problem without waiting for it to be solved.
+
+        Args:
+            h (dict/list): The linear terms in the Ising problem. If a
+                dict, should be of the form {v: bias, ...} where v is
+                a variable in the Ising problem, and bias is the linear
+                bias associated with v. If a list, should be of the form
+                [bias, ...] where the indices of the biases are the
+                variables in the Ising problem.
+            J (dict): A dictionary of the quadratic terms in the Ising
+                problem. Should be of the form {(u, v): bias} where u,
+                v are variables in the Ising problem and bias is the
+                quadratic bias associated with u, v. The edges in J must
+                be a subset of those given in the `structure` parameter.
+            compact (bool, optional): If True, the future resolves to an
+                :obj:`ArraySpinResponse`. Default False.
+            aggregate (bool, optional): If True, merge repeated samples.
+                Default False.
+            Additional keyword parameters are the same as for
+            SAPI's async_solve_ising function, see QUBIST documentation.
+
+        Returns:
+            :obj:`SAPIFuture`: A future that resolves to a
+            :obj:`SpinResponse`.
+
+        """
+        variables, h, J = _format_ising(h, J, self.hardware_graph)
+
+        return self._submit(_sapi_core().async_solve_ising, (h, J), dict(sapi_kwargs, num_reads=num_reads),
+                            functools.partial(_parse_answer, variables=variables, spin=True, compact=compact,
+                                              aggregate=aggregate))
+
+    @dimod.decorators.qubo(1)
+    def sample_qubo_stream(self, Q, num_reads=_DEFAULT_NUM_READS, chunk_size=None, compact=False, aggregate=False,
+                           **sapi_kwargs):
+        """Split the reads into chunks, submit them all at once and iterate
+        over the results as the chunks are solved.
+
+        Args:
+            Q (dict): A dictionary defining the QUBO, see `sample_qubo`.
+            num_reads (int, optional): The total number of reads. Default
+                50.
+            chunk_size (int, optional): The maximum number of reads in each
+                chunk. Defaults to the most the solver accepts in one
+                submission, according to its 'num_reads_range' property.
+            compact (bool, optional): If True, yield
+                :obj:`ArrayBinaryResponse` objects. Default False.
+            aggregate (bool, optional): If True, merge repeated samples.
+                Default False.
+            Additional keyword parameters are the same as for
+            SAPI's async_solve_qubo function, see QUBIST documentation.
+
+        Yields:
+            :obj:`BinaryResponse`: Each time one or more chunks finish, a
+            response with the samples of every chunk finished so far. The
+            last one has all of the reads. Its 'timing' data is the sum
+            of the solver's timing for each of those chunks. Chunks that
+            have not finished are cancelled if the iteration is stopped
+            early.
+
+        Examples:
+            >>> sampler = sapi.SAPILocalSampler('c4-sw_optimize')
+            >>> for response in sampler.sample_qubo_stream({(0, 4): -1}, num_reads=5000):
+            ...     if next(iter(response.energies())) <= -1:
+            ...         break  # good enough
+
+        """
+        variables, Q = _format_qubo(Q, self.hardware_graph)
+
+        parse = functools.partial(_parse_answer, variables=variables, spin=False, compact=True,
+                                  aggregate=aggregate)
+        futures = [self._submit(_sapi_core().async_solve_qubo, (Q,), dict(sapi_kwargs, num_reads=reads), parse)
+                   for reads in self._chunk_reads(num_reads, chunk_size)]
+
+        return _stream_chunks(futures, ArrayBinaryResponse(sorted(variables)), compact, aggregate)
+
+    @dimod.decorators.ising(1, 2)
+    def sample_ising_stream(self, h, J, num_reads=_DEFAULT_NUM_READS, chunk_size=None, compact=False, aggregate=False,
+                            **sapi_kwargs):
+        """Split the reads into chunks, submit them all at once and iterate
+        over the results as the chunks are solved.
+
+        Args:
+            h (dict/list): The linear terms in the Ising problem, see
+                `sample_ising`.
+            J (dict): The quadratic terms in the Ising problem.
+            num_reads (int, optional): The total number of reads. Default
+                50.
+            chunk_size (int, optional): The maximum number of reads in each
+                chunk. Defaults to the most the solver accepts in one
+                submission, according to its 'num_reads_range' property.
+            compact (bool, optional): If True, yield
+                :obj:`ArraySpinResponse` objects. Default False.
+            aggregate (bool, optional): If True, merge repeated samples.
+                Default False.
+            Additional keyword parameters are the same as for
+            SAPI's async_solve_ising function, see QUBIST documentation.
+
+        Yields:
+            :obj:`SpinResponse`: Each time one or more chunks finish, a
+            response with the samples of every chunk finished so far. The
+            last one has all of the reads. Its 'timing' data is the sum
+            of the solver's timing for each of those chunks. Chunks that
+            have not finished are cancelled if the iteration is stopped
+            early.
+
+        """
+        variables, h, J = _format_ising(h, J, self.hardware_graph)
+
+        parse = functools.partial(_parse_answer, variables=variables, spin=True, compact=True,
+                                  aggregate=aggregate)
+        futures = [self._submit(_sapi_core().async_solve_ising, (h, J), dict(sapi_kwargs, num_reads=reads), parse)
+                   for reads in self._chunk_reads(num_reads, chunk_size)]
+
+        return _stream_chunks(futures, ArraySpinResponse(sorted(variables)), compact, aggregate)
 
-        if not all(isinstance(v, int) for v in variables):
-            raise ValueError('all variables must be index labeled')
+    def sample(self, problem, num_reads=_DEFAULT_NUM_READS, compact=False, aggregate=False, **sapi_kwargs):
+        """Solve a compiled problem.
 
-        solver = self.solver
+        The problem is checked against the structure and converted to the
+        form SAPI wants once, the first time it is sampled, rather than on
+        every call.
+
+        Args:
+            problem (:obj:`CompiledProblem`): The Ising problem or QUBO,
+                labelled with qubits, see :func:`compile_ising` and
+                :func:`compile_qubo`.
+            compact (bool, optional): If True, return an array-backed
+                response. Default False.
+            aggregate (bool, optional): If True, merge repeated samples,
+                summing their 'num_occurrences'. Default False.
+            Additional keyword parameters are the same as for
+            SAPI's solve_ising and solve_qubo functions, see QUBIST
+            documentation.
+
+        Returns:
+            :obj:`SpinResponse`/:obj:`ArraySpinResponse` for Ising
+            problems, :obj:`BinaryResponse`/:obj:`ArrayBinaryResponse` for
+            QUBOs.
+
+        Examples:
+            >>> sampler = sapi.SAPILocalSampler('c4-sw_optimize')
+            >>> problem = sapi.compile_ising({0: 1}, {(0, 4): -1})
+            >>> response = sampler.sample(problem)
+
+        """
+        spin = problem.vartype == SPIN
 
-        # for whatever reason sapi needs Q to be cleaned of empty values
-        Q = {edge: bias for edge, bias in iteritems(Q) if bias != 0.0}
+        if num_reads > self._max_num_reads():
+            # too many for one submission, sample it as an uncompiled problem
+            if spin:
+                h, J, __ = problem.as_ising()
+                return self.sample_ising(h, J, num_reads, compact=compact, aggregate=aggregate, **sapi_kwargs)
+            Q, __ = problem.as_qubo()
+            return self.sample_qubo(Q, num_reads, compact=compact, aggregate=aggregate, **sapi_kwargs)
 
-        answer = solve_qubo(solver, Q, num_reads=num_reads, **sapi_kwargs)
+        metrics = _metrics(type(self).__name__ + '.sample')
 
-        # parse the answers
-        solutions = answer['solutions']
-        energies = answer['energies']
+        with metrics.stage('format'):
+            variables, formatted = _format_compiled(problem, self.hardware_graph)
+
+        with metrics.stage('solve'):
+            core = _sapi_core()
+            answer = self._solve(core.solve_ising if spin else core.solve_qubo, formatted,
+                                 dict(sapi_kwargs, num_reads=num_reads))
+
+        with metrics.stage('parse'):
+            response = _parse_answer(answer, variables, spin, compact, aggregate)
+
+        metrics.set('num_qubits', len(variables))
+        metrics.solver_timing = answer.get('timing')
+        return metrics.emit(response)
+
+    def sample_async(self, problem, num_reads=_DEFAULT_NUM_READS, compact=False, aggregate=False, **sapi_kwargs):
+        """Submit a compiled problem without waiting for it to be solved.
+
+        Args:
+            problem (:obj:`CompiledProblem`): The Ising problem or QUBO,
+                labelled with qubits, see `sample`.
+            compact (bool, optional): If True, the future resolves to an
+                array-backed response. Default False.
+            aggregate (bool, optional): If True, merge repeated samples.
+                Default False.
+            Additional keyword parameters are the same as for
+            SAPI's async_solve_ising and async_solve_qubo functions, see
+            QUBIST documentation.
+
+        Returns:
+            :obj:`SAPIFuture`: A future that resolves to the response.
+
+        """
+        spin = problem.vartype == SPIN
+        variables, formatted = _format_compiled(problem, self.hardware_graph)
+
+        core = _sapi_core()
+        return self._submit(core.async_solve_ising if spin else core.async_solve_qubo, formatted,
+                            dict(sapi_kwargs, num_reads=num_reads),
+                            functools.partial(_parse_answer, variables=variables, spin=spin, compact=compact,
+                                              aggregate=aggregate))
+
+    def _solve(self, solve, problem, params):
+        """Solve the formatted problem with SAPI's blocking `solve` function,
+        or reuse the cached answer."""
+        cache = self.response_cache
+        if cache is None:
+            return solve(self.solver, *problem, **params)
+
+        key = self._response_cache_key(problem, params)
+        answer = cache.get(key)
+        if answer is None:
+            answer = _compact_answer(solve(self.solver, *problem, **params))
+            cache.put(key, answer, _answer_nbytes(answer))
+        return answer
+
+    def _submit(self, submit, problem, params, parse):
+        """Submit the formatted problem with SAPI's asynchronous `submit`
+        function, or resolve it from the cached answer."""
+        cache = self.response_cache
+        if cache is None:
+            return SAPIFuture(submit(self.solver, *problem, **params), parse)
+
+        key = self._response_cache_key(problem, params)
+        answer = cache.get(key)
+        if answer is not None:
+            return SAPIFuture(_SolvedProblem(answer), parse)
+
+        def store(answer):
+            answer = _compact_answer(answer)
+            cache.put(key, answer, _answer_nbytes(answer))
+            return parse(answer)
+        return SAPIFuture(submit(self.solver, *problem, **params), store)
+
+    def _response_cache_key(self, problem, params):
+        # the blocking and asynchronous functions give the same answers, so share keys.
+        # Solvers with the same name on different connections are different solvers,
+        # so the key identifies the connection as the structure cache's does
+        if len(problem) == 1:
+            (Q,) = problem
+            return (self._structure_key(), 'qubo', problem_fingerprint([], Q, params))
+        h, J = problem
+        return (self._structure_key(), 'ising', problem_fingerprint(h, J, params))
+
+    def _max_num_reads(self):
+        """The most reads the solver accepts in one submission."""
+        num_reads_range = self.solver.properties.get('num_reads_range')
+        if num_reads_range is None:
+            return float('inf')
+        return num_reads_range[1]
+
+    def _chunk_reads(self, num_reads, chunk_size=None):
+        """Split num_reads into as few chunks as fit, of (nearly) equal size."""
+        if chunk_size is None:
+            chunk_size = self._max_num_reads()
+        if chunk_size < 1:
+            raise ValueError("'chunk_size' must be a positive integer")
+
+        num_chunks = max(int(-(-num_reads // chunk_size)), 1)
+        return [num_reads // num_chunks + (idx < num_reads % num_chunks) for idx in range(num_chunks)]
+
+    def sample_qubo_many(self, Qs, max_in_flight=10, ordered=True, **sapi_kwargs):
+        """Solve many QUBOs, keeping several of them submitted at once.
+
+        Args:
+            Qs (iterable[dict]): The QUBOs to solve, each of the form
+                accepted by `sample_qubo`.
+            max_in_flight (int, optional): The maximum number of QUBOs
+                that are submitted but not yet yielded. Default 10.
+            ordered (bool, optional): If True, responses are yielded in
+                the order of `Qs`, otherwise as they are solved. Default
+                True.
+            Additional keyword parameters are passed to every call to
+            `sample_qubo_async`.
+
+        Yields:
+            :obj:`BinaryResponse`: The response for each QUBO, with its
+            position in `Qs` stored in the response data as
+            'problem_index'.
+
+        Examples:
+            >>> sampler = sapi.SAPILocalSampler('c4-sw_optimize')
+            >>> Qs = ({(0, 4): b} for b in range(-5, 5))
+            >>> for response in sampler.sample_qubo_many(Qs, max_in_flight=4):
+            ...     pass
+
+        """
+        def submit(Q):
+            return self.sample_qubo_async(Q, **sapi_kwargs)
+        return submit_many(submit, Qs, max_in_flight, ordered)
 
-        # convert the answer to a dict. sapi returnes answers that were 'off' as 3,
-        # so let's just choose a random value for them
-        samples = ({v: sample[v] if sample[v] != 3 else random.choice((0, 1))
-                    for v in variables} for sample in solutions)
+    def sample_ising_many(self, problems, max_in_flight=10, ordered=True, **sapi_kwargs):
+        """Solve many Ising problems, keeping several of them submitted at once.
 
-        # if information about the number of occurrences is returned, include it
+        Args:
+            problems (iterable[tuple]): The Ising problems to solve as
+                (h, J) pairs, each of the form accepted by `sample_ising`.
+            max_in_flight (int, optional): The maximum number of problems
+                that are submitted but not yet yielded. Default 10.
+            ordered (bool, optional): If True, responses are yielded in
+                the order of `problems`, otherwise as they are solved.
+                Default True.
+            Additional keyword parameters are passed to every call to
+            `sample_ising_async`.
+
+        Yields:
+            :obj:`SpinResponse`: The response for each problem, with its
+            position in `problems` stored in the response data as
+            'problem_index'.
+
+        """
+        def submit(problem):
+            h, J = problem
+            return self.sample_ising_async(h, J, **sapi_kwargs)
+        return submit_many(submit, problems, max_in_flight, ordered)
+
+
+def _sapi_core():
+    """SAPI's core module, imported when first needed so that importing the
+    package does not load dwave_sapi2."""
+    from dwave_sapi2 import core
+    return core
+
+
+def _stream_chunks(futures, merged, compact=False, aggregate=False):
+    """Merge the responses of the futures into `merged` as they finish, yielding
+    a snapshot after each. The snapshot's 'timing' data is the sum of the
+    timings of the chunks merged so far."""
+    pending = list(futures)
+    timing = {}
+    try:
+        while pending:
+            wait(pending, min_done=1)
+
+            finished = [future.done() for future in pending]
+            done = [future for future, is_done in zip(pending, finished) if is_done]
+            pending = [future for future, is_done in zip(pending, finished) if not is_done]
+
+            for future in done:
+                chunk = future.result()
+                if len(chunk):
+                    merged.add_samples_from_array(chunk.samples_array(), chunk.energies_array(),
+                                                  chunk.data_vectors)
+                for name, value in iteritems(chunk.data.get('timing', {})):
+                    timing[name] = timing.get(name, 0) + value
+            if aggregate:
+                merged = merged.aggregate()
+
+            # merging replaces the arrays rather than modifying them, so the snapshot
+            # is not affected by later chunks
+            snapshot = merged._copy_with()
+            snapshot.data = dict(merged.data)
+            if timing:
+                snapshot.data['timing'] = dict(timing)
+            if compact:
+                yield snapshot
+            elif isinstance(snapshot, ArraySpinResponse):
+                yield snapshot.as_spin_response()
+            else:
+                yield snapshot.as_binary_response()
+    finally:
+        # the caller stopped early
+        for future in pending:
+            future.cancel()
+
+
+def _format_qubo(Q, graph):
+    """Check the variable labels and structure, and remove empty biases from Q."""
+    variables = set().union(*Q)
+
+    if not all(isinstance(v, numbers.Integral) for v in variables):
+        raise ValueError('all variables must be index labeled')
+
+    # for whatever reason sapi needs Q to be cleaned of empty values
+    Q = {edge: bias for edge, bias in iteritems(Q) if bias != 0.0}
+
+    _check_structure(graph, set().union(*Q), [(u, v) for u, v in Q if u != v])
+
+    return variables, Q
+
+
+def _format_ising(h, J, graph):
+    """Check the variable labels and structure, convert h to the list sapi wants
+    and remove empty biases from J."""
+    # the ising decorator has already added the variables of J to h
+    variables = set(h)
+
+    if not all(isinstance(v, numbers.Integral) for v in variables):
+        raise ValueError('all variables must be index labeled')
+
+    J = {edge: bias for edge, bias in iteritems(J) if bias != 0.0}
+
+    active = {v for v, bias in iteritems(h) if bias != 0.0}
+    active.update(*J)
+    _check_structure(graph, active, list(J))
+
+    # sapi wants h as a list indexed by qubit
+    h_list = [0.] * (max(variables) + 1 if variables else 0)
+    for v, bias in iteritems(h):
+        h_list[v] = bias
+
+    return variables, h_list, J
+
+
+def _format_compiled(problem, graph):
+    """The compiled problem in the form sapi wants, checked against the structure.
+    The result is kept on the problem, so sampling it again on the same
+    structure skips the checks."""
+    cached = problem._derived.get('sapi_format')
+    if cached is not None and cached[0] is graph:
+        return cached[1]
+
+    if not all(isinstance(v, numbers.Integral) for v in problem.variables):
+        raise ValueError('all variables must be index labeled')
+
+    labels = problem.variables
+    linear = problem.linear.tolist()
+    couplers = [(labels[u], labels[v]) for u, v in zip(problem.row.tolist(), problem.col.tolist())]
+    biases = dict(zip(couplers, problem.quadratic.tolist()))
+
+    active = {labels[idx] for idx, bias in enumerate(linear) if bias != 0.0}
+    active.update(*couplers)
+    _check_structure(graph, active, couplers)
+
+    if problem.vartype == SPIN:
+        h_list = [0.] * (max(labels) + 1 if labels else 0)
+        for v, bias in zip(labels, linear):
+            h_list[v] = bias
+        formatted = (h_list, biases)
+    else:
+        Q = {(v, v): bias for v, bias in zip(labels, linear) if bias != 0.0}
+        Q.update(biases)
+        formatted = (Q,)
+
+    result = (set(labels), formatted)
+    problem._derived['sapi_format'] = (graph, result)
+    return result
+
+
+def _check_structure(graph, active, couplers):
+    """Reject problems that don't fit the structure before sending them anywhere.
+    Only the variables and interactions with biases are sent, so only they need
+    to be in the structure."""
+    active = list(active)
+    found = graph.has_nodes(active)
+    if not found.all():
+        raise ValueError('variables {} are not qubits of the solver'.format(
+            sorted(v for v, ok in zip(active, found) if not ok)))
+
+    if couplers:
+        us, vs = zip(*couplers)
+        found = graph.has_edges(us, vs)
+        if not found.all():
+            raise ValueError('interactions {} are not couplers of the solver'.format(
+                [edge for edge, ok in zip(couplers, found) if not ok]))
+
+
+def _compact_answer(answer):
+    """The answer with its solutions and energies as arrays, for caching."""
+    answer = dict(answer)
+    answer['solutions'] = np.asarray(answer['solutions'], dtype=np.int8)
+    answer['energies'] = np.asarray(answer['energies'], dtype=float)
+    if 'num_occurrences' in answer:
+        answer['num_occurrences'] = np.asarray(answer['num_occurrences'])
+    return answer
+
+
+def _answer_nbytes(answer):
+    return sum(value.nbytes for value in answer.values() if isinstance(value, np.ndarray))
+
+
+def _parse_answer(answer, variables, spin, compact=False, aggregate=False):
+    """Convert the answer returned by sapi into a dimod response.
+
+    The response is a SpinResponse if spin is True, otherwise a BinaryResponse,
+    or their array-backed equivalents if compact. If aggregate, repeated samples
+    are merged.
+    """
+    if aggregate:
+        response = _parse_answer(answer, variables, spin, compact=True).aggregate()
+        if compact:
+            return response
+        return response.as_spin_response() if spin else response.as_binary_response()
+
+    variables = sorted(variables)
+
+    if compact:
+        response = ArraySpinResponse(variables) if spin else ArrayBinaryResponse(variables)
+    else:
+        response = dimod.SpinResponse() if spin else dimod.BinaryResponse()
+
+    # keep the timing reported by the solver
+    if 'timing' in answer:
+        response.data['timing'] = answer['timing']
+
+    energies = np.asarray(answer['energies'], dtype=float)
+
+    if not len(energies):
+        return response
+
+    # sapi returns a row per solution with a column for every qubit, we only want
+    # the columns of the variables in the problem
+    solutions = np.asarray(answer['solutions'], dtype=np.int8)
+    samples = solutions[:, variables]
+
+    # sapi returnes answers that were 'off' as 3, so let's just choose a random
+    # value for them
+    inactive = samples == 3
+    values = np.random.randint(2, size=np.count_nonzero(inactive))
+    samples[inactive] = 2 * values - 1 if spin else values
+
+    # sapi returns the solutions sorted by energy, but make sure (stably) so we can
+    # load the response directly
+    order = np.argsort(energies, kind='mergesort')
+
+    if compact:
         if 'num_occurrences' in answer:
-            num_occurrences = answer['num_occurrences']
-            sample_data = ({'num_occurrences': n} for n in num_occurrences)
+            data_vectors = {'num_occurrences': np.asarray(answer['num_occurrences'])[order]}
         else:
-            sample_data = ({} for __ in solutions)
+            data_vectors = None
+        response.add_samples_from_array(samples[order], energies[order], data_vectors,
+                                        sorted_by_energy=True)
+        return response
 
-        response = dimod.BinaryResponse()
-        response.add_samples_from(samples, energies, sample_data)
+    # if information about the number of occurrences is returned, include it
+    if 'num_occurrences' in answer:
+        num_occurrences = np.asarray(answer['num_occurrences'])[order]
+        sample_data = [{'num_occurrences': n} for n in num_occurrences.tolist()]
+    else:
+        sample_data = [{} for __ in order]
 
-        return response
+    # the samples are known to be valid and ordered by energy, so we can skip the
+    # per-value checks and sorting done by add_samples_from
+    response._samples = [dict(zip(variables, row)) for row in samples[order].tolist()]
+    response._energies = energies[order].tolist()
+    response._sample_data = sample_data
+
+    return response
 
 
 class SAPISampler(SAPILocalSampler):
@@ -108,25 +795,57 @@ class SAPISampler(SAPILocalSampler):
         url (str): SAPI url.
         token (str): API token.
         proxy_url (str): Proxy url.
+        connection_pool (:obj:`ConnectionPool`, optional): The pool the
+            connection and solver handle are drawn from. Defaults to the
+            pool shared by the whole process, so creating many samplers
+            for the same solver connects only once.
+        response_cache (:obj:`ResponseCache`, optional): If given, the
+            answers to problems are cached, see :class:`SAPILocalSampler`.
+            QPU solvers return different answers each time, so should not
+            be given one. Default None.
 
     Attributes:
+        solver_name (str): The name of the solver.
+        connection: The SAPI remote connection.
+        solver: The SAPI solver.
         structure (tuple): (nodes, edges), the set of nodes and edges
             available to the solver.
+        hardware_graph (:obj:`HardwareGraph`): The same structure in
+            array form, used to check problems before submitting them.
+        response_cache (:obj:`ResponseCache`): The cache of answers, or
+            None.
 
     Notes:
+        The sampler only connects to SAPI when the solver or its structure
+        is first needed, so creating a sampler is cheap. Connection errors
+        are reported then rather than when the sampler is created.
+
         See QUBIST documentation at https://dw2x.dwavesys.com/ for
         further details.
 
     """
-    def __init__(self, solver_name, url, token, proxy_url=None):
-        dimod.TemplateSampler.__init__(self)
-
-        if proxy_url is None:
-            self.connection = connection = RemoteConnection(url, token)
-        else:
-            self.connection = connection = RemoteConnection(url, token, proxy_url)
-
-        self.solver = solver = connection.get_solver(solver_name)
-
-        edges = get_hardware_adjacency(solver)
-        self.structure = (set().union(*edges), edges)
\ No newline at end of file
+    def __init__(self, solver_name, url, token, proxy_url=None, connection_pool=None, response_cache=None):
+        SAPILocalSampler.__init__(self, solver_name, response_cache)
+
+        if connection_pool is None:
+            connection_pool = pool.connection_pool
+
+        self._url = url
+        self._token = token
+        self._proxy_url = proxy_url
+        self._connection_pool = connection_pool
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._solver = self._get_solver()
+        return self._connection
+
+    def _get_solver(self):
+        self._connection, solver = self._connection_pool.get_solver(self.solver_name, self._url, self._token,
+                                                                    self._proxy_url)
+        return solver
+
+    def _structure_key(self):
+        return (self._url, self.solver_name)
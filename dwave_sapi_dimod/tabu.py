@@ -0,0 +1,158 @@
+"""
+A classical tabu search for Ising problems, used to improve the solutions
+found by the solver, for instance by :class:`DecompositionComposite`.
+"""
+import numpy as np
+
+from dwave_sapi_dimod import _PY2
+
+__all__ = ['tabu_search']
+
+if _PY2:
+    range = xrange
+    iteritems = lambda d: d.iteritems()
+else:
+    iteritems = lambda d: d.items()
+
+
+class _IsingArrays(object):
+    """An index-labelled Ising problem with n variables in array form.
+
+    The couplers are kept in compressed sparse row form, in both
+    orientations, so that the local field of every variable can be updated
+    with one slice when a variable is flipped.
+    """
+    def __init__(self, h, J, num_variables):
+        self.num_variables = n = num_variables
+
+        self.h = np.zeros(n, dtype=float)
+        for v, bias in iteritems(h):
+            self.h[v] += bias
+
+        # merge (u, v) and (v, u) and drop self-loops and zero biases
+        couplers = {}
+        for (u, v), bias in iteritems(J):
+            if u == v:
+                continue
+            key = (u, v) if u < v else (v, u)
+            couplers[key] = couplers.get(key, 0.) + bias
+        couplers = {key: bias for key, bias in iteritems(couplers) if bias}
+
+        edges = np.asarray(list(couplers), dtype=np.int64).reshape(-1, 2)
+        self.us, self.vs = edges[:, 0], edges[:, 1]
+        self.biases = np.asarray(list(couplers.values()), dtype=float)
+
+        rows = np.concatenate((self.us, self.vs))
+        cols = np.concatenate((self.vs, self.us))
+        data = np.concatenate((self.biases, self.biases))
+
+        order = np.argsort(rows, kind='mergesort')
+        self.rows, self.cols, self.data = rows[order], cols[order], data[order]
+        self.indptr = np.searchsorted(self.rows, np.arange(n + 1))
+
+    def energy(self, spins):
+        """The energy of the spin vector `spins`."""
+        return float(self.h.dot(spins) + (spins[self.us] * spins[self.vs]).dot(self.biases))
+
+    def fields(self, spins):
+        """The local field h_i + sum_j J_ij s_j of every variable."""
+        fields = self.h.copy()
+        np.add.at(fields, self.rows, self.data * spins[self.cols])
+        return fields
+
+
+def tabu_search(h, J, initial=None, num_steps=None, tenure=None, random_state=None):
+    """Improve a solution of an Ising problem with a single-flip tabu search.
+
+    At each step the variable whose flip lowers the energy the most (or
+    raises it the least) is flipped, unless it was flipped within the last
+    `tenure` steps. A tabu flip is still allowed if it leads to a solution
+    better than any seen so far.
+
+    Args:
+        h (dict/list): The linear biases of an index-labelled Ising problem.
+        J (dict): The quadratic biases, {(u, v): bias, ...}.
+        initial (array-like, optional): The spin-valued starting solution,
+            one value per variable. Random if not given.
+        num_steps (int, optional): The number of flips. Defaults to ten
+            times the number of variables, at most 10000.
+        tenure (int, optional): The number of steps a flipped variable
+            stays tabu. Defaults to a quarter of the number of variables, at
+            most 20.
+        random_state (:obj:`numpy.random.RandomState`, optional): Source of
+            randomness for the starting solution and for breaking ties.
+
+    Returns:
+        tuple: (spins, energy), the best solution found as an int8 array
+        and its energy.
+
+    Examples:
+        >>> spins, energy = sapi.tabu_search({0: 1}, {(0, 1): -1, (1, 2): 1})
+        >>> energy
+        -3.0
+
+    """
+    if isinstance(h, dict):
+        num_variables = len(set(h).union(*J))
+    else:
+        num_variables = len(set(range(len(h))).union(*J))
+        h = dict(enumerate(h))
+
+    return _tabu_search(_IsingArrays(h, J, num_variables), initial, num_steps, tenure, random_state)
+
+
+def _tabu_search(problem, initial=None, num_steps=None, tenure=None, random_state=None):
+    n = problem.num_variables
+
+    if random_state is None:
+        random_state = np.random.RandomState()
+
+    if initial is None:
+        spins = random_state.randint(2, size=n).astype(np.int8) * 2 - 1
+    else:
+        spins = np.array(initial, dtype=np.int8)
+
+    if not n:
+        return spins, problem.energy(spins)
+
+    if num_steps is None:
+        num_steps = min(10 * n, 10000)
+    if tenure is None:
+        tenure = min(n // 4, 20)
+
+    fields = problem.fields(spins)
+    energy = best_energy = problem.energy(spins)
+    best_spins = spins.copy()
+
+    # the step at which each variable stops being tabu
+    tabu_until = np.zeros(n, dtype=np.int64)
+
+    indptr, cols, data = problem.indptr, problem.cols, problem.data
+
+    for step in range(num_steps):
+        # the change in energy of flipping each variable
+        deltas = -2. * spins * fields
+
+        # tabu variables are skipped unless they lead to a new best solution
+        allowed = (tabu_until <= step) | (energy + deltas < best_energy)
+        if not allowed.any():
+            continue
+
+        candidates = np.where(allowed, deltas, np.inf)
+        lowest = candidates.min()
+        ties = np.flatnonzero(candidates == lowest)
+        v = ties[random_state.randint(len(ties))] if len(ties) > 1 else ties[0]
+
+        # flip v and update the fields of its neighbours
+        neighbours = slice(indptr[v], indptr[v + 1])
+        fields[cols[neighbours]] -= 2. * spins[v] * data[neighbours]
+        spins[v] = -spins[v]
+        energy += lowest
+        tabu_until[v] = step + 1 + tenure
+
+        if energy < best_energy - 1e-9:
+            best_energy = energy
+            best_spins[:] = spins
+
+    # recompute rather than trust the accumulated sum
+    return best_spins, problem.energy(best_spins)
@@ -0,0 +1,203 @@
+"""
+Tests for the caches.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from dwave_sapi2.local import local_connection
+
+import dwave_sapi_dimod as sapi
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = sapi.EmbeddingCache(maxsize=2)
+
+        cache['a'] = [[0]]
+        cache['b'] = [[1]]
+        self.assertEqual(cache.get('a'), [[0]])  # 'a' is now most recently used
+
+        cache['c'] = [[2]]
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_counters(self):
+        cache = sapi.EmbeddingCache()
+
+        self.assertIsNone(cache.get('a'))
+        cache['a'] = []
+        self.assertEqual(cache['a'], [])
+        with self.assertRaises(KeyError):
+            cache['b']
+
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+
+    def test_unbounded(self):
+        cache = sapi.EmbeddingCache(maxsize=None)
+        for v in range(1000):
+            cache[v] = [[v]]
+        self.assertEqual(len(cache), 1000)
+
+
+class TestSQLiteEmbeddingStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'embeddings.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_put(self):
+        store = sapi.SQLiteEmbeddingStore(self.path)
+
+        self.assertIsNone(store.get('solver', 'adj', 'abc'))
+
+        store.put('solver', 'adj', 'abc', [[0, 4], [1]])
+        self.assertEqual(store.get('solver', 'adj', 'abc'), [[0, 4], [1]])
+
+        # each part of the key matters
+        self.assertIsNone(store.get('other', 'adj', 'abc'))
+        self.assertIsNone(store.get('solver', 'other', 'abc'))
+
+        # the first embedding stored is kept
+        store.put('solver', 'adj', 'abc', [[5]])
+        self.assertEqual(store.get('solver', 'adj', 'abc'), [[0, 4], [1]])
+
+    def test_shared(self):
+        sapi.SQLiteEmbeddingStore(self.path).put('solver', 'adj', 'abc', [[0]])
+
+        # another store (as in another process) sees the same embeddings
+        self.assertEqual(sapi.SQLiteEmbeddingStore(self.path).get('solver', 'adj', 'abc'), [[0]])
+
+
+class TestAdjacencyFingerprint(unittest.TestCase):
+    def test_orientation(self):
+        self.assertEqual(sapi.adjacency_fingerprint({0, 1, 4}, {(0, 4), (4, 0), (1, 4)}),
+                         sapi.adjacency_fingerprint([4, 1, 0], [(4, 1), (0, 4)]))
+        self.assertNotEqual(sapi.adjacency_fingerprint({0, 1, 4}, {(0, 4)}),
+                            sapi.adjacency_fingerprint({0, 4}, {(0, 4)}))
+
+
+class TestStructureFingerprint(unittest.TestCase):
+    def test_orientation_and_biases(self):
+        self.assertEqual(sapi.structure_fingerprint(3, [(0, 1), (1, 2)]),
+                         sapi.structure_fingerprint(3, {(2, 1): -1, (0, 1): 1}))
+
+    def test_different_structure(self):
+        self.assertNotEqual(sapi.structure_fingerprint(3, [(0, 1), (1, 2)]),
+                            sapi.structure_fingerprint(3, [(0, 1), (0, 2)]))
+        self.assertNotEqual(sapi.structure_fingerprint(3, [(0, 1)]),
+                            sapi.structure_fingerprint(4, [(0, 1)]))
+
+
+class TestHardwareGraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = sapi.HardwareGraph({0, 1, 4, 5, 7}, {(0, 4), (5, 0), (1, 4)})
+
+    def test_neighbours(self):
+        graph = self.graph
+        np.testing.assert_array_equal(graph.neighbours(0), [4, 5])
+        np.testing.assert_array_equal(graph.neighbours(4), [0, 1])
+        np.testing.assert_array_equal(graph.neighbours(7), [])
+
+    def test_edges(self):
+        graph = self.graph
+        self.assertTrue(graph.has_edge(0, 4))
+        self.assertTrue(graph.has_edge(4, 0))
+        self.assertFalse(graph.has_edge(0, 1))
+        self.assertFalse(graph.has_edge(0, 100))
+        np.testing.assert_array_equal(graph.has_edges([0, 0, 1, -1], [5, 7, 4, 0]), [True, False, True, False])
+
+    def test_nodes(self):
+        graph = self.graph
+        self.assertTrue(graph.has_node(7))
+        self.assertFalse(graph.has_node(3))
+        np.testing.assert_array_equal(graph.has_nodes([0, 2, 7, 8]), [True, False, True, False])
+
+    def test_empty(self):
+        graph = sapi.HardwareGraph([], [])
+        self.assertFalse(graph.has_edge(0, 1))
+        self.assertFalse(graph.has_node(0))
+
+
+class TestStructureCache(unittest.TestCase):
+    def test_shared(self):
+        cache = sapi.StructureCache()
+        solver = local_connection.get_solver('c4-sw_optimize')
+
+        properties, structure, graph = cache.get(('local', 'c4-sw_optimize'), solver)
+        self.assertIn(('local', 'c4-sw_optimize'), cache)
+
+        nodes, edges = structure
+        self.assertTrue(all(graph.has_edge(u, v) for u, v in edges))
+        self.assertTrue(all(graph.has_node(v) for v in nodes))
+
+        # the same objects are returned while the entry is fresh
+        self.assertIs(cache.get(('local', 'c4-sw_optimize'), solver)[2], graph)
+
+        cache.invalidate(('local', 'c4-sw_optimize'))
+        self.assertIsNot(cache.get(('local', 'c4-sw_optimize'), solver)[2], graph)
+
+    def test_ttl(self):
+        cache = sapi.StructureCache(ttl=0)
+        solver = local_connection.get_solver('c4-sw_optimize')
+
+        __, __, graph = cache.get('key', solver)
+        self.assertIsNot(cache.get('key', solver)[2], graph)
+
+
+class TestProblemFingerprint(unittest.TestCase):
+    def test_canonical(self):
+        fp = sapi.problem_fingerprint({0: 1, 1: -1}, {(0, 1): .5}, {'num_reads': 10})
+        self.assertEqual(fp, sapi.problem_fingerprint({1: -1., 0: 1.}, {(1, 0): .5}, {'num_reads': 10}))
+
+        self.assertNotEqual(fp, sapi.problem_fingerprint({0: 1, 1: -1}, {(0, 1): .6}, {'num_reads': 10}))
+        self.assertNotEqual(fp, sapi.problem_fingerprint({0: 1, 1: -1}, {(0, 1): .5}, {'num_reads': 11}))
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = sapi.ResponseCache(maxsize=2)
+
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)  # 'a' is now most recently used
+
+        cache.put('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_max_bytes(self):
+        cache = sapi.ResponseCache(maxsize=None, max_bytes=100)
+
+        cache.put('a', 1, 60)
+        cache.put('b', 2, 30)
+        self.assertEqual(cache.nbytes, 90)
+
+        cache.put('c', 3, 30)
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.nbytes, 60)
+
+        # too large to keep at all
+        cache.put('d', 4, 101)
+        self.assertNotIn('d', cache)
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+    def test_ttl(self):
+        cache = sapi.ResponseCache(ttl=0)
+        cache.put('a', 1, 10)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual((len(cache), cache.nbytes, cache.misses), (0, 0, 1))
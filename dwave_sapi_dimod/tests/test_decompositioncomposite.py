@@ -0,0 +1,48 @@
+"""
+Tests for DecompositionComposite(EmbeddingComposite(SAPILocalSampler())).
+"""
+
+import itertools
+import random
+import unittest
+
+import dimod
+
+import dwave_sapi_dimod as sapi
+
+
+class TestDecompositionComposite(unittest.TestCase):
+    def setUp(self):
+        child = sapi.EmbeddingComposite(sapi.SAPILocalSampler('c4-sw_optimize'))
+        self.sampler = sapi.DecompositionComposite(child, subproblem_size=10, max_iter=5, random_seed=3)
+
+    def test_larger_than_chip(self):
+        # more variables than the chip has qubits
+        rng = random.Random(5)
+        h = {v: rng.uniform(-1, 1) for v in range(200)}
+        J = {(u, v): rng.uniform(-1, 1) for u, v in itertools.combinations(h, 2) if rng.random() < .02}
+
+        response = self.sampler.sample_ising(h, J)
+        self.assertEqual(len(response), 1)
+        self.assertEqual(response.data['num_subproblems'], 5)
+
+        sample, energy = next(iter(response.items()))
+        self.assertEqual(set(sample), set(h))
+        self.assertAlmostEqual(dimod.ising_energy(h, J, sample), energy)
+
+    def test_small(self):
+        # labels that need to be relabelled, fewer variables than a subproblem
+        h = {'a': 1}
+        J = {('a', 'b'): -1, ('b', 'c'): 1}
+        response = self.sampler.sample_ising(h, J, compact=True)
+        self.assertIsInstance(response, sapi.ArraySpinResponse)
+        self.assertEqual(next(iter(response)), {'a': -1, 'b': -1, 'c': 1})
+
+        Q = {(0, 0): 1, (0, 1): -1.2, (1, 1): .1}
+        response = self.sampler.sample_qubo(Q)
+        self.assertEqual(next(iter(response)), {0: 1, 1: 1})
+
+    def test_timeout(self):
+        sampler = sapi.DecompositionComposite(self.sampler.children[0], max_iter=100, timeout=0)
+        response = sampler.sample_ising({0: 1}, {(0, 1): -1})
+        self.assertEqual(response.data['num_subproblems'], 0)
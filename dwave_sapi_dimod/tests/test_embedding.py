@@ -0,0 +1,147 @@
+"""
+Tests for the embedding tools.
+"""
+
+import unittest
+import itertools
+
+import numpy as np
+
+import dwave_sapi_dimod as sapi
+
+
+class TestFindBestEmbedding(unittest.TestCase):
+    def setUp(self):
+        __, self.edgeset = sapi.SAPILocalSampler('c4-sw_optimize').structure
+
+    def check_embedding(self, S, embeddings):
+        # chains are disjoint and every edge in S is realized by a coupler
+        qubits = [q for chain in embeddings for q in chain]
+        self.assertEqual(len(qubits), len(set(qubits)))
+        for u, v in S:
+            if u != v:
+                self.assertTrue(any((p, q) in self.edgeset for p in embeddings[u] for q in embeddings[v]))
+
+    def test_parallel(self):
+        S = set(itertools.combinations(range(6), 2))
+        embeddings = sapi.find_best_embedding(S, self.edgeset, num_tries=4, timeout=60)
+        self.assertEqual(len(embeddings), 6)
+        self.check_embedding(S, embeddings)
+
+    def test_single_process(self):
+        S = {(0, 1), (1, 2), (0, 2)}
+        embeddings = sapi.find_best_embedding(S, self.edgeset, num_tries=3, processes=1, random_seed=5)
+        self.assertEqual(len(embeddings), 3)
+        self.check_embedding(S, embeddings)
+
+    def test_too_large(self):
+        # K40 does not fit on a C4
+        S = set(itertools.combinations(range(40), 2))
+        self.assertEqual(sapi.find_best_embedding(S, self.edgeset, num_tries=2, timeout=5), [])
+
+
+class TestEmbeddingQuality(unittest.TestCase):
+    def test_ordering(self):
+        short = [[0], [1, 2], [3, 4]]
+        long_ = [[0], [1], [2, 3, 4]]
+        self.assertLess(sapi.embedding_quality(short), sapi.embedding_quality(long_))
+        self.assertEqual(sapi.embedding_quality(short), (2, 5))
+        self.assertEqual(sapi.embedding_quality([]), (0, 0))
+
+
+class TestCompiledEmbedding(unittest.TestCase):
+    def setUp(self):
+        __, self.edgeset = sapi.SAPILocalSampler('c4-sw_optimize').structure
+
+    def test_matches_embed_problem(self):
+        from dwave_sapi2.embedding import embed_problem
+
+        S = set(itertools.combinations(range(5), 2))
+        embeddings = sapi.find_best_embedding(S, self.edgeset, num_tries=1)
+        compiled = sapi.CompiledEmbedding(embeddings, self.edgeset, S)
+
+        rng = np.random.RandomState(0)
+        for __ in range(3):
+            h = rng.uniform(-1, 1, size=5).tolist()
+            # either orientation is accepted
+            J = {(v, u) if rng.randint(2) else (u, v): bias for (u, v), bias in zip(S, rng.uniform(-1, 1, len(S)))}
+
+            h0, J0 = compiled.embed(h, J)
+            h1, j0, jc, __ = embed_problem(h, J, embeddings, self.edgeset)
+
+            np.testing.assert_allclose(h0, h1)
+
+            J1 = {(min(p, q), max(p, q)): bias for (p, q), bias in j0.items()}
+            J1.update({(min(p, q), max(p, q)): bias for (p, q), bias in jc.items()})
+            self.assertEqual(set((min(p, q), max(p, q)) for p, q in J0), set(J1))
+            for (p, q), bias in J0.items():
+                self.assertAlmostEqual(bias, J1[(min(p, q), max(p, q))])
+
+    def test_one_orientation(self):
+        # each coupler listed once, some with the larger qubit first
+        edgeset = {(q, p) if (p + q) % 2 else (p, q) for p, q in self.edgeset if p < q}
+
+        S = set(itertools.combinations(range(5), 2))
+        embeddings = sapi.find_best_embedding(S, self.edgeset, num_tries=1)
+        compiled = sapi.CompiledEmbedding(embeddings, edgeset, S)
+        expected = sapi.CompiledEmbedding(embeddings, self.edgeset, S)
+
+        h = [.1, -.2, .3, -.4, .5]
+        J = {edge: 1. for edge in S}
+        self.assertEqual(compiled.embed(h, J), expected.embed(h, J))
+
+        # the chain couplers are found whatever their orientation
+        __, J0 = sapi.CompiledEmbedding([[0, 4], [1]], {(4, 0), (4, 1)}, [(0, 1)]).embed([0., 0.], {(0, 1): 1.})
+        self.assertEqual(J0, {(0, 4): -1., (1, 4): 1.})
+
+    def test_errors(self):
+        compiled = sapi.CompiledEmbedding([[0], [4], [1]], self.edgeset, [(0, 1)])
+        with self.assertRaises(ValueError):
+            compiled.embed([0., 0., 0.], {(1, 2): 1.})
+
+        # no coupler between the chains of 0 and 2
+        with self.assertRaises(ValueError):
+            sapi.CompiledEmbedding([[0], [4], [1]], self.edgeset, [(0, 2)])
+
+
+class TestUnembedSamples(unittest.TestCase):
+    def setUp(self):
+        # variable 0 on qubits 0, 1, 2 and variable 1 on qubit 3
+        self.embeddings = [[0, 1, 2], [3]]
+        self.samples = [[1, 1, 1, -1],
+                        [1, 1, -1, -1],
+                        [-1, -1, 1, 1]]
+
+    def test_majority_vote(self):
+        unembedded, fraction, rows = sapi.unembed_samples(self.samples, self.embeddings, 'majority_vote')
+        self.assertEqual(unembedded.tolist(), [[1, -1], [1, -1], [-1, 1]])
+        self.assertEqual(fraction.tolist(), [0., .5, .5])
+        self.assertEqual(rows.tolist(), [0, 1, 2])
+
+    def test_discard(self):
+        unembedded, fraction, rows = sapi.unembed_samples(self.samples, self.embeddings, 'discard')
+        self.assertEqual(unembedded.tolist(), [[1, -1]])
+        self.assertEqual(fraction.tolist(), [0.])
+        self.assertEqual(rows.tolist(), [0])
+
+    def test_weighted_random(self):
+        # intact chains are never changed
+        unembedded, __, __ = sapi.unembed_samples([[1, 1, 1, -1]] * 10, self.embeddings, 'weighted_random')
+        self.assertEqual(unembedded.tolist(), [[1, -1]] * 10)
+
+        unembedded, __, __ = sapi.unembed_samples([[1, 1, -1, -1]] * 1000, self.embeddings, 'weighted_random')
+        self.assertTrue(0.5 < np.mean(unembedded[:, 0] == 1) < 0.85)
+
+    def test_minimize_energy(self):
+        # a strong ferromagnetic coupling pulls the broken variable 0 to match variable 1
+        h = [0., 0.]
+        J = {(0, 1): -1.}
+        unembedded, fraction, __ = sapi.unembed_samples(self.samples, self.embeddings, 'minimize_energy', h, J)
+        self.assertEqual(unembedded.tolist(), [[1, -1], [-1, -1], [1, 1]])
+        self.assertEqual(fraction.tolist(), [0., .5, .5])
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            sapi.unembed_samples(self.samples, self.embeddings, 'vote')
+        with self.assertRaises(ValueError):
+            sapi.unembed_samples(self.samples, self.embeddings, 'minimize_energy')
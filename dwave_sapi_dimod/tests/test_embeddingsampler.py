@@ -7,6 +7,9 @@ Both of these samplers are unstructured.
 import unittest
 import random
 import itertools
+import os
+import shutil
+import tempfile
 
 import dimod
 
@@ -71,6 +74,49 @@ class TestEmbeddingCompositeSAPILocalSampler(unittest.TestCase):
         response = sampler.sample_qubo(Q)
         self.check_binary_response(response, Q)
 
+    def test_solved_classically(self):
+        sampler = self.sampler
+
+        # no couplers, so nothing needs to be embedded
+        h = {'a': -1, 'b': 2, 'c': 0}
+        J = {('a', 'b'): 0}
+        response = sampler.sample_ising(h, J)
+        self.check_spin_response(response, h, J)
+        self.assertEqual(len(sampler.cached_embeddings), 0)
+
+        # c has no bias, so is left free
+        for sample in response:
+            self.assertEqual((sample['a'], sample['b']), (1, -1))
+
+        # as many reads as the child takes by default
+        self.assertEqual(sum(data['num_occurrences'] for __, data in response.samples(data=True)), 50)
+
+        response = sampler.sample_ising_async(h, J).result()
+        self.check_spin_response(response, h, J)
+        self.assertEqual(sum(data['num_occurrences'] for __, data in response.samples(data=True)), 50)
+
+        # the samples stand for every read, with c random in each
+        response = sampler.sample_ising(h, J, num_reads=50, compact=True)
+        self.assertEqual(response.data_vectors['num_occurrences'].sum(), 50)
+        self.assertEqual(set(response.samples_array()[:, response.index['c']].tolist()), {-1, 1})
+        response = sampler.sample_ising_async(h, J, num_reads=50, compact=True).result()
+        self.assertEqual(response.data_vectors['num_occurrences'].sum(), 50)
+
+        h = {'a': -1, 'b': 2}
+        response = sampler.sample_ising(h, J, num_reads=50, compact=True)
+        self.assertEqual(response.data_vectors['num_occurrences'].tolist(), [50])
+
+    def test_roof_duality(self):
+        sampler = sapi.EmbeddingComposite(self.sampler.children[0], roof_duality=True)
+
+        # variable 0 has a field stronger than all of its couplers
+        h = {0: 5, 1: .1, 2: -.2, 3: 0}
+        J = {(0, 1): 1, (1, 2): 1, (0, 2): 1, (2, 3): 1}
+        response = sampler.sample_ising(h, J)
+        self.check_spin_response(response, h, J)
+        for sample in response:
+            self.assertEqual(sample[0], -1)
+
     def check_spin_response(self, response, h, J):
         variables = set(h)
         variables.update(set().union(*J))
@@ -105,6 +151,184 @@ class TestEmbeddingCompositeSAPILocalSampler(unittest.TestCase):
         for __ in range(10):
             responses.append(sampler.sample_ising(h, J, embedding_tag='K10'))
 
+    def test_structure_cache(self):
+        sampler = sapi.EmbeddingComposite(self.sampler.children[0], embedding_cache_size=1)
+
+        J = {(0, 1): 1, (1, 2): 1, (0, 2): 1}
+        sampler.sample_ising({}, J)
+        self.assertEqual((sampler.cached_embeddings.hits, sampler.cached_embeddings.misses), (0, 1))
+
+        # different biases, same structure
+        response = sampler.sample_ising({0: -1}, {(1, 0): -1, (1, 2): .5, (0, 2): 1})
+        self.check_spin_response(response, {0: -1}, {(1, 0): -1, (1, 2): .5, (0, 2): 1})
+        self.assertEqual((sampler.cached_embeddings.hits, sampler.cached_embeddings.misses), (1, 1))
+
+        # a new structure evicts the old one
+        sampler.sample_ising({}, {(0, 1): 1, (1, 2): 1})
+        self.assertEqual(len(sampler.cached_embeddings), 1)
+        sampler.sample_ising({}, J)
+        self.assertEqual((sampler.cached_embeddings.hits, sampler.cached_embeddings.misses), (1, 3))
+
+    def test_embedding_tries(self):
+        sampler = sapi.EmbeddingComposite(self.sampler.children[0], embedding_tries=3, embedding_timeout=60)
+
+        h = {v: .01 * v for v in range(6)}
+        J = {(u, v): 1 for u, v in itertools.combinations(h, 2)}
+        response = sampler.sample_ising(h, J)
+        self.check_spin_response(response, h, J)
+
+    def test_embedding_store(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            store = sapi.SQLiteEmbeddingStore(os.path.join(tmpdir, 'embeddings.db'))
+
+            child = self.sampler.children[0]
+            h = {v: .01 * v for v in range(6)}
+            J = {(u, v): 1 for u, v in itertools.combinations(h, 2)}
+
+            sampler = sapi.EmbeddingComposite(child, embedding_store=store)
+            sampler.sample_ising(h, J)
+            embeddings, = sampler.cached_embeddings._embeddings.values()
+
+            # a new composite, as in a new process, picks up the stored embedding
+            sampler = sapi.EmbeddingComposite(child, embedding_store=store)
+            response = sampler.sample_ising(h, J)
+            self.check_spin_response(response, h, J)
+            self.assertEqual(list(sampler.cached_embeddings._embeddings.values()), [embeddings])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_compact(self):
+        sampler = self.sampler
+
+        h = {'a': -1}
+        J = {('a', 'b'): 1, ('b', 'c'): 1, ('a', 'c'): 1}
+        response = sampler.sample_ising(h, J, compact=True)
+        self.assertIsInstance(response, sapi.ArraySpinResponse)
+        self.assertEqual(response.variables, ['a', 'b', 'c'])
+        self.check_spin_response(response, h, J)
+
+        Q = {(0, 1): 1, (1, 2): 1, (0, 2): 1, (5, 5): 1}
+        response = sampler.sample_qubo(Q, compact=True)
+        self.assertIsInstance(response, sapi.ArrayBinaryResponse)
+        self.check_binary_response(response, Q)
+
+    def test_chain_break_method(self):
+        sampler = self.sampler
+
+        h = {'a': -1}
+        J = {('a', 'b'): 1, ('b', 'c'): 1, ('a', 'c'): 1}
+        for method in sapi.CHAIN_BREAK_METHODS:
+            response = sampler.sample_ising(h, J, chain_break_method=method)
+            self.check_spin_response(response, h, J)
+            for __, data in response.samples(data=True):
+                self.assertIn('chain_break_fraction', data)
+                if method == 'discard':
+                    self.assertEqual(data['chain_break_fraction'], 0)
+
+        with self.assertRaises(ValueError):
+            sampler.sample_ising(h, J, chain_break_method='vote')
+
+    def test_aggregate(self):
+        sampler = self.sampler
+
+        h = {'a': -1}
+        J = {('a', 'b'): 1, ('b', 'c'): 1, ('a', 'c'): 1}
+        response = sampler.sample_ising(h, J, num_reads=100, aggregate=True, compact=True)
+        self.check_spin_response(response, h, J)
+        self.assertEqual(len(response), len({tuple(row) for row in response.samples_array().tolist()}))
+        self.assertEqual(response.data_vectors['num_occurrences'].sum(), 100)
+
+        response = sampler.sample_ising_async(h, J, num_reads=100, aggregate=True).result()
+        self.check_spin_response(response, h, J)
+
+        # d is free, so is only set once the child's reads are merged
+        h = {'a': -1, 'd': 0}
+        response = sampler.sample_ising(h, J, num_reads=100, aggregate=True, compact=True)
+        self.check_spin_response(response, h, J)
+        self.assertEqual(len(response), len({tuple(row) for row in response.samples_array().tolist()}))
+        self.assertEqual(response.data_vectors['num_occurrences'].sum(), 100)
+        self.assertEqual(set(response.samples_array()[:, response.index['d']].tolist()), {-1, 1})
+
+    def test_response_cache(self):
+        child_cache = sapi.ResponseCache()
+        cache = sapi.ResponseCache()
+        sampler = sapi.EmbeddingComposite(sapi.SAPILocalSampler('c4-sw_optimize', response_cache=child_cache),
+                                          response_cache=cache)
+
+        h = {'a': .5}
+        J = {('a', 'b'): 1, ('b', 'c'): 1, ('a', 'c'): 1}
+
+        response0 = sampler.sample_ising(h, J)
+        response1 = sampler.sample_ising(h, J)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(list(response0.samples()), list(response1.samples()))
+        self.check_spin_response(response1, h, J)
+
+        # the child was only called once
+        self.assertEqual(child_cache.misses + child_cache.hits, 1)
+
+        # changing the returned response does not change the cached one
+        response2 = sampler.sample_ising(h, J, compact=True)
+        response2.data['changed'] = True
+        self.assertNotIn('changed', sampler.sample_ising_async(h, J, compact=True).result().data)
+        self.assertEqual(cache.hits, 3)
+
+        sampler.sample_ising(h, J, chain_break_method='discard')
+        self.assertEqual(cache.misses, 2)
+
+    def test_async(self):
+        sampler = self.sampler
+
+        # labels that need to be relabelled
+        h = {'a': -1}
+        J = {('a', 'b'): 1, ('b', 'c'): 1, ('a', 'c'): 1}
+        future = sampler.sample_ising_async(h, J)
+        self.check_spin_response(future.result(), h, J)
+
+        Q = {(0, 1): 1, (1, 2): 1, (0, 2): 1, (5, 5): 1}
+        future = sampler.sample_qubo_async(Q)
+        self.check_binary_response(future.result(), Q)
+
+    def test_compiled(self):
+        sampler = self.sampler
+
+        h = {'a': -1, 'd': .5}
+        J = {('a', 'b'): 1, ('b', 'c'): 1, ('a', 'c'): 1}
+        problem = sapi.compile_ising(h, J)
+
+        response = sampler.sample(problem)
+        self.check_spin_response(response, h, J)
+        self.assertEqual(next(iter(response))['d'], -1)
+
+        # the reduction is reused
+        reduced = problem._derived[('reduced', False)]
+        response = sampler.sample_async(problem, compact=True).result()
+        self.assertIsInstance(response, sapi.ArraySpinResponse)
+        self.assertIs(problem._derived[('reduced', False)], reduced)
+        self.assertEqual(sampler.cached_embeddings.hits, 1)
+
+        Q = {(0, 1): 1, (1, 2): 1, (0, 2): 1, (5, 5): 1}
+        problem = sapi.compile_qubo(Q)
+        self.check_binary_response(sampler.sample(problem), Q)
+        self.check_binary_response(sampler.sample_async(problem).result(), Q)
+
+    def test_many(self):
+        sampler = self.sampler
+
+        J = {(0, 1): 1, (1, 2): 1, (0, 2): 1}
+        problems = [({0: .1 * b}, J) for b in range(-5, 5)]
+
+        responses = list(sampler.sample_ising_many(problems, max_in_flight=4, embedding_tag='K3'))
+        self.assertEqual(len(responses), len(problems))
+        for response, (h, J) in zip(responses, problems):
+            self.check_spin_response(response, h, J)
+
+        Qs = [{(0, 1): b, (1, 2): 1, (0, 2): 1} for b in range(-5, 5)]
+        responses = list(sampler.sample_qubo_many(Qs, ordered=False))
+        for response in responses:
+            self.check_binary_response(response, Qs[response.data['problem_index']])
+
 
 
 
@@ -0,0 +1,136 @@
+"""
+Tests for HedgedSampler over SAPILocalSampler() backends.
+"""
+
+import time
+import unittest
+
+import dimod
+
+import dwave_sapi_dimod as sapi
+from dwave_sapi_dimod.futures import SAPIFuture
+
+
+class _SlowProblem(object):
+    """Submitted problem that is not done until `delay` seconds have passed."""
+    def __init__(self, future, delay):
+        self.future = future
+        self.ready_at = time.time() + delay
+        self.cancelled = False
+
+    def done(self):
+        return time.time() >= self.ready_at and self.future.done()
+
+    def cancel(self):
+        self.cancelled = True
+        self.future.cancel()
+
+    def result(self):
+        time.sleep(max(self.ready_at - time.time(), 0))
+        return self.future.result()
+
+
+class _SlowSampler(dimod.TemplateSampler):
+    """Backend whose answers take at least `delay` seconds."""
+    def __init__(self, sampler, delay):
+        dimod.TemplateSampler.__init__(self)
+        self.sampler = sampler
+        self.delay = delay
+        self.problems = []
+
+    def sample_ising_async(self, h, J, **kwargs):
+        problem = _SlowProblem(self.sampler.sample_ising_async(h, J, **kwargs), self.delay)
+        self.problems.append(problem)
+        return SAPIFuture(problem, lambda response: response)
+
+    def sample_qubo_async(self, Q, **kwargs):
+        problem = _SlowProblem(self.sampler.sample_qubo_async(Q, **kwargs), self.delay)
+        self.problems.append(problem)
+        return SAPIFuture(problem, lambda response: response)
+
+
+class TestHedgedSampler(unittest.TestCase):
+    def setUp(self):
+        self.local = sapi.EmbeddingComposite(sapi.SAPILocalSampler('c4-sw_optimize'))
+
+        self.h = {'a': 1}
+        self.J = {('a', 'b'): -1, ('b', 'c'): 1, ('a', 'c'): 1}
+
+    def check_spin_response(self, response, h, J):
+        variables = set(h).union(*J)
+        for sample, energy in response.items():
+            self.assertEqual(set(sample), variables)
+            self.assertAlmostEqual(dimod.ising_energy(h, J, sample), energy)
+
+    def test_fast_primary(self):
+        backup = _SlowSampler(self.local, 0.)
+        sampler = sapi.HedgedSampler([self.local, backup], hedge_delay=10.)
+
+        response = sampler.sample_ising(self.h, self.J)
+        self.check_spin_response(response, self.h, self.J)
+        self.assertEqual(response.data['backend'], 0)
+        self.assertEqual(backup.problems, [])
+        self.assertEqual(len(sampler.latencies[0]), 1)
+
+    def test_slow_primary(self):
+        primary = _SlowSampler(self.local, 10.)
+        sampler = sapi.HedgedSampler([primary, self.local], hedge_delay=.05)
+
+        start = time.time()
+        response = sampler.sample_ising(self.h, self.J)
+        self.assertLess(time.time() - start, 5.)
+
+        self.check_spin_response(response, self.h, self.J)
+        self.assertEqual(response.data['backend'], 1)
+
+        # the primary's problem was cancelled
+        self.assertTrue(primary.problems[0].cancelled)
+
+    def test_qubo(self):
+        primary = _SlowSampler(self.local, 10.)
+        sampler = sapi.HedgedSampler([primary, self.local], hedge_delay=0.)
+
+        Q = {('a', 'a'): 1, ('a', 'b'): -2}
+        response = sampler.sample_qubo(Q)
+        self.assertEqual(response.data['backend'], 1)
+        for sample, energy in response.items():
+            self.assertAlmostEqual(dimod.qubo_energy(Q, sample), energy)
+
+    def test_percentile(self):
+        sampler = sapi.HedgedSampler([self.local], hedge_delay=1., hedge_percentile=50)
+        self.assertEqual(sampler.current_hedge_delay(), 1.)
+
+        sampler.latencies[0].extend(range(11))
+        self.assertEqual(sampler.current_hedge_delay(), 5.)
+
+    def test_percentile_slow_primary(self):
+        # the primary never answers first, its latencies are still recorded so the
+        # delay does not fall below what it has been waited on
+        primary = _SlowSampler(self.local, 10.)
+        sampler = sapi.HedgedSampler([primary, self.local], hedge_delay=.02, hedge_percentile=50)
+
+        delays = []
+        for __ in range(15):
+            delays.append(sampler.current_hedge_delay())
+            response = sampler.sample_ising(self.h, self.J)
+            self.assertEqual(response.data['backend'], 1)
+
+        self.assertEqual(len(sampler.latencies[0]), 15)
+        delays.append(sampler.current_hedge_delay())
+        for delay in delays:
+            self.assertGreaterEqual(delay, .02)
+
+    def test_no_backup(self):
+        # with nothing to hedge to, the primary's answer is waited for
+        primary = _SlowSampler(self.local, .1)
+        sampler = sapi.HedgedSampler([primary], hedge_delay=0.)
+        response = sampler.sample_ising(self.h, self.J)
+        self.assertEqual(response.data['backend'], 0)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            sapi.HedgedSampler([], hedge_delay=1.)
+        with self.assertRaises(ValueError):
+            sapi.HedgedSampler([self.local])
+        with self.assertRaises(ValueError):
+            sapi.HedgedSampler([self.local], hedge_percentile=101)
@@ -0,0 +1,72 @@
+"""
+Tests for the lazy loading of the package.
+"""
+
+import importlib
+import os
+import subprocess
+import sys
+import textwrap
+import unittest
+
+import dwave_sapi_dimod as sapi
+
+
+class TestExports(unittest.TestCase):
+    def test_exports_match_submodules(self):
+        for module, names in sapi._EXPORTS.items():
+            submodule = importlib.import_module('dwave_sapi_dimod.' + module)
+            self.assertEqual(sorted(names), sorted(submodule.__all__))
+
+    def test_attributes(self):
+        for name in sapi.__all__:
+            self.assertTrue(hasattr(sapi, name))
+        self.assertIs(sapi.samplers.SAPILocalSampler, sapi.SAPILocalSampler)
+
+        with self.assertRaises(AttributeError):
+            sapi.NotAName
+
+    def check_lazy(self, setup=''):
+        # creating samplers and composites does not load dwave_sapi2, using them does
+        code = setup + textwrap.dedent("""
+            import sys
+            import dwave_sapi_dimod as sapi
+
+            def loaded():
+                return any(name.startswith('dwave_sapi2') for name in sys.modules)
+
+            print(loaded(), 'dwave_sapi_dimod.samplers' in sys.modules)
+
+            local = sapi.SAPILocalSampler('c4-sw_optimize')
+            remote = sapi.SAPISampler('c4-sw_optimize', 'https://sapi.example.com', 'token')
+            composite = sapi.EmbeddingComposite(local, response_cache=sapi.ResponseCache())
+            sapi.SpinReversalComposite(local)
+            sapi.HedgedSampler([composite, remote], hedge_delay=1.)
+            sapi.HardwareGraph({0, 4}, {(0, 4)})
+            sapi.compile_ising({0: 1}, {(0, 4): -1})
+            print(loaded())
+
+            local.sample_ising({0: 1}, {})
+            print(loaded())
+            """)
+        output = subprocess.check_output([sys.executable, '-c', code], env=os.environ.copy())
+        self.assertEqual(output.decode().split(), ['False', 'False', 'False', 'True'])
+
+    def test_lazy(self):
+        self.check_lazy()
+
+    def test_lazy_without_module_getattr(self):
+        # before python 3.7 the package is replaced by a module object that loads
+        # the names, as on python 2
+        self.check_lazy(textwrap.dedent("""
+            import sys
+            version_info = sys.version_info
+            sys.version_info = (3, 6, 0, 'final', 0)
+            import dwave_sapi_dimod
+            sys.version_info = version_info
+            assert type(sys.modules['dwave_sapi_dimod']).__name__ == '_LazyModule'
+            from dwave_sapi_dimod import structure_fingerprint
+            import dwave_sapi_dimod.pool
+            assert dwave_sapi_dimod.pool.ConnectionPool is dwave_sapi_dimod.ConnectionPool
+            assert 'SAPISampler' in dir(dwave_sapi_dimod)
+            """))
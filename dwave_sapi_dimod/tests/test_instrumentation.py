@@ -0,0 +1,67 @@
+"""
+Tests for the instrumentation of the samplers and composites.
+"""
+
+import unittest
+
+import dwave_sapi_dimod as sapi
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.child = sapi.SAPILocalSampler('c4-sw_optimize')
+        self.events = []
+        self.sink = lambda name, metrics: self.events.append((name, metrics))
+        sapi.add_metrics_sink(self.sink)
+
+    def tearDown(self):
+        sapi.remove_metrics_sink(self.sink)
+        sapi.disable_metrics()
+
+    def test_sampler(self):
+        response = self.child.sample_ising({0: 1}, {(0, 4): -1})
+
+        (name, metrics), = self.events
+        self.assertEqual(name, 'SAPILocalSampler.sample_ising')
+        self.assertEqual(set(metrics['stages']), {'format', 'solve', 'parse'})
+        self.assertEqual(metrics['counts']['num_qubits'], 2)
+        self.assertEqual(response.data['metrics'], metrics)
+        self.assertIn('solver_timing', metrics)
+
+    def test_embedding_composite(self):
+        sampler = sapi.EmbeddingComposite(self.child)
+        J = {('a', 'b'): 1, ('b', 'c'): 1, ('a', 'c'): 1}
+
+        response = sampler.sample_ising({}, J)
+        name, metrics = self.events[-1]
+        self.assertEqual(name, 'EmbeddingComposite.sample_ising')
+        self.assertTrue({'reduce', 'find_embedding', 'embed_problem', 'sample', 'unembed',
+                         'response'}.issubset(metrics['stages']))
+        self.assertEqual(metrics['counts']['embedding_cache_misses'], 1)
+        self.assertEqual(metrics['counts']['num_variables'], 3)
+        self.assertGreaterEqual(metrics['counts']['num_qubits'], 3)
+        self.assertEqual(response.data['metrics'], metrics)
+        self.assertIn('timing', response.data)
+
+        # the child's call is reported separately
+        self.assertEqual(self.events[-2][0], 'SAPILocalSampler.sample_ising')
+
+        sampler.sample_ising_async({}, J).result()
+        name, metrics = self.events[-1]
+        self.assertEqual(name, 'EmbeddingComposite.sample_ising_async')
+        self.assertEqual(metrics['counts']['embedding_cache_hits'], 1)
+        self.assertNotIn('find_embedding', metrics['stages'])
+
+    def test_disabled(self):
+        sapi.remove_metrics_sink(self.sink)
+        response = self.child.sample_ising({0: 1}, {(0, 4): -1})
+        self.assertNotIn('metrics', response.data)
+        self.assertIn('timing', response.data)
+
+        # enabled without a sink
+        sapi.enable_metrics()
+        response = self.child.sample_ising({0: 1}, {(0, 4): -1})
+        self.assertIn('metrics', response.data)
+
+        sapi.add_metrics_sink(self.sink)
+        self.assertEqual(self.events, [])
@@ -0,0 +1,123 @@
+"""
+Tests for LoadBalancingSampler over SAPILocalSampler() and
+EmbeddingComposite(SAPILocalSampler()) backends.
+"""
+
+import unittest
+
+import dimod
+import numpy as np
+
+import dwave_sapi_dimod as sapi
+
+
+class TestLoadBalancingSampler(unittest.TestCase):
+    def setUp(self):
+        self.local = sapi.SAPILocalSampler('c4-sw_optimize')
+        self.embedded = sapi.EmbeddingComposite(sapi.SAPILocalSampler('c4-sw_optimize'))
+
+    def check_spin_response(self, response, h, J):
+        variables = set(h).union(*J)
+        for sample, energy in response.items():
+            self.assertEqual(set(sample), variables)
+            self.assertAlmostEqual(dimod.ising_energy(h, J, sample), energy)
+
+    def test_least_outstanding(self):
+        sampler = sapi.LoadBalancingSampler([self.embedded, self.embedded])
+
+        h = {'a': 1}
+        J = {('a', 'b'): -1, ('b', 'c'): 1, ('a', 'c'): 1}
+
+        futures = [sampler.sample_ising_async(h, J) for __ in range(2)]
+        responses = [future.result() for future in futures]
+        for response in responses:
+            self.check_spin_response(response, h, J)
+
+        for backend in sampler.backends:
+            self.assertEqual(backend.outstanding, 0)
+            self.assertEqual(backend.submitted, backend.completed)
+        self.assertEqual(sum(backend.completed for backend in sampler.backends), 2)
+
+        for backend in sampler.backends:
+            if backend.completed:
+                self.assertIsNotNone(backend.mean_latency)
+
+    def test_fits_structure(self):
+        sampler = sapi.LoadBalancingSampler([self.embedded, self.local], policy=sapi.fits_structure)
+
+        # fits the local solver's structure
+        h = {0: 1, 4: -.5}
+        J = {(0, 4): -1}
+        response = sampler.sample_ising(h, J)
+        self.check_spin_response(response, h, J)
+        self.assertEqual(response.data['backend'], 1)
+
+        # needs to be embedded
+        h = {'a': 1}
+        J = {('a', 'b'): -1, ('b', 'c'): 1, ('a', 'c'): 1}
+        response = sampler.sample_ising(h, J)
+        self.check_spin_response(response, h, J)
+        self.assertEqual(response.data['backend'], 0)
+
+        # any integer type labels a qubit
+        h = {np.int64(0): 1}
+        J = {(np.int64(0), 4): -1, (4, 5): 0.}
+        response = sampler.sample_ising(h, J)
+        self.check_spin_response(response, h, J)
+        self.assertEqual(response.data['backend'], 1)
+
+        Q = {(0, 0): 1, (0, 4): -1, (5, 5): 0.}
+        response = sampler.sample_qubo(Q)
+        self.assertEqual(response.data['backend'], 1)
+
+    def test_fits(self):
+        # a structure without qubit 5
+        sampler = dimod.TemplateSampler()
+        sampler.hardware_graph = sapi.HardwareGraph({0, 4, 6}, {(0, 4), (4, 6)})
+        backend = sapi.Backend(sampler)
+
+        # variables that are not sent need not be qubits
+        self.assertTrue(backend.fits({0: 1, 4: 0., 5: 0.}, [(0, 4)]))
+        self.assertTrue(backend.fits({np.int64(0): 1, 5: 0.}, []))
+        self.assertFalse(backend.fits({0: 1, 5: 1}, []))
+        self.assertFalse(backend.fits({0: 0., 5: 0.}, [(0, 5)]))
+        self.assertFalse(backend.fits([0, 5], []))
+
+        # but they must be index-labelled and in range
+        self.assertFalse(backend.fits({'a': 0.}, []))
+        self.assertFalse(backend.fits({0: 1, 9: 0.}, []))
+
+        # backends that embed accept anything
+        self.assertTrue(sapi.Backend(dimod.TemplateSampler()).fits({'a': 1}, [('a', 'b')]))
+
+    def test_fits_structure_no_backend(self):
+        sampler = sapi.LoadBalancingSampler([self.local], policy=sapi.fits_structure)
+        with self.assertRaises(ValueError):
+            sampler.sample_ising({}, {('a', 'b'): 1})
+
+    def test_lowest_latency(self):
+        sampler = sapi.LoadBalancingSampler([self.local, self.local], policy=sapi.lowest_latency)
+        sampler.backends[0].latencies.append(10.)
+
+        # the backend without observed latencies is tried first
+        response = sampler.sample_qubo({(0, 0): 1, (0, 4): -2})
+        self.assertEqual(response.data['backend'], 1)
+
+        sampler.backends[1].latencies.append(20.)
+        response = sampler.sample_qubo({(0, 0): 1, (0, 4): -2})
+        self.assertEqual(response.data['backend'], 0)
+
+    def test_many(self):
+        sampler = sapi.LoadBalancingSampler([self.embedded, self.embedded, self.embedded])
+
+        problems = [({v: .1 * idx for v in 'abc'}, {('a', 'b'): -1, ('b', 'c'): -1}) for idx in range(9)]
+        responses = list(sampler.sample_ising_many(problems, max_in_flight=6))
+        self.assertEqual([response.data['problem_index'] for response in responses], list(range(9)))
+        for (h, J), response in zip(problems, responses):
+            self.check_spin_response(response, h, J)
+
+        self.assertEqual(sum(backend.completed for backend in sampler.backends), 9)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            sapi.LoadBalancingSampler([])
@@ -0,0 +1,72 @@
+"""
+Tests for PackingComposite(SAPILocalSampler()).
+"""
+
+import itertools
+import unittest
+
+import dimod
+
+import dwave_sapi_dimod as sapi
+
+
+class TestPackingComposite(unittest.TestCase):
+    def setUp(self):
+        self.sampler = sapi.PackingComposite(sapi.SAPILocalSampler('c4-sw_optimize'))
+
+    def check_spin_response(self, response, h, J):
+        variables = set(h).union(*J)
+        for sample, energy in response.items():
+            self.assertEqual(set(sample), variables)
+            self.assertAlmostEqual(dimod.ising_energy(h, J, sample), energy)
+
+    def test_packed(self):
+        J = {(0, 1): 1, (1, 2): 1, (0, 2): 1}
+        problems = [({0: b}, J) for b in (-1, -.5, .5, 1)]
+
+        responses = self.sampler.sample_ising_packed(problems)
+        self.assertEqual(len(responses), len(problems))
+        for (h, J), response in zip(problems, responses):
+            self.check_spin_response(response, h, J)
+            self.assertEqual(response.data['num_packed'], len(problems))
+
+        # the biases of each problem only affect its own samples
+        self.assertEqual(next(iter(responses[0]))[0], 1)
+        self.assertEqual(next(iter(responses[-1]))[0], -1)
+
+    def test_overflow(self):
+        # forty K6s do not fit on a single C4
+        h = {v: .1 * v for v in range(6)}
+        J = {(u, v): 1 for u, v in itertools.combinations(h, 2)}
+        problems = [(h, J)] * 40
+
+        responses = self.sampler.sample_ising_packed(problems)
+        self.assertEqual(len(responses), 40)
+        for response in responses:
+            self.check_spin_response(response, h, J)
+        self.assertLess(responses[0].data['num_packed'], 40)
+
+        # the layouts are reused
+        responses = self.sampler.sample_ising_packed(problems)
+        for response in responses:
+            self.check_spin_response(response, h, J)
+
+    def test_mixed(self):
+        problems = [({'a': 1}, {('a', 'b'): -1}),
+                    ({0: -1, 1: 1}, {}),
+                    ([.5, 0, 0], {(0, 1): 1, (1, 2): -1, (0, 2): 1})]
+        responses = self.sampler.sample_ising_packed(problems, compact=True)
+
+        self.assertEqual(next(iter(responses[0])), {'a': -1, 'b': -1})
+        self.assertEqual(list(responses[1]), [{0: 1, 1: -1}])
+        self.check_spin_response(responses[2], {0: .5}, {(0, 1): 1, (1, 2): -1, (0, 2): 1})
+
+    def test_qubo(self):
+        Qs = [{(0, 0): 1, (0, 1): -1.2, (1, 1): .1}, {(0, 0): -1, (0, 1): 2, (1, 1): -1}]
+        responses = self.sampler.sample_qubo_packed(Qs)
+        for Q, response in zip(Qs, responses):
+            for sample, energy in response.items():
+                self.assertAlmostEqual(dimod.qubo_energy(Q, sample), energy)
+
+        response = self.sampler.sample_qubo(Qs[0])
+        self.assertEqual(next(iter(response)), {0: 1, 1: 1})
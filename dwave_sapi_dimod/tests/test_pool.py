@@ -0,0 +1,66 @@
+"""
+Tests for the ConnectionPool.
+"""
+
+import unittest
+import time
+
+import dwave_sapi_dimod as sapi
+
+
+class _Connection(object):
+    # counts the connections made and solvers requested
+    created = 0
+
+    def __init__(self, url, token, proxy_url=None):
+        _Connection.created += 1
+        self.key = (url, token, proxy_url)
+        self.solvers_requested = 0
+
+    def get_solver(self, solver_name):
+        self.solvers_requested += 1
+        return (self.key, solver_name)
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        _Connection.created = 0
+
+    def test_reuse(self):
+        pool = sapi.ConnectionPool(connection_factory=_Connection)
+
+        connection, solver = pool.get_solver('solver', 'url', 'token')
+        self.assertEqual(pool.get_solver('solver', 'url', 'token'), (connection, solver))
+        self.assertIs(pool.get_connection('url', 'token'), connection)
+        self.assertEqual((_Connection.created, connection.solvers_requested), (1, 1))
+
+        # a different token or proxy gets its own connection
+        self.assertIsNot(pool.get_connection('url', 'other'), connection)
+        self.assertIsNot(pool.get_connection('url', 'token', 'proxy'), connection)
+        self.assertEqual(_Connection.created, 3)
+        self.assertEqual(len(pool), 3)
+
+    def test_max_size(self):
+        pool = sapi.ConnectionPool(max_size=2, connection_factory=_Connection)
+
+        a = pool.get_connection('url', 'a')
+        pool.get_connection('url', 'b')
+        pool.get_connection('url', 'a')  # b is now the least recently used
+        pool.get_connection('url', 'c')
+
+        self.assertEqual(len(pool), 2)
+        self.assertIs(pool.get_connection('url', 'a'), a)
+        self.assertEqual(_Connection.created, 3)
+
+        pool.get_connection('url', 'b')
+        self.assertEqual(_Connection.created, 4)
+
+    def test_idle_timeout(self):
+        pool = sapi.ConnectionPool(idle_timeout=.01, connection_factory=_Connection)
+
+        a = pool.get_connection('url', 'a')
+        time.sleep(.05)
+        self.assertIsNot(pool.get_connection('url', 'a'), a)
+
+        pool.clear()
+        self.assertEqual(len(pool), 0)
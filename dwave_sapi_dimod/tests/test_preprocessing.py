@@ -0,0 +1,67 @@
+"""
+Tests for the problem-reduction preprocessing.
+"""
+
+import itertools
+import unittest
+
+import dimod
+import numpy as np
+
+import dwave_sapi_dimod as sapi
+
+
+class TestReduceIsing(unittest.TestCase):
+    def test_zero_biases_and_isolated(self):
+        h = {'a': 1, 'b': 0, 'c': -2, 'd': 0}
+        J = {('a', 'b'): -1, ('b', 'c'): 0}
+        h_reduced, J_reduced, variables, fixed = sapi.reduce_ising(h, J)
+
+        self.assertEqual(variables, ['a', 'b'])
+        self.assertEqual(h_reduced, {0: 1, 1: 0})
+        self.assertEqual(J_reduced, {(0, 1): -1})
+        self.assertEqual(fixed, {'c': 1, 'd': 0})
+
+    def test_variables_only_in_J(self):
+        h_reduced, J_reduced, variables, fixed = sapi.reduce_ising({}, {(0, 1): 1, (1, 2): 0})
+        self.assertEqual(sorted(variables), [0, 1])
+        self.assertEqual(fixed, {2: 0})
+
+    def test_roof_duality(self):
+        # variable 0 has a field stronger than all of its couplers
+        h = {0: 5, 1: 0, 2: 0}
+        J = {(0, 1): 1, (1, 2): 1, (0, 2): 1}
+        h_reduced, J_reduced, variables, fixed = sapi.reduce_ising(h, J, roof_duality=True)
+
+        self.assertEqual(fixed[0], -1)
+        self.assertNotIn(0, variables)
+
+        # the residual problem has the same energies as the original once the fixed
+        # variables are substituted in
+        for spins in itertools.product((-1, 1), repeat=len(variables)):
+            sample = dict(fixed)
+            sample.update(zip(variables, spins))
+            reduced_sample = dict(enumerate(spins))
+
+            offset = dimod.ising_energy(h, J, sample) - dimod.ising_energy(h_reduced, J_reduced, reduced_sample)
+            if spins == (-1,) * len(variables):
+                expected = offset
+            self.assertAlmostEqual(offset, expected)
+
+
+class TestRestoreSamples(unittest.TestCase):
+    def test_restore(self):
+        index = {'a': 0, 'b': 1, 'c': 2}
+        restored = sapi.restore_samples([[1, -1], [-1, -1]], ['c', 'a'], {'b': 1}, index)
+        self.assertEqual(restored.dtype, np.int8)
+        self.assertEqual(restored.tolist(), [[-1, 1, 1], [-1, 1, -1]])
+
+    def test_free(self):
+        # free variables are random in each sample
+        restored = sapi.restore_samples(np.empty((100, 0)), [], {0: -1, 1: 0}, {0: 0, 1: 1})
+        self.assertEqual(restored[:, 0].tolist(), [-1] * 100)
+        self.assertEqual(set(restored[:, 1].tolist()), {-1, 1})
+
+    def test_all_fixed(self):
+        restored = sapi.restore_samples(np.empty((1, 0)), [], {0: -1, 1: 1}, {0: 0, 1: 1})
+        self.assertEqual(restored.tolist(), [[-1, 1]])
@@ -0,0 +1,82 @@
+"""
+Tests for the compiled problems.
+"""
+
+import unittest
+
+import dwave_sapi_dimod as sapi
+
+
+class TestCompileIsing(unittest.TestCase):
+    def test_labels(self):
+        problem = sapi.compile_ising({'a': 1}, {('c', 'b'): -1, ('a', 'b'): .5, ('b', 'c'): -1})
+
+        self.assertEqual(problem.variables, ('a', 'b', 'c'))
+        self.assertEqual(problem.label_index, {'a': 0, 'b': 1, 'c': 2})
+        self.assertEqual(problem.vartype, sapi.SPIN)
+        self.assertFalse(problem.index_labelled)
+        self.assertEqual(len(problem), 3)
+
+        self.assertEqual(problem.linear.tolist(), [1, 0, 0])
+        # both orientations of (b, c) are merged
+        self.assertEqual(list(zip(problem.row.tolist(), problem.col.tolist(), problem.quadratic.tolist())),
+                         [(0, 1, .5), (1, 2, -2)])
+
+        h, J, offset = problem.as_ising()
+        self.assertEqual(h, {'a': 1, 'b': 0, 'c': 0})
+        self.assertEqual(J, {('a', 'b'): .5, ('b', 'c'): -2})
+        self.assertEqual(offset, 0)
+
+    def test_index_labelled(self):
+        problem = sapi.compile_ising([1, 0, -1], {(0, 1): 0., (1, 2): 1})
+        self.assertTrue(problem.index_labelled)
+
+        # zero interactions are dropped, the variables are kept
+        h, J, __ = problem.index_ising()
+        self.assertEqual(h, {0: 1, 1: 0, 2: -1})
+        self.assertEqual(J, {(1, 2): 1})
+        self.assertIs(problem.index_ising(), problem.index_ising())
+
+    def test_immutable(self):
+        problem = sapi.compile_ising({0: 1}, {(0, 1): 1})
+
+        with self.assertRaises(AttributeError):
+            problem.variables = (1, 0)
+        with self.assertRaises(ValueError):
+            problem.linear[0] = 2
+
+    def test_bad_input(self):
+        with self.assertRaises(TypeError):
+            sapi.compile_ising(5, {})
+        with self.assertRaises(TypeError):
+            sapi.compile_ising({}, [])
+        with self.assertRaises(ValueError):
+            sapi.CompiledProblem([0, 1], [0, 0], [0], [0], [1], sapi.SPIN)
+        with self.assertRaises(ValueError):
+            sapi.CompiledProblem([0, 1], [0, 0], [], [], [], 'BOOL')
+
+
+class TestCompileQubo(unittest.TestCase):
+    def test_qubo(self):
+        Q = {(0, 0): 1, (0, 4): -1.2, (4, 4): .1, (4, 0): .2}
+        problem = sapi.compile_qubo(Q)
+
+        self.assertEqual(problem.vartype, sapi.BINARY)
+        self.assertEqual(problem.variables, (0, 4))
+        self.assertEqual(problem.linear.tolist(), [1, .1])
+
+        Q_out, offset = problem.as_qubo()
+        self.assertEqual(Q_out, {(0, 0): 1, (4, 4): .1, (0, 4): -1.})
+        self.assertEqual(offset, 0)
+
+        # the Ising form has the same energies, shifted by the offset
+        h, J, offset = problem.index_ising()
+        for x0 in (0, 1):
+            for x1 in (0, 1):
+                s0, s1 = 2 * x0 - 1, 2 * x1 - 1
+                self.assertAlmostEqual(x0 + .1 * x1 - x0 * x1,
+                                       h[0] * s0 + h[1] * s1 + J[(0, 1)] * s0 * s1 + offset)
+
+    def test_bad_input(self):
+        with self.assertRaises(TypeError):
+            sapi.compile_qubo([])
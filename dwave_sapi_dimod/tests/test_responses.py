@@ -0,0 +1,111 @@
+"""
+Tests for the array-backed responses.
+"""
+
+import unittest
+
+import numpy as np
+
+import dimod
+
+import dwave_sapi_dimod as sapi
+
+
+class TestArraySpinResponse(unittest.TestCase):
+    def test_add_samples_from_array(self):
+        h = {'a': 1, 'b': -1}
+        J = {('a', 'b'): -1}
+
+        response = sapi.ArraySpinResponse(['a', 'b'])
+        samples = np.asarray([[1, 1], [-1, -1], [1, -1]], dtype=np.int8)
+        response.add_samples_from_array(samples, data_vectors={'num_occurrences': [1, 2, 3]}, h=h, J=J)
+
+        self.assertEqual(len(response), 3)
+        self.assertEqual(list(response.energies()), [-1., -1., 3.])
+        self.assertEqual(list(response.samples()), [{'a': 1, 'b': 1}, {'a': -1, 'b': -1}, {'a': 1, 'b': -1}])
+        self.assertEqual([data['num_occurrences'] for __, data in response.samples(data=True)], [1, 2, 3])
+
+        for sample, energy in response.items():
+            self.assertEqual(dimod.ising_energy(h, J, sample), energy)
+
+    def test_add_samples_from(self):
+        response = sapi.ArraySpinResponse()
+        response.add_samples_from([{0: 1, 1: -1}, {0: -1, 1: -1}], [0., -1.])
+        response.add_sample({0: 1, 1: 1}, -2.)
+
+        self.assertEqual(response.variables, [0, 1])
+        self.assertEqual(list(response.energies()), [-2., -1., 0.])
+        np.testing.assert_array_equal(response.samples_array(), [[1, 1], [-1, -1], [1, -1]])
+
+    def test_relabel_samples(self):
+        response = sapi.ArraySpinResponse([0, 1])
+        response.add_samples_from_array([[1, -1]], [0.])
+
+        relabelled = response.relabel_samples({0: 'a', 1: 'b'})
+        self.assertEqual(list(relabelled), [{'a': 1, 'b': -1}])
+        self.assertIs(relabelled.samples_array(), response.samples_array())
+
+        with self.assertRaises(ValueError):
+            response.relabel_samples({0: 1})
+
+    def test_as_binary(self):
+        response = sapi.ArraySpinResponse([0, 1])
+        response.add_samples_from_array([[1, -1], [-1, -1]], [0., 1.], {'num_occurrences': [4, 5]})
+
+        binary = response.as_binary(offset=2.)
+        self.assertIsInstance(binary, sapi.ArrayBinaryResponse)
+        self.assertEqual(list(binary.items(data=True)),
+                         [({0: 1, 1: 0}, 2., {'num_occurrences': 4}),
+                          ({0: 0, 1: 0}, 3., {'num_occurrences': 5})])
+
+        spin = binary.as_spin(offset=-2.)
+        self.assertEqual(list(spin.items()), list(response.items()))
+
+    def test_aggregate(self):
+        # more than eight variables so the packed rows span several bytes
+        rows = [[1] * 10, [-1] * 10, [1] * 9 + [-1], [1] * 10, [-1] * 10]
+        response = sapi.ArraySpinResponse(range(10))
+        data_vectors = {'num_occurrences': [1, 2, 3, 4, 5], 'chain_break_fraction': [0, .1, .2, .3, .4]}
+        response.add_samples_from_array(rows, [0., 1., 2., 0., 1.], data_vectors)
+
+        aggregated = response.aggregate()
+        self.assertIsInstance(aggregated, sapi.ArraySpinResponse)
+        self.assertEqual(aggregated.samples_array().tolist(), [[1] * 10, [-1] * 10, [1] * 9 + [-1]])
+        self.assertEqual(aggregated.energies_array().tolist(), [0., 1., 2.])
+        self.assertEqual(aggregated.data_vectors['num_occurrences'].tolist(), [5, 7, 3])
+        self.assertEqual(aggregated.data_vectors['chain_break_fraction'].tolist(), [0, .1, .2])
+
+        # the original is unchanged
+        self.assertEqual(len(response), 5)
+
+    def test_aggregate_without_occurrences(self):
+        response = sapi.ArraySpinResponse(['a'])
+        response.add_samples_from_array([[1], [1], [-1]], [0., 0., 1.])
+        self.assertEqual(list(response.aggregate().items(data=True)),
+                         [({'a': 1}, 0., {'num_occurrences': 2}), ({'a': -1}, 1., {'num_occurrences': 1})])
+
+        self.assertEqual(len(sapi.ArraySpinResponse(['a']).aggregate()), 0)
+
+
+class TestArrayBinaryResponse(unittest.TestCase):
+    def test_energies_from_Q(self):
+        Q = {(0, 0): 1, (0, 1): -2, (1, 1): .5}
+
+        response = sapi.ArrayBinaryResponse([0, 1])
+        response.add_samples_from_array([[0, 0], [1, 0], [0, 1], [1, 1]], Q=Q)
+
+        for sample, energy in response.items():
+            self.assertEqual(dimod.qubo_energy(Q, sample), energy)
+
+    def test_aggregate(self):
+        response = sapi.ArrayBinaryResponse([0, 1])
+        response.add_samples_from_array([[0, 1], [1, 1], [0, 1]], [0., 1., 0.])
+        aggregated = response.aggregate()
+        self.assertIsInstance(aggregated, sapi.ArrayBinaryResponse)
+        self.assertEqual(aggregated.samples_array().tolist(), [[0, 1], [1, 1]])
+        self.assertEqual(aggregated.data_vectors['num_occurrences'].tolist(), [2, 1])
+
+    def test_empty(self):
+        response = sapi.ArrayBinaryResponse([0, 1])
+        self.assertEqual(len(response), 0)
+        self.assertEqual(list(response.items(data=True)), [])
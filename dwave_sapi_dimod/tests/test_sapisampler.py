@@ -10,6 +10,7 @@ import random
 
 import dimod
 
+import dwave_sapi_dimod as sapi
 from dwave_sapi_dimod import SAPISampler, SAPILocalSampler
 
 try:
@@ -21,7 +22,8 @@ except ImportError:
 
 class TestSAPILocalSampler(unittest.TestCase):
     def setUp(self):
-        self.sampler = SAPILocalSampler('c4-sw_optimize')
+        self.sampler_args = ('c4-sw_optimize',)
+        self.sampler = SAPILocalSampler(*self.sampler_args)
 
     def test_small_problem(self):
         # solver is an exact solver so can check results directly
@@ -94,6 +96,200 @@ class TestSAPILocalSampler(unittest.TestCase):
         response = sampler.sample_qubo(Q)
         self.check_binary_response(response, Q)
 
+    def test_inactive_variable(self):
+        sampler = self.sampler
+
+        # variable 0 has no bias so sapi does not use its qubit
+        Q = {(0, 0): 0., (4, 4): 1.}
+        response = sampler.sample_qubo(Q, num_reads=100)
+        self.check_binary_response(response, Q)
+
+        for sample in response:
+            self.assertIn(sample[0], (0, 1))
+            self.assertEqual(sample[4], 0)
+
+        h = [0., 0., 0., 0., 1.]
+        response = sampler.sample_ising(h, {}, num_reads=100)
+        self.check_spin_response(response, dict(enumerate(h)), {})
+
+        for sample in response:
+            self.assertEqual(set(sample), set(range(5)))
+            self.assertIn(sample[0], (-1, 1))
+            self.assertEqual(sample[4], -1)
+
+    def test_compact(self):
+        sampler = self.sampler
+
+        h = {0: 1, 6: -1}
+        J = {(0, 4): -1}
+
+        response = sampler.sample_ising(h, J, num_reads=100, compact=True)
+        self.assertIsInstance(response, sapi.ArraySpinResponse)
+        self.assertEqual(response.variables, [0, 4, 6])
+        self.assertEqual(response.samples_array().shape, (len(response), 3))
+        self.check_spin_response(response, h, J)
+
+        Q = {(0, 0): 1, (0, 4): -1.2, (4, 4): .1}
+        response = sampler.sample_qubo_async(Q, compact=True).result()
+        self.assertIsInstance(response, sapi.ArrayBinaryResponse)
+        self.check_binary_response(response, Q)
+
+    def test_response_cache(self):
+        sampler = self.sampler
+        sampler.response_cache = cache = sapi.ResponseCache()
+
+        h = {0: 1, 6: -1}
+        J = {(0, 4): -1}
+
+        response0 = sampler.sample_ising(h, J, num_reads=10)
+        response1 = sampler.sample_ising(h, J, num_reads=10, compact=True)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(list(response0.samples()), list(response1.samples()))
+        self.check_spin_response(response1, h, J)
+
+        # the asynchronous methods share the cache
+        response2 = sampler.sample_ising_async(h, J, num_reads=10).result()
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(list(response0.samples()), list(response2.samples()))
+
+        # different parameters are a different problem
+        sampler.sample_ising(h, J, num_reads=20)
+        self.assertEqual(cache.misses, 2)
+
+        Q = {(0, 0): 1, (0, 4): -1.2, (4, 4): .1}
+        sampler.sample_qubo_async(Q).result()
+        response = sampler.sample_qubo(Q)
+        self.assertEqual((cache.hits, cache.misses), (3, 3))
+        self.check_binary_response(response, Q)
+
+        # a solver with the same name on another connection does not share answers
+        remote = SAPISampler(sampler.solver_name, 'https://sapi.example.com', 'token', response_cache=cache)
+        self.assertNotEqual(remote._response_cache_key(([1.], {}), {}),
+                            SAPILocalSampler(sampler.solver_name)._response_cache_key(([1.], {}), {}))
+
+    def test_aggregate(self):
+        sampler = self.sampler
+
+        h = {0: 1, 4: -1}
+        J = {(0, 4): -1}
+        response = sampler.sample_ising(h, J, num_reads=100, aggregate=True)
+        self.check_spin_response(response, h, J)
+
+        samples = [tuple(sorted(sample.items())) for sample in response]
+        self.assertEqual(len(samples), len(set(samples)))
+        self.assertEqual(sum(data['num_occurrences'] for __, data in response.samples(data=True)), 100)
+
+        Q = {(0, 0): 1, (0, 4): -1.2, (4, 4): .1}
+        response = sampler.sample_qubo_async(Q, num_reads=100, compact=True, aggregate=True).result()
+        self.check_binary_response(response, Q)
+        self.assertEqual(response.data_vectors['num_occurrences'].sum(), 100)
+
+    def test_stream(self):
+        sampler = self.sampler
+
+        h = {0: 1, 4: -1}
+        J = {(0, 4): -1}
+        totals = []
+        timings = []
+        for response in sampler.sample_ising_stream(h, J, num_reads=100, chunk_size=30, compact=True):
+            self.check_spin_response(response, h, J)
+            totals.append(response.data_vectors['num_occurrences'].sum())
+            timings.append(response.data['timing'])
+        self.assertEqual(totals[-1], 100)
+        self.assertEqual(totals, sorted(totals))
+        self.assertLessEqual(len(totals), 4)
+
+        # the timing of every chunk finished so far is summed
+        timing = sampler.sample_ising(h, J, num_reads=30).data['timing']
+        self.assertEqual(set(timings[-1]), set(timing))
+        for name in timing:
+            self.assertEqual([t[name] for t in timings], sorted(t[name] for t in timings))
+
+        # stopping early
+        Q = {(0, 0): 1, (0, 4): -1.2, (4, 4): .1}
+        for response in sampler.sample_qubo_stream(Q, num_reads=100, chunk_size=10):
+            self.check_binary_response(response, Q)
+            break
+
+        with self.assertRaises(ValueError):
+            next(sampler.sample_qubo_stream(Q, chunk_size=0))
+
+    def test_more_reads_than_solver_max(self):
+        sampler = self.sampler
+        max_reads = sampler.solver.properties['num_reads_range'][1]
+
+        h = {0: 1, 4: -1}
+        J = {(0, 4): -1}
+        response = sampler.sample_ising(h, J, num_reads=2 * max_reads + 1, compact=True)
+        self.check_spin_response(response, h, J)
+        self.assertEqual(response.data_vectors['num_occurrences'].sum(), 2 * max_reads + 1)
+
+        Q = {(0, 0): 1, (0, 4): -1.2, (4, 4): .1}
+        response = sampler.sample_qubo(Q, num_reads=2 * max_reads, aggregate=True)
+        self.check_binary_response(response, Q)
+        self.assertLessEqual(len(response), 4)
+
+    def test_out_of_structure(self):
+        sampler = self.sampler
+
+        # 0 and 1 are on the same side of a unit cell, so have no coupler
+        with self.assertRaises(ValueError):
+            sampler.sample_qubo({(0, 1): 1})
+        with self.assertRaises(ValueError):
+            sampler.sample_ising({}, {(0, 1): 1})
+        with self.assertRaises(ValueError):
+            sampler.sample_qubo({(10**6, 10**6): 1})
+
+        # but interactions without a bias are never sent
+        response = sampler.sample_qubo({(0, 1): 0., (0, 4): 1})
+        self.check_binary_response(response, {(0, 1): 0., (0, 4): 1})
+
+    def test_deferred_solver(self):
+        sampler = type(self.sampler)(*self.sampler_args)
+        self.assertIsNone(sampler._solver)
+
+        # the structure of the solver is already cached, so it does not need the solver
+        self.assertEqual(sampler.structure, self.sampler.structure)
+        self.assertIsNone(sampler._solver)
+
+        sampler.sample_ising({0: 1}, {})
+        self.assertIsNotNone(sampler._solver)
+
+    def test_compiled(self):
+        sampler = self.sampler
+
+        h = {0: 1}
+        J = {(0, 4): -1, (0, 5): 0.}
+        problem = sapi.compile_ising(h, J)
+
+        response = sampler.sample(problem)
+        self.check_spin_response(response, h, J)
+        min_sample = next(iter(response))
+        self.assertEqual((min_sample[0], min_sample[4]), (-1, -1))
+
+        # the formatted problem is reused
+        formatted = problem._derived['sapi_format']
+        response = sampler.sample_async(problem, compact=True).result()
+        self.assertIsInstance(response, sapi.ArraySpinResponse)
+        self.assertIs(problem._derived['sapi_format'], formatted)
+
+        Q = {(0, 0): 1, (0, 4): -1.2, (4, 4): .1}
+        response = sampler.sample(sapi.compile_qubo(Q))
+        self.check_binary_response(response, Q)
+        min_sample = next(iter(response))
+        self.assertEqual((min_sample[0], min_sample[4]), (1, 1))
+
+        with self.assertRaises(ValueError):
+            sampler.sample(sapi.compile_ising({}, {(0, 1): 1}))
+        with self.assertRaises(ValueError):
+            sampler.sample(sapi.compile_ising({'a': 1}, {}))
+
+    def test_shared_structure(self):
+        # samplers for the same solver share their structure
+        sampler = SAPILocalSampler('c4-sw_optimize')
+        self.assertIs(sampler.hardware_graph, SAPILocalSampler('c4-sw_optimize').hardware_graph)
+        self.assertIs(sampler.structure, SAPILocalSampler('c4-sw_optimize').structure)
+
     def test_random_problem(self):
         sampler = self.sampler
 
@@ -110,6 +306,85 @@ class TestSAPILocalSampler(unittest.TestCase):
         response = sampler.sample_qubo(Q)
         self.check_binary_response(response, Q)
 
+    def test_async(self):
+        sampler = self.sampler
+
+        h = {0: 1}
+        J = {(0, 4): -1}
+
+        # submit several problems before collecting any of them
+        futures = [sampler.sample_ising_async(h, J) for __ in range(5)]
+        self.assertTrue(sapi.wait(futures, timeout=60))
+        for future in futures:
+            self.assertTrue(future.done())
+            self.check_spin_response(future.result(), h, J)
+
+        Q = {(0, 0): 1, (0, 4): -1.2, (4, 4): .1}
+
+        future = sampler.sample_qubo_async(Q)
+        response = future.result()
+        self.check_binary_response(response, Q)
+
+        # the response is only built once
+        self.assertIs(response, future.result())
+
+        min_sample = next(iter(response))
+        self.assertEqual(min_sample[0], 1)
+        self.assertEqual(min_sample[4], 1)
+
+    def test_many(self):
+        sampler = self.sampler
+
+        Qs = [{(0, 0): b, (0, 4): -1.2, (4, 4): .1} for b in range(-5, 5)]
+
+        # in input order
+        responses = list(sampler.sample_qubo_many(iter(Qs), max_in_flight=3))
+        self.assertEqual(len(responses), len(Qs))
+        for idx, (response, Q) in enumerate(zip(responses, Qs)):
+            self.assertEqual(response.data['problem_index'], idx)
+            self.check_binary_response(response, Q)
+
+        # in completion order
+        responses = list(sampler.sample_qubo_many(Qs, max_in_flight=3, ordered=False))
+        self.assertEqual(sorted(r.data['problem_index'] for r in responses), list(range(len(Qs))))
+        for response in responses:
+            self.check_binary_response(response, Qs[response.data['problem_index']])
+
+        problems = [({0: b}, {(0, 4): -1}) for b in range(-5, 5)]
+        for response, (h, J) in zip(sampler.sample_ising_many(problems, max_in_flight=1), problems):
+            self.check_spin_response(response, h, J)
+
+    def test_many_stopped_early(self):
+        sampler = self.sampler
+
+        futures = []
+
+        def submit(Q):
+            future = sampler.sample_qubo_async(Q)
+            futures.append(future)
+            return future
+
+        cancelled = []
+
+        def cancel(future):
+            cancelled.append(future)
+
+        Qs = [{(0, 0): b, (0, 4): -1.2, (4, 4): .1} for b in range(-5, 5)]
+
+        responses = sapi.submit_many(submit, iter(Qs), max_in_flight=3)
+        next(responses)
+
+        # the first is already yielded, the two after it are still outstanding
+        self.assertEqual(len(futures), 3)
+        for future in futures:
+            future.cancel = lambda future=future: cancel(future)
+
+        responses.close()
+        self.assertEqual(cancelled, futures[1:])
+
+        # nothing more was submitted
+        self.assertEqual(len(futures), 3)
+
     def check_spin_response(self, response, h, J):
         variables = set(h)
         variables.update(set().union(*J))
@@ -131,4 +406,16 @@ class TestSAPILocalSampler(unittest.TestCase):
 @unittest.skipUnless(_sapitoken, "need a sapi token for testing")
 class TestSAPISampler(TestSAPILocalSampler):
     def setUp(self):
-        self.sampler = SAPISampler(solver_name, url, token)
+        self.sampler_args = (solver_name, url, token)
+        self.sampler = SAPISampler(*self.sampler_args)
+
+    def test_pooled_connection(self):
+        # samplers share the connection and solver handle
+        sampler = SAPISampler(solver_name, url, token)
+        self.assertIs(sampler.connection, self.sampler.connection)
+        self.assertIs(sampler.solver, self.sampler.solver)
+
+        pool = sapi.ConnectionPool()
+        sampler = SAPISampler(solver_name, url, token, connection_pool=pool)
+        self.assertIsNot(sampler.connection, self.sampler.connection)
+        self.assertEqual(len(pool), 1)
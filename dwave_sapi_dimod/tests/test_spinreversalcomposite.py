@@ -0,0 +1,64 @@
+"""
+Tests for SpinReversalComposite around SAPILocalSampler() and
+EmbeddingComposite(SAPILocalSampler()).
+"""
+
+import unittest
+
+import dimod
+
+import dwave_sapi_dimod as sapi
+
+
+class TestSpinReversalComposite(unittest.TestCase):
+    def setUp(self):
+        self.child = sapi.SAPILocalSampler('c4-sw_optimize')
+
+    def check_spin_response(self, response, h, J):
+        variables = set(h).union(*J)
+        for sample, energy in response.items():
+            self.assertEqual(set(sample), variables)
+            self.assertAlmostEqual(dimod.ising_energy(h, J, sample), energy)
+
+    def test_structured(self):
+        sampler = sapi.SpinReversalComposite(self.child, num_gauges=3, random_seed=1)
+        self.assertEqual(sampler.structure, self.child.structure)
+
+        h = {0: 1, 4: -.5}
+        J = {(0, 4): -1}
+        response = sampler.sample_ising(h, J, num_reads=100, compact=True)
+        self.check_spin_response(response, h, J)
+        self.assertEqual(response.data_vectors['num_occurrences'].sum(), 100)
+
+        # the ground state is the same in every gauge
+        self.assertEqual(next(iter(response)), {0: -1, 4: -1})
+
+    def test_embedded(self):
+        sampler = sapi.SpinReversalComposite(sapi.EmbeddingComposite(self.child), num_gauges=4)
+
+        h = {'a': .5}
+        J = {('a', 'b'): 1, ('b', 'c'): 1, ('a', 'c'): 1}
+        response = sampler.sample_ising(h, J, num_reads=10)
+        self.check_spin_response(response, h, J)
+        self.assertEqual(sum(data['num_occurrences'] for __, data in response.samples(data=True)), 10)
+
+        Q = {(0, 0): 1, (0, 1): -1.2, (1, 1): .1}
+        response = sampler.sample_qubo(Q, num_reads=10)
+        self.assertEqual(next(iter(response)), {0: 1, 1: 1})
+
+    def test_aggregate(self):
+        sampler = sapi.SpinReversalComposite(self.child, num_gauges=4)
+
+        h = {0: 1, 4: -.5}
+        J = {(0, 4): -1}
+        response = sampler.sample_ising(h, J, num_reads=100, compact=True, aggregate=True)
+        self.check_spin_response(response, h, J)
+
+        # at most one row per state, even across gauges
+        self.assertLessEqual(len(response), 4)
+        self.assertEqual(response.data_vectors['num_occurrences'].sum(), 100)
+
+    def test_fewer_reads_than_gauges(self):
+        sampler = sapi.SpinReversalComposite(self.child, num_gauges=8)
+        response = sampler.sample_ising({0: 1}, {(0, 4): -1}, num_reads=3, compact=True)
+        self.assertEqual(response.data_vectors['num_occurrences'].sum(), 3)
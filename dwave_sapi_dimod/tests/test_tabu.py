@@ -0,0 +1,45 @@
+"""
+Tests for the tabu search.
+"""
+
+import itertools
+import random
+import unittest
+
+import dimod
+import numpy as np
+
+import dwave_sapi_dimod as sapi
+
+
+class TestTabuSearch(unittest.TestCase):
+    def test_ground_state(self):
+        # small enough to check against every solution
+        rng = random.Random(7)
+        h = {v: rng.uniform(-1, 1) for v in range(8)}
+        J = {(u, v): rng.uniform(-1, 1) for u, v in itertools.combinations(h, 2)}
+
+        ground = min(dimod.ising_energy(h, J, dict(enumerate(spins)))
+                     for spins in itertools.product((-1, 1), repeat=len(h)))
+
+        spins, energy = sapi.tabu_search(h, J, random_state=np.random.RandomState(0))
+        self.assertEqual(spins.dtype, np.int8)
+        self.assertAlmostEqual(energy, dimod.ising_energy(h, J, dict(enumerate(spins.tolist()))))
+        self.assertAlmostEqual(energy, ground)
+
+    def test_initial(self):
+        h = [1, 0, 0]
+        J = {(0, 1): -1, (1, 2): 1}
+
+        # no steps, so the initial solution is returned
+        spins, energy = sapi.tabu_search(h, J, initial=[1, 1, 1], num_steps=0)
+        self.assertEqual(spins.tolist(), [1, 1, 1])
+        self.assertEqual(energy, 1.)
+
+        spins, energy = sapi.tabu_search(h, J, initial=[1, 1, 1])
+        self.assertEqual(energy, -3.)
+
+    def test_empty(self):
+        spins, energy = sapi.tabu_search({}, {})
+        self.assertEqual(spins.tolist(), [])
+        self.assertEqual(energy, 0.)
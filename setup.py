@@ -10,6 +10,7 @@ setup(
     version=__version__,
     packages=packages,
     install_requires=['dimod==0.4.0',
-                      'dwave_sapi2'],
+                      'dwave_sapi2',
+                      'numpy'],
     license='Apache 2.0',
 )